@@ -1,31 +1,54 @@
 from selenium.webdriver.support.ui import WebDriverWait
-from time import sleep
 from selenium.webdriver.support import expected_conditions as Ec
 from selenium.common.exceptions import (
     WebDriverException
 )
 from common import Common
+from communicator import Communicator
+from error_codes import ERROR_CODES
+from metrics import Metrics, NAVIGATION
+from blocking import check_page
+from rate_limiter import get_rate_limiter
+from settings import EXPLICIT_WAIT_TIMEOUT
+from wait_policy import RetryPolicy
 
 
 class Base:
-    timeout = 60
+    timeout = EXPLICIT_WAIT_TIMEOUT
+    pages_loaded = 0  # Successful navigations, used to recycle pooled drivers
+    retry_policy = RetryPolicy()
 
     def openingurl(self, url: str):
         """
-        To avoid internet connection error while requesting"""
+        To avoid internet connection error while requesting.
+        Failed navigations are retried with backoff until the retry budget
+        is spent; returns whether the page was opened. Page loads are paced by
+        the worker's rate limiter, and BlockedError is raised when google
+        answers with a captcha or rate limit page."""
 
-        while True:
+        attempts = self.retry_policy.max_attempts
+        for attempt in range(attempts):
             if Common.close_thread_is_set():
                 self.driver.quit()
-                return
+                return False
 
+            get_rate_limiter().acquire()
             try:
-                self.driver.get(url)
-            except WebDriverException:
-                sleep(5)
+                with Metrics.timer(NAVIGATION):
+                    self.driver.get(url)
+            except WebDriverException as e:
+                if attempt + 1 < attempts:
+                    Communicator.show_message(f"Navigation failed, attempt {attempt + 1} of {attempts}: {e.msg}")
+                    self.retry_policy.sleep(attempt)
                 continue
             else:
-                break
+                self.pages_loaded += 1
+                Metrics.increment("pages")
+                check_page(self.driver)
+                return True
+
+        Communicator.show_error_message(f"Could not open {url} after {attempts} attempts", ERROR_CODES['ERR_NAVIGATION_FAILED'])
+        return False
 
     def findelementwithwait(self, by, value):
         """we will use this function to find an element"""
@@ -33,4 +56,4 @@ class Base:
         element = WebDriverWait(self.driver, self.timeout).until(
             Ec.visibility_of_element_located((by, value))
         )
-        return element
\ No newline at end of file
+        return element
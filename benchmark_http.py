@@ -0,0 +1,129 @@
+"""Benchmark and check of the HTTP place fetcher against a local stand-in server.
+
+    python benchmark_http.py --places 200 --latency 0.2 --pool_size 4 --without_state 0.1
+
+The stand-in serves /maps/place/ pages shaped like google's, with the place
+in APP_INITIALIZATION_STATE, except for a share of places that get a page
+without it and must come back as None for the chrome fallback. Every
+extracted record is compared with the place it was built from, and the run
+exits with status 1 on a mismatch.
+"""
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from http_fetcher import HttpFetcher, STATE_MARKER, XSSI_PREFIX
+from metrics import Metrics
+from parse_engines import build_record
+from rate_limiter import TokenBucket, set_rate_limiter
+
+PLACE_PATTERN = re.compile(r"/maps/place/Sample\+Business\+(\d+)")
+
+
+def sample_record(number):
+    return build_record(
+        f"Sample Business {number}",
+        f"(212) 555-{number:04d}",
+        f"{number} Main St, New York, NY 10001",
+        f"https://www.sample{number}.example.com/",
+        f"({number * 13:,})",
+        f"{3 + number % 20 / 10:.1f} stars",
+    )
+
+
+def build_state_page(record):
+    """Place page carrying record where http_fetcher.PLACE_FIELDS reads it"""
+    place = [None] * 179
+    place[11] = record["Name"]
+    place[39] = record["Address"]
+    place[178] = [[record["Phone"]]]
+    place[7] = [record["Website"]]
+    place[4] = [None] * 7 + [float(record["Rating"].split()[0]), int(record["Total Reviews"].strip("()").replace(",", ""))]
+    payload = [None] * 6 + [place]
+    state = [[[0, 0, 0]], None, None, [None] * 6 + [f"{XSSI_PREFIX}\n{json.dumps(payload)}"]]
+    return (f"<!DOCTYPE html><html><head><script>window.{STATE_MARKER}{json.dumps(state)};"
+            f"window.APP_FLAGS=[];</script></head><body></body></html>")
+
+
+def make_handler(latency, without_state):
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, like google
+
+        def do_GET(self):
+            time.sleep(latency)
+            match = PLACE_PATTERN.search(self.path)
+            if not match:
+                self.send_error(404)
+                return
+            number = int(match.group(1))
+            if number in without_state:
+                body = "<html><body>Layout without the embedded state</body></html>"
+            else:
+                body = build_state_page(sample_record(number))
+            encoded = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(encoded)))
+            self.end_headers()
+            self.wfile.write(encoded)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StandInHandler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--places", type=int, default=200, help="Place pages to fetch")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds the stand-in takes per page")
+    parser.add_argument("--pool_size", type=int, default=4, help="Keep-alive connections and concurrent requests")
+    parser.add_argument("--without_state", type=float, default=0.1, help="Share of pages without embedded state")
+    args = parser.parse_args()
+
+    step = round(1 / args.without_state) if args.without_state else 0
+    without_state = set(range(0, args.places, step)) if step else set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.latency, without_state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    set_rate_limiter(TokenBucket(max_rate=1e9, min_rate=1e9, burst=args.pool_size))  # Measure the fetcher, not the limit
+    fetcher = HttpFetcher(pool_size=args.pool_size, base_url=f"http://127.0.0.1:{server.server_port}")
+    links = [f"https://www.google.com/maps/place/Sample+Business+{number}/data=!4m2!3m1!1s0x1:0x{number:x}"
+             for number in range(args.places)]
+
+    Metrics.snapshot(reset=True)
+    started = time.perf_counter()
+    results = list(fetcher.fetch_places(links))
+    elapsed = time.perf_counter() - started
+    fetcher.close()
+    server.shutdown()
+
+    mismatches, fallbacks = [], 0
+    for number, (link, record) in enumerate(results):
+        if record is None:
+            fallbacks += 1
+            expected_fallback = number in without_state
+        else:
+            expected_fallback = False
+            if record != sample_record(number):
+                mismatches.append(f"{link}: {record}")
+        if expected_fallback != (record is None):
+            mismatches.append(f"{link}: expected {'a fallback' if expected_fallback else 'a record'}")
+
+    summary = Metrics.summary(reset=True)
+    fetch = summary["stages"].get("http_fetch", {})
+    print(f"{len(results) - fallbacks} records, {fallbacks} left to chrome in {elapsed:.2f}s "
+          f"({(len(results) - fallbacks) / elapsed * 60:.0f} records/min)")
+    if fetch:
+        print(f"  http_fetch p50 {fetch['p50_s'] * 1000:.1f} ms, p95 {fetch['p95_s'] * 1000:.1f} ms")
+    for mismatch in mismatches:
+        print(f"MISMATCH {mismatch}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
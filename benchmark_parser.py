@@ -0,0 +1,77 @@
+"""Micro-benchmark of the HTML parsing engines over saved page fixtures.
+
+    python benchmark_parser.py --fixtures fixtures --iterations 50
+
+Place fixtures (place_*.html) hold the outerHTML of a place's [role='main']
+sheet, feed fixtures (feed_*.html) the outerHTML of a [role="feed"] list.
+"""
+import argparse
+import glob
+import os
+import time
+from parse_engines import ENGINES, get_engine
+
+
+def load_fixtures(directory, pattern):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, pattern))):
+        with open(path, "r", encoding="utf-8") as file:
+            pages.append(file.read())
+    return pages
+
+
+def split_feed_cards(feed_html):
+    """outerHTML of every result card, as the scroller sends them to the engine"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(feed_html, "html.parser")
+    return [str(card) for card in soup.find_all("div", class_="Nv2PK")]
+
+
+def time_engine(extract, pages, iterations):
+    """Seconds per page, best of `iterations` runs over all pages"""
+    best = None
+    for _ in range(iterations):
+        started = time.perf_counter()
+        for page in pages:
+            extract(page)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(pages)
+
+
+def benchmark(label, pages, method, iterations):
+    if not pages:
+        print(f"{label}: no fixtures found")
+        return
+
+    reference = [getattr(get_engine("bs4"), method)(page) for page in pages]
+    baseline = None
+    print(f"{label} ({len(pages)} pages, best of {iterations} runs)")
+    for name in ENGINES:
+        engine = get_engine(name)
+        if not isinstance(engine, ENGINES[name]):
+            print(f"  {name:6} unavailable, skipped")  # get_engine fell back to BeautifulSoup
+            continue
+        extract = getattr(engine, method)
+        matches = [extract(page) for page in pages] == reference
+        per_page = time_engine(extract, pages, iterations)
+        baseline = baseline or per_page
+        print(f"  {name:6} {per_page * 1000:8.3f} ms/page  {baseline / per_page:5.1f}x  {'same output' if matches else 'OUTPUT DIFFERS'}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", type=str, default="fixtures", help="Directory with place_*.html and feed_*.html files")
+    parser.add_argument("--iterations", type=int, default=20, help="Runs per engine, the fastest one is reported")
+    args = parser.parse_args()
+
+    places = load_fixtures(args.fixtures, "place_*.html")
+    cards = [card for feed in load_fixtures(args.fixtures, "feed_*.html") for card in split_feed_cards(feed)]
+
+    benchmark("Place pages", places, "extract_place", args.iterations)
+    benchmark("Feed cards", cards, "extract_feed_card", args.iterations)
+
+
+if __name__ == "__main__":
+    main()
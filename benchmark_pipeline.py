@@ -0,0 +1,164 @@
+"""Offline benchmark of the scroll -> link -> parse -> save pipeline.
+
+Record pages once by scraping with RECORD_FIXTURES_DIR set in settings.py,
+then replay every recorded search through the real Backend with a
+ReplayDriver instead of chrome:
+
+    python benchmark_pipeline.py --fixtures recorded --latency 0.8 --scroll_latency 0.5
+    python benchmark_pipeline.py --sample   # synthetic store built from fixtures/*_sample.html
+
+Records go to a temporary directory with an empty place index, so replays
+never touch real output. --save writes the report as JSON, and --baseline
+compares a run against a saved report and exits with status 1 when
+throughput dropped by more than --max_regression percent.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from checkpoints import CheckpointStore, set_checkpoint_store
+from communicator import Communicator
+from database import set_output_path, close_sinks
+from fixture_store import FixtureStore, FEED
+from metrics import Metrics
+from place_index import set_place_index
+from rate_limiter import TokenBucket, set_rate_limiter
+from replay_driver import ReplayDriver, split_feed
+from scraper import Backend
+from settings import (
+    REPLAY_NAVIGATION_LATENCY,
+    REPLAY_SCROLL_LATENCY,
+    REPLAY_LATENCY_JITTER,
+    REPLAY_PANEL_LATENCY,
+    MAX_TABS_PER_BROWSER,
+)
+
+SAMPLE_SEARCH_URL = "https://www.google.com/maps/search/plumber/@40.7128,-74.006,14z"
+
+
+class QuietFrontend:
+    """Swallows the pipeline's progress messages so the report stays readable"""
+
+    outputFormatValue = "jsonl"
+
+    def messageshowing(self, message):
+        pass
+
+    def end_processing(self):
+        pass
+
+
+def build_sample_store(directory, fixtures="fixtures"):
+    """Store with the sample feed as one search and the sample place page,
+    renamed, as the page of every result"""
+    store = FixtureStore(directory)
+    with open(os.path.join(fixtures, "feed_sample.html"), "r", encoding="utf-8") as file:
+        feed = file.read()
+    with open(os.path.join(fixtures, "place_sample.html"), "r", encoding="utf-8") as file:
+        place = file.read()
+    store.record_feed(SAMPLE_SEARCH_URL, "plumber", feed, reached_end=True)
+    for number, (href, _) in enumerate(split_feed(feed), start=1):
+        store.record_place(href, place.replace("Sample Business 7", f"Sample Business {number}"))
+    return store
+
+
+def replay_search(store, feed, args):
+    driver = ReplayDriver(store, args.latency, args.scroll_latency, args.jitter, seed=args.seed,
+                          panel_latency=args.panel_latency)
+    backend = Backend(feed["query"], "jsonl", 1, driver=driver, search_url=feed["url"])
+    backend.parser.max_tabs = args.tabs
+    backend.parser.spa_navigation = args.spa
+    started = time.perf_counter()
+    records = backend.mainscraping()
+    return {
+        "url": feed["url"],
+        "links": len(backend.scroller.get_results_links()),
+        "records": len(records),
+        "missing_pages": driver.pages_missing,
+        "wall_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def run(store, args):
+    feeds = store.list(FEED)
+    if not feeds:
+        print(f"No recorded feeds in {store.directory}")
+        return None
+
+    Communicator.set_frontend_object(QuietFrontend())
+    with tempfile.TemporaryDirectory() as output:
+        set_output_path(output)
+        set_place_index(os.path.join(output, "place_index.sqlite3"))
+        set_checkpoint_store(CheckpointStore(os.path.join(output, "checkpoints.sqlite3")))
+        # Replays are not throttled unless asked to, so the pipeline itself is measured
+        pages_per_second = args.pages_per_min / 60 if args.pages_per_min else 1e9
+        set_rate_limiter(TokenBucket(max_rate=pages_per_second, min_rate=pages_per_second, burst=max(args.tabs, 1)))
+        Metrics.snapshot(reset=True)
+        searches = [replay_search(store, feed, args) for feed in feeds]
+        close_sinks()
+    return {"searches": searches, "pipeline": Metrics.summary(reset=True)}
+
+
+def print_report(report):
+    for search in report["searches"]:
+        print(f"{search['url']}\n  {search['links']} links, {search['records']} records, "
+              f"{search['missing_pages']} pages not recorded, {search['wall_s']:.2f}s")
+    pipeline = report["pipeline"]
+    print(f"\n{pipeline['pages_per_min']} pages/min, {pipeline['records_per_min']} records/min "
+          f"over {pipeline['elapsed_s']:.2f}s, {pipeline['waited_s']:.2f}s of it waiting")
+    print(f"  {'stage':18} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for stage, timing in pipeline["stages"].items():
+        print(f"  {stage:18} {timing['count']:6} {timing['p50_s'] * 1000:9.2f} "
+              f"{timing['p95_s'] * 1000:9.2f} {timing['max_s'] * 1000:9.2f}")
+
+
+def regressions(report, baseline, max_regression):
+    """Throughput figures that dropped by more than max_regression percent"""
+    found = []
+    for figure in ("pages_per_min", "records_per_min"):
+        before, after = baseline["pipeline"].get(figure), report["pipeline"].get(figure)
+        if before and after is not None and after < before * (1 - max_regression / 100):
+            found.append(f"{figure} dropped from {before} to {after}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", type=str, default="recorded", help="Directory pages were recorded to")
+    parser.add_argument("--sample", action="store_true", help="Replay a synthetic store built from fixtures/*_sample.html")
+    parser.add_argument("--latency", type=float, default=REPLAY_NAVIGATION_LATENCY, help="Seconds per page load")
+    parser.add_argument("--scroll_latency", type=float, default=REPLAY_SCROLL_LATENCY, help="Seconds per feed scroll")
+    parser.add_argument("--jitter", type=float, default=REPLAY_LATENCY_JITTER, help="Relative latency variation")
+    parser.add_argument("--panel_latency", type=float, default=REPLAY_PANEL_LATENCY, help="Seconds per place sheet opened from the feed")
+    parser.add_argument("--spa", action="store_true", help="Open places by clicking their feed card instead of by URL")
+    parser.add_argument("--tabs", type=int, default=MAX_TABS_PER_BROWSER, help="Place pages loaded concurrently")
+    parser.add_argument("--pages_per_min", type=float, default=0, help="Rate limit of the replay, 0 for none")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the latency jitter, for comparable runs")
+    parser.add_argument("--save", type=str, help="Write the report to this JSON file")
+    parser.add_argument("--baseline", type=str, help="Report saved by an earlier run to compare against")
+    parser.add_argument("--max_regression", type=float, default=10, help="Allowed throughput drop in percent")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as sample_directory:
+        store = build_sample_store(sample_directory) if args.sample else FixtureStore(args.fixtures)
+        report = run(store, args)
+    if report is None:
+        sys.exit(1)
+
+    print_report(report)
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(report, file, indent=4)
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            found = regressions(report, json.load(file), args.max_regression)
+        for regression in found:
+            print(f"REGRESSION: {regression}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
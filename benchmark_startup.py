@@ -0,0 +1,80 @@
+"""Start-up cost of the entry points and of a worker process.
+
+    python benchmark_startup.py --modules worker starter scraper --top 10 --spawns 5
+
+For every module, a fresh interpreter imports it under -X importtime and the
+import time is reported in total and per top-level package, so a new heavy
+import at module level shows up right away. Then worker processes are
+spawned and timed from start() until their bootstrap has run.
+"""
+import argparse
+import multiprocessing
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+
+def import_times(module):
+    """(total microseconds, {top-level package: self microseconds}) of importing module"""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    ).stderr
+    packages = defaultdict(int)
+    total = None
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        packages[name.split(".")[0]] += int(own)
+        if name == module:
+            total = int(cumulative)
+    return total, packages
+
+
+def bootstrap_worker(ready):
+    import worker
+
+    worker.bootstrap()
+    ready.put(time.perf_counter())
+
+
+def spawn_times(start_method, spawns):
+    """Seconds from Process.start() until a worker's bootstrap has run"""
+    context = multiprocessing.get_context(start_method)
+    times = []
+    for _ in range(spawns):
+        ready = context.Queue()
+        process = context.Process(target=bootstrap_worker, args=(ready,))
+        started = time.perf_counter()
+        process.start()
+        ready.get()
+        times.append(time.perf_counter() - started)
+        process.join()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", nargs="+", default=["worker", "starter", "scraper"], help="Modules to import")
+    parser.add_argument("--top", type=int, default=10, help="Heaviest packages listed per module")
+    parser.add_argument("--spawns", type=int, default=5, help="Worker processes started per start method, 0 to skip")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        total, packages = import_times(module)
+        print(f"import {module}: {total / 1000:.1f} ms")
+        for package, own in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {package:28} {own / 1000:8.1f} ms")
+
+    if args.spawns:
+        for start_method in multiprocessing.get_all_start_methods():
+            times = spawn_times(start_method, args.spawns)
+            print(f"worker start ({start_method}): median {statistics.median(times) * 1000:.1f} ms, "
+                  f"max {max(times) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import logging
+from communicator import Communicator
+from metrics import Metrics
+from proxy_pool import get_proxy_pool
+from rate_limiter import get_rate_limiter
+
+NORMAL = "normal"
+CONSENT = "consent"
+CAPTCHA = "captcha"
+RATE_LIMITED = "rate_limited"
+
+PAGE_STATE_SCRIPT = """
+return {
+    url: location.href,
+    title: document.title,
+    text: document.body ? document.body.innerText.slice(0, 3000) : '',
+    captcha: document.querySelector('#captcha-form, iframe[src*="recaptcha"], .g-recaptcha') !== null,
+    consent: document.querySelector('form[action*="consent.google"]') !== null,
+    maps: document.querySelector("#app-container, [role='main']") !== null,
+};
+"""
+
+# Clicks the button that answers google's cookie consent page, if there is one
+DISMISS_CONSENT_SCRIPT = """
+const labels = /^(reject all|accept all|alle ablehnen|alle akzeptieren|tout refuser|tout accepter|rechazar todo|aceptar todo)$/i;
+for (const button of document.querySelectorAll('form[action*="consent"] button, button')) {
+    const label = (button.innerText || button.getAttribute('aria-label') || '').trim();
+    if (labels.test(label)) {
+        button.click();
+        return true;
+    }
+}
+return false;
+"""
+
+# Only looked for outside the maps app: reviews and place names can say anything
+RATE_LIMIT_MARKERS = ("too many requests", "error 429")
+UNUSUAL_TRAFFIC_MARKERS = ("unusual traffic", "ungewöhnlichen datenverkehr", "trafic exceptionnel")
+
+
+class BlockedError(Exception):
+    """Google answered with a captcha or rate limit page instead of results"""
+
+    def __init__(self, state, url):
+        super().__init__(f"Blocked by google ({state}) at {url}")
+        self.state = state
+        self.url = url
+
+
+def classify(page):
+    """Page state from what PAGE_STATE_SCRIPT saw"""
+    if not page:
+        return NORMAL
+    url = page.get("url") or ""
+    text = f"{page.get('title') or ''}\n{page.get('text') or ''}".lower()
+    if page.get("captcha") or "/sorry/" in url:
+        return CAPTCHA
+    if page.get("consent") or "consent.google." in url:
+        return CONSENT
+    if not page.get("maps") and any(marker in text for marker in RATE_LIMIT_MARKERS + UNUSUAL_TRAFFIC_MARKERS):
+        return RATE_LIMITED
+    return NORMAL
+
+
+def detect_page_state(driver):
+    try:
+        page = driver.execute_script(PAGE_STATE_SCRIPT)
+    except Exception as e:
+        logging.debug(f"Could not read the page state: {e}")
+        return NORMAL, None
+    return classify(page), page
+
+
+def dismiss_consent(driver):
+    """Answer a consent page and wait until google moves on from it"""
+    from wait_policy import wait_until  # Keeps selenium out of the worker bootstrap
+
+    try:
+        if not driver.execute_script(DISMISS_CONSENT_SCRIPT):
+            return False
+    except Exception as e:
+        logging.debug(f"Could not answer the consent page: {e}")
+        return False
+    return wait_until(driver, lambda current: detect_page_state(current)[0] != CONSENT) is not None
+
+
+def check_page(driver):
+    """Classify the current page after a navigation.
+
+    Consent pages are answered. Captcha and rate limit pages (or a consent page
+    that could not be answered) slow this worker down, rest the driver's proxy
+    and raise BlockedError, so the job is postponed instead of being recorded
+    as a location without results.
+    """
+    state, page = detect_page_state(driver)
+    if state == CONSENT:
+        Metrics.increment("consent_pages")
+        if dismiss_consent(driver):
+            state, page = detect_page_state(driver)
+
+    if state == NORMAL:
+        get_rate_limiter().reward()
+        return state
+    report_block(state, page.get("url") if page else None, getattr(driver, "proxy", None))
+
+
+def report_block(state, url, proxy=None):
+    """Slow this worker down, rest the proxy that got blocked and raise BlockedError"""
+    Metrics.increment(f"blocked_{state}")
+    pause = get_rate_limiter().penalize()
+    get_proxy_pool().report_blocked(proxy)
+    Communicator.show_message(f"Blocked by google ({state}), pausing this worker for {pause:.0f}s")
+    raise BlockedError(state, url)
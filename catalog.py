@@ -0,0 +1,123 @@
+import csv
+import math
+import os
+from typing import NamedTuple, Optional
+
+KM_PER_DEGREE = 111.32
+LOCATION_COLUMNS = ("name", "population", "lat", "long")
+BBOX_COLUMNS = ("south", "west", "north", "east")
+
+
+class Location(NamedTuple):
+    name: str
+    population: int
+    lat: Optional[float]
+    long: Optional[float]
+    south: Optional[float] = None
+    west: Optional[float] = None
+    north: Optional[float] = None
+    east: Optional[float] = None
+
+    @property
+    def has_bbox(self):
+        return None not in (self.south, self.west, self.north, self.east)
+
+    def span_km(self):
+        """Side of the square viewport covering the bounding box, or None"""
+        if not self.has_bbox:
+            return None
+        height = (self.north - self.south) * KM_PER_DEGREE
+        width = (self.east - self.west) * KM_PER_DEGREE * math.cos(math.radians((self.north + self.south) / 2))
+        return max(height, width)
+
+
+def normalize(name):
+    """Key of the exact-match index: case and whitespace insensitive"""
+    return " ".join(name.split()).casefold()
+
+
+def parse_number(value, kind):
+    if value is None or str(value).strip() in ("", "nan", "None"):
+        return None
+    return kind(float(value)) if kind is int else kind(value)
+
+
+def to_location(row):
+    """Location from a mapping with LOCATION_COLUMNS and optional BBOX_COLUMNS"""
+    return Location(
+        str(row["name"]).strip(),
+        parse_number(row.get("population"), int) or 0,
+        parse_number(row.get("lat"), float),
+        parse_number(row.get("long"), float),
+        *(parse_number(row.get(column), float) for column in BBOX_COLUMNS),
+    )
+
+
+class LocationCatalog:
+    """Locations parsed once, with an O(1) exact-match index on the name.
+
+    Accepts the plain `name,population,lat,long` lines of locations.txt, CSV
+    files with a header (name, population, lat, long and optionally south,
+    west, north, east bounding boxes) and Parquet files with the same columns.
+    When a name appears twice the first row wins, as it always did.
+    """
+
+    def __init__(self, locations=()):
+        self.__locations = []
+        self.__index = {}
+        for location in locations:
+            self.add(location)
+
+    def add(self, location):
+        key = normalize(location.name)
+        if key not in self.__index:
+            self.__index[key] = location
+            self.__locations.append(location)
+
+    def get(self, name):
+        return self.__index.get(normalize(name))
+
+    def names(self):
+        return [location.name for location in self.__locations]
+
+    def __contains__(self, name):
+        return normalize(name) in self.__index
+
+    def __len__(self):
+        return len(self.__locations)
+
+    def __iter__(self):
+        return iter(self.__locations)
+
+    @classmethod
+    def from_file(cls, path):
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".parquet":
+            return cls.from_parquet(path)
+        return cls.from_csv(path)
+
+    @classmethod
+    def from_csv(cls, path):
+        with open(path, "r", encoding="utf-8", newline="") as file:
+            rows = [row for row in csv.reader(file) if row and row[0].strip()]
+        if not rows:
+            return cls()
+        header = [column.strip().lower() for column in rows[0]]
+        if "name" in header:
+            return cls(to_location(dict(zip(header, row))) for row in rows[1:])
+        return cls(to_location(dict(zip(LOCATION_COLUMNS, row))) for row in rows)
+
+    @classmethod
+    def from_parquet(cls, path):
+        import pandas as pd  # Only needed for parquet gazetteers
+
+        frame = pd.read_parquet(path)
+        frame.columns = [column.lower() for column in frame.columns]
+        return cls(to_location(row) for row in frame.to_dict("records"))
+
+
+def read_industries(path):
+    """Industries in file order, without blank lines and duplicates"""
+    with open(path, "r", encoding="utf-8") as file:
+        industries = [" ".join(line.split()) for line in file]
+    return list(dict.fromkeys(industry for industry in industries if industry))
@@ -0,0 +1,109 @@
+import json
+import sqlite3
+import time
+from settings import CHECKPOINT_PATH, CHECKPOINT_MAX_AGE_HOURS
+
+
+class JobCheckpoint:
+    """Progress of one search: the links its scroll harvested and a cursor
+    before which every link is parsed (or given up on).
+
+    Links finish out of order when tabs, panel clicks or HTTP fetches run
+    side by side, so finished links beyond the cursor are remembered until
+    the cursor can move past them; only the cursor is persisted, which may
+    redo a few pages after a crash but never skips one.
+    """
+
+    def __init__(self, store, key, links, feed_records=None, saturated=False, cursor=0):
+        self.store = store
+        self.key = key
+        self.links = links
+        self.feed_records = feed_records or {}
+        self.saturated = saturated
+        self.cursor = cursor
+        self.__finished = set()
+
+    @property
+    def remaining_links(self):
+        return self.links[self.cursor:]
+
+    def finish(self, link):
+        self.__finished.add(link)
+        moved = False
+        while self.cursor < len(self.links) and self.links[self.cursor] in self.__finished:
+            self.__finished.discard(self.links[self.cursor])
+            self.cursor += 1
+            moved = True
+        if moved:
+            self.store.advance(self.key, self.cursor)
+
+
+class CheckpointStore:
+    """Checkpoints of the searches in progress, in SQLite so every worker
+    process of a host shares them and they survive crashes and CTRL+C.
+    A search is keyed on its query and URL, so a job resumed by any worker
+    finds its checkpoint; checkpoints older than max_age_hours are ignored
+    because the results of the search may have changed since."""
+
+    def __init__(self, path=CHECKPOINT_PATH, max_age_hours=CHECKPOINT_MAX_AGE_HOURS):
+        self.max_age = max_age_hours * 3600
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS checkpoints (
+                key TEXT PRIMARY KEY,
+                links TEXT NOT NULL,
+                feed_records TEXT NOT NULL,
+                saturated INTEGER NOT NULL,
+                cursor INTEGER NOT NULL DEFAULT 0,
+                updated REAL NOT NULL
+            )"""
+        )
+
+    def load(self, key):
+        """Checkpoint of a search, or None when there is none or it is too old"""
+        row = self.connection.execute(
+            "SELECT links, feed_records, saturated, cursor FROM checkpoints WHERE key = ? AND updated >= ?",
+            (key, time.time() - self.max_age),
+        ).fetchone()
+        if row is None:
+            return None
+        links, feed_records, saturated, cursor = row
+        return JobCheckpoint(self, key, json.loads(links), json.loads(feed_records), bool(saturated), cursor)
+
+    def start(self, key, links, feed_records=None, saturated=False):
+        """Checkpoint the links a search harvested, before any is parsed"""
+        feed_records = feed_records or {}
+        self.connection.execute(
+            "INSERT OR REPLACE INTO checkpoints (key, links, feed_records, saturated, cursor, updated) VALUES (?, ?, ?, ?, 0, ?)",
+            (key, json.dumps(links), json.dumps(feed_records, ensure_ascii=False), int(saturated), time.time()),
+        )
+        return JobCheckpoint(self, key, links, feed_records, saturated)
+
+    def advance(self, key, cursor):
+        self.connection.execute(
+            "UPDATE checkpoints SET cursor = ?, updated = ? WHERE key = ?", (cursor, time.time(), key)
+        )
+
+    def clear(self, key):
+        self.connection.execute("DELETE FROM checkpoints WHERE key = ?", (key,))
+
+    def close(self):
+        self.connection.close()
+
+
+_checkpoint_store = None
+
+
+def set_checkpoint_store(store):
+    """Replace this process's checkpoint store, e.g. with a temporary one for replays"""
+    global _checkpoint_store
+    _checkpoint_store = store
+
+
+def get_checkpoint_store():
+    """The checkpoint store of this process, or None when CHECKPOINT_PATH is None"""
+    global _checkpoint_store
+    if _checkpoint_store is None and CHECKPOINT_PATH:
+        _checkpoint_store = CheckpointStore()
+    return _checkpoint_store
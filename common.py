@@ -1,8 +1,10 @@
 import threading
+import time
 
 class Common:
     closeThread = threading.Event()
     lock = threading.Lock()
+    lastProgress = 0.0  # Monotonic time the job in progress last got a link done or new results scrolled
 
     @classmethod
     def set_close_thread(cls):
@@ -12,4 +14,12 @@ class Common:
     @classmethod
     def close_thread_is_set(cls):
         return cls.closeThread.is_set()
+
+    @classmethod
+    def mark_progress(cls):
+        cls.lastProgress = time.monotonic()
+
+    @classmethod
+    def last_progress(cls):
+        return cls.lastProgress
     
\ No newline at end of file
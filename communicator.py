@@ -1,8 +1,10 @@
 # communicator.py
+from settings import VERBOSE_PAYLOADS
 
 class Communicator:
     __frontend_object = None
     __output_format = None  # Add this line to store output format in headless mode
+    __verbose_payloads = VERBOSE_PAYLOADS
 
     @classmethod
     def show_message(cls, message):
@@ -11,6 +13,15 @@ class Communicator:
         else:
             print(message)  # Print message to console in headless mode
 
+    @classmethod
+    def show_payload(cls, label, payload, summary=None):
+        """Show full records or link lists only with verbose payloads on,
+        otherwise just the short summary"""
+        if cls.__verbose_payloads:
+            cls.show_message(f"{label}: {payload}")
+        elif summary is not None:
+            cls.show_message(summary)
+
     @classmethod
     def show_error_message(cls, message, error_code):
         if cls.__frontend_object:
@@ -23,6 +34,10 @@ class Communicator:
     def set_frontend_object(cls, frontend_object):
         cls.__frontend_object = frontend_object
 
+    @classmethod
+    def set_verbose_payloads(cls, verbose):
+        cls.__verbose_payloads = verbose
+
     @classmethod
     def set_output_format(cls, output_format):
         cls.__output_format = output_format
@@ -0,0 +1,351 @@
+"""Coordinator and remote workers for scraping from several machines.
+
+The coordinator runs next to the job queue and the result writer of
+starter.py and serves jobs over TCP (multiprocessing.connection, every
+connection authenticated with a shared key). Remote workers lease jobs,
+stream back records and metrics as they are produced, and send heartbeats.
+A worker that disconnects or stays silent for HEARTBEAT_TIMEOUT seconds is
+considered lost and its job goes back to the queue for another worker; a
+worker that stays connected but makes no progress, e.g. hung in a driver
+call, loses its job when the lease runs out, as heartbeats only extend it
+while the job moves on.
+
+Messages are dicts with a "type":
+    worker -> coordinator: hello, lease, remaining, heartbeat, record,
+                           metrics, capture, complete, fail, postpone,
+                           fresh_ids, mark_scraped, checkpoint_load,
+                           checkpoint_start, checkpoint_advance,
+                           checkpoint_clear
+    coordinator -> worker: welcome, job, idle, remaining, fresh_ids,
+                           checkpoint (replies to hello, lease, remaining,
+                           fresh_ids and checkpoint_load)
+
+The place index and the checkpoints of remote workers are the coordinator's
+(RemotePlaceIndex, RemoteCheckpointStore), so every host skips the places
+any host scraped, and a lost worker's job resumes from its checkpoint.
+"""
+import logging
+import os
+import threading
+import time
+from multiprocessing.connection import Listener, Client
+from checkpoints import CheckpointStore, JobCheckpoint
+from common import Common
+from geotiling import Tile, QuadtreePlanner
+from html_archive import get_html_archive
+from job_queue import Job, JobQueue
+from place_index import PlaceIndex
+from settings import COORDINATOR_PORT, HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT, JOB_POLL_INTERVAL, CHECKPOINT_PATH
+
+AUTHKEY_ENV = "SCRAPER_AUTHKEY"
+
+
+def parse_address(address, default_host="127.0.0.1"):
+    """(host, port) from "host:port", "host" or ":port" """
+    host, _, port = address.rpartition(":") if ":" in address else (address, "", "")
+    return host or default_host, int(port or COORDINATOR_PORT)
+
+
+def get_authkey(authkey=None):
+    """Shared key from the command line or the SCRAPER_AUTHKEY variable"""
+    authkey = authkey or os.environ.get(AUTHKEY_ENV)
+    if not authkey:
+        raise ValueError(f"Set --authkey or {AUTHKEY_ENV}: coordinator connections must be authenticated")
+    return authkey.encode("utf-8")
+
+
+def job_message(job):
+    return {
+        "type": "job",
+        "id": job.id,
+        "industry": job.industry,
+        "location": job.location,
+        "tile": job.tile,
+        "priority": job.priority,
+        "attempts": job.attempts,
+    }
+
+
+def complete_job(job_queue, planner, tiling, job, worker, records, saturated):
+    """Mark a job done, first queueing the quadrants of a saturated adaptive tile"""
+    if tiling == "adaptive" and job.tile:
+        tile = Tile.from_dict(job.tile)
+        if planner.should_subdivide(tile, saturated):
+            for child in tile.split():
+                job_queue.enqueue(job.industry, job.location, child.to_dict(), job.priority + 1)
+            logging.info(f"{tile} is saturated, queued its 4 quadrants")
+    if not job_queue.complete(job.id, worker, records):
+        logging.warning(f"{job} was done by {worker} after its lease ran out, another worker took it over")
+
+
+class Coordinator:
+    """Serves the job queue to remote workers, one thread per connection.
+
+    Records and metrics received from workers are put on result_queue, the
+    queue of the parent's ResultWriter, exactly like local workers do.
+    """
+
+    def __init__(self, address, authkey, tiling, result_queue, heartbeat_timeout=HEARTBEAT_TIMEOUT):
+        self.address = address
+        self.authkey = authkey
+        self.tiling = tiling
+        self.result_queue = result_queue
+        self.heartbeat_timeout = heartbeat_timeout
+        self.workers = {}  # Worker id -> id of the job it holds, or None
+        self.lost = 0
+        self.__listener = None
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+
+    def start(self):
+        self.__listener = Listener(self.address, authkey=self.authkey)
+        threading.Thread(target=self.accept, name="coordinator", daemon=True).start()
+        logging.info(f"Coordinator listening on {self.address[0]}:{self.address[1]}")
+
+    def stop(self):
+        self.__stop.set()
+        if self.__listener is not None:
+            self.__listener.close()
+
+    def connected(self):
+        with self.__lock:
+            return len(self.workers)
+
+    def accept(self):
+        while not self.__stop.is_set():
+            try:
+                connection = self.__listener.accept()
+            except Exception as e:
+                if not self.__stop.is_set():
+                    logging.warning(f"Rejected a worker connection: {e}")
+                continue
+            threading.Thread(target=self.serve, args=(connection,), daemon=True).start()
+
+    def serve(self, connection):
+        """Answer one worker until it leaves; a lost worker's job is requeued"""
+        job_queue = JobQueue()  # sqlite connections belong to one thread
+        planner = QuadtreePlanner()
+        archive = get_html_archive()
+        place_index = PlaceIndex()
+        checkpoints = CheckpointStore() if CHECKPOINT_PATH else None
+        worker_id = None
+        leased = {}  # Job id -> Job held by this worker
+        try:
+            while not self.__stop.is_set():
+                if not connection.poll(self.heartbeat_timeout):
+                    raise TimeoutError(f"no heartbeat for {self.heartbeat_timeout}s")
+                message = connection.recv()
+                kind = message["type"]
+
+                if kind == "hello":
+                    worker_id = message["worker"]
+                    with self.__lock:
+                        self.workers[worker_id] = None
+                    heartbeat_interval = min(HEARTBEAT_INTERVAL, self.heartbeat_timeout / 3)
+                    connection.send({"type": "welcome", "heartbeat_interval": heartbeat_interval})
+                    logging.info(f"Worker {worker_id} joined")
+                elif kind == "lease":
+                    job = job_queue.lease(worker_id)
+                    if job is not None:
+                        leased[job.id] = job
+                        connection.send(job_message(job))
+                    else:
+                        connection.send({"type": "idle"})
+                    with self.__lock:
+                        self.workers[worker_id] = job.id if job else None
+                elif kind == "remaining":
+                    connection.send({"type": "remaining", "count": job_queue.remaining()})
+                elif kind == "heartbeat":
+                    if message["progressed"]:  # A hung worker stays connected but its leases run out
+                        for job_id in leased:
+                            job_queue.extend_lease(job_id, worker_id)
+                elif kind == "capture":
+                    # The object is on the worker's disk, store it where the extraction pool reads
+                    capture = message["payload"]
+                    archive.put_object(capture["digest"], message["object"])
+                    archive.append(capture)
+                    self.result_queue.put((kind, message["key"], capture))
+                elif kind in ("record", "metrics"):
+                    self.result_queue.put((kind, message["key"], message["payload"]))
+                elif kind == "complete":
+                    job = leased.pop(message["job_id"])
+                    complete_job(job_queue, planner, self.tiling, job, worker_id, message["records"], message["saturated"])
+                elif kind == "fail":
+                    leased.pop(message["job_id"], None)
+                    job_queue.fail(message["job_id"], worker_id, message["error"])
+                elif kind == "postpone":
+                    leased.pop(message["job_id"], None)
+                    job_queue.postpone(message["job_id"], worker_id, message["error"])
+                elif kind == "fresh_ids":
+                    connection.send({"type": "fresh_ids", "ids": place_index.fresh_ids(message["place_ids"])})
+                elif kind == "mark_scraped":
+                    place_index.mark_scraped(message["place_id"], message["query"], message["name"])
+                elif kind == "checkpoint_load":
+                    checkpoint = checkpoints.load(message["key"]) if checkpoints else None
+                    connection.send({"type": "checkpoint", "checkpoint": checkpoint and {
+                        "links": checkpoint.links,
+                        "feed_records": checkpoint.feed_records,
+                        "saturated": checkpoint.saturated,
+                        "cursor": checkpoint.cursor,
+                    }})
+                elif kind == "checkpoint_start" and checkpoints:
+                    checkpoints.start(message["key"], message["links"], message["feed_records"], message["saturated"])
+                elif kind == "checkpoint_advance" and checkpoints:
+                    checkpoints.advance(message["key"], message["cursor"])
+                elif kind == "checkpoint_clear" and checkpoints:
+                    checkpoints.clear(message["key"])
+        except (EOFError, OSError, TimeoutError) as e:
+            if leased:
+                logging.warning(f"Lost worker {worker_id} ({str(e) or type(e).__name__}), requeueing {len(leased)} job(s)")
+                with self.__lock:
+                    self.lost += 1
+        finally:
+            for job_id in leased:
+                job_queue.fail(job_id, worker_id, f"worker {worker_id} lost")
+            with self.__lock:
+                self.workers.pop(worker_id, None)
+            job_queue.close()
+            place_index.close()
+            if checkpoints:
+                checkpoints.close()
+            connection.close()
+
+
+class RemoteJobs:
+    """Worker-side client of a Coordinator.
+
+    It is the job source of worker_loop on remote hosts and, through put(),
+    the result queue that QueueSink and send_metrics write to, so records
+    and metrics travel over the same connection; captures carry their
+    archived object, which is only on this host's disk. A background thread
+    sends heartbeats while the worker is alive.
+    """
+
+    def __init__(self, address, authkey, worker_id):
+        from wait_policy import RetryPolicy
+
+        self.worker_id = worker_id
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.connection = RetryPolicy().call(
+            lambda: Client(address, authkey=authkey), retry_on=(OSError,), description="Connecting to the coordinator"
+        )
+        welcome = self.request({"type": "hello", "worker": worker_id})
+        self.heartbeat_interval = welcome["heartbeat_interval"]
+        threading.Thread(target=self.send_heartbeats, name="heartbeat", daemon=True).start()
+
+    def send(self, message):
+        with self.__lock:
+            self.connection.send(message)
+
+    def request(self, message):
+        """Send a message the coordinator replies to; only the worker's main
+        thread makes requests, so replies cannot get mixed up"""
+        self.send(message)
+        return self.connection.recv()
+
+    def send_heartbeats(self):
+        """Keep the connection alive; leases are only extended when the job
+        made progress since the last beat, so a worker hung in a driver call
+        keeps its connection but loses its job once the lease runs out"""
+        progress = Common.last_progress()
+        while not self.__stop.wait(self.heartbeat_interval):
+            progressed = Common.last_progress() != progress
+            progress = Common.last_progress()
+            try:
+                self.send({"type": "heartbeat", "progressed": progressed})
+            except OSError:
+                return
+
+    def put(self, item):
+        kind, key, payload = item
+        message = {"type": kind, "key": key, "payload": payload}
+        if kind == "capture":
+            message["object"] = get_html_archive().read_object(payload["digest"])
+        self.send(message)
+
+    def lease(self, worker_id):
+        reply = self.request({"type": "lease"})
+        if reply["type"] != "job":
+            return None
+        job = Job(reply["id"], reply["industry"], reply["location"], None, reply["priority"], reply["attempts"])
+        job.tile = reply["tile"]
+        return job
+
+    def remaining(self):
+        return self.request({"type": "remaining"})["count"]
+
+    def complete(self, job, records, saturated):
+        self.send({"type": "complete", "job_id": job.id, "records": records, "saturated": saturated})
+
+    def fail(self, job_id, error):
+        self.send({"type": "fail", "job_id": job_id, "error": str(error)})
+
+    def postpone(self, job_id, error):
+        self.send({"type": "postpone", "job_id": job_id, "error": str(error)})
+
+    def close(self):
+        self.__stop.set()
+        self.connection.close()
+
+
+class RemotePlaceIndex:
+    """The coordinator's place index, seen from a remote worker; same methods
+    as place_index.PlaceIndex"""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+
+    def fresh_ids(self, place_ids):
+        place_ids = [place_id for place_id in place_ids if place_id]
+        if not place_ids:
+            return set()
+        return set(self.jobs.request({"type": "fresh_ids", "place_ids": place_ids})["ids"])
+
+    def is_fresh(self, place_id):
+        return place_id in self.fresh_ids([place_id])
+
+    def mark_scraped(self, place_id, query=None, name=None):
+        if place_id:
+            self.jobs.send({"type": "mark_scraped", "place_id": place_id, "query": query, "name": name})
+
+    def close(self):
+        pass
+
+
+class RemoteCheckpointStore:
+    """The coordinator's checkpoint store, seen from a remote worker; same
+    methods as checkpoints.CheckpointStore"""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+
+    def load(self, key):
+        saved = self.jobs.request({"type": "checkpoint_load", "key": key})["checkpoint"]
+        if saved is None:
+            return None
+        return JobCheckpoint(self, key, saved["links"], saved["feed_records"], saved["saturated"], saved["cursor"])
+
+    def start(self, key, links, feed_records=None, saturated=False):
+        feed_records = feed_records or {}
+        self.jobs.send({"type": "checkpoint_start", "key": key, "links": links, "feed_records": feed_records,
+                        "saturated": saturated})
+        return JobCheckpoint(self, key, links, feed_records, saturated)
+
+    def advance(self, key, cursor):
+        self.jobs.send({"type": "checkpoint_advance", "key": key, "cursor": cursor})
+
+    def clear(self, key):
+        self.jobs.send({"type": "checkpoint_clear", "key": key})
+
+    def close(self):
+        pass
+
+
+def wait_for_jobs(job_queue, coordinator, local_workers, interval=JOB_POLL_INTERVAL):
+    """Block until every job is done and all workers, local and remote, left"""
+    while True:
+        alive = [process for process in local_workers if process.is_alive()]
+        if job_queue.remaining() == 0 and not alive and coordinator.connected() == 0:
+            return
+        time.sleep(interval)
@@ -1,69 +1,246 @@
+import atexit
+import logging
+import multiprocessing
 import os
-import sys
-import pandas as pd
+import queue
+import threading
 from datetime import datetime
 from communicator import Communicator
 from error_codes import ERROR_CODES
+from place_index import PlaceIndex, get_place_index
+from place_ids import place_id_from_href
+from settings import SINK_FSYNC_EVERY, RESULT_QUEUE_SIZE, EXTRACT_FLUSH_INTERVAL
 import json
 
 # Set the output path to the current directory
 OUTPUT_PATH = os.path.dirname(os.path.abspath(__file__))
 
-def save_and_upload_results(results, query):
-    current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    filename = f"{query}-{current_time}.json"
-    file_path = os.path.join(OUTPUT_PATH, filename)
-    
-    try:
-        if not os.path.exists(OUTPUT_PATH):
-            os.makedirs(OUTPUT_PATH)
-        
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as file:
-                existing_data = json.load(file)
+class StreamingSink:
+    """Append-only JSON Lines file for one query.
+
+    Every record is written with a single write() on an O_APPEND descriptor as
+    soon as it is parsed, so several worker processes can share the file and
+    saving costs O(new records). Writes are fsynced in batches of fsync_every.
+    """
+
+    def __init__(self, query, output_path=OUTPUT_PATH, fsync_every=SINK_FSYNC_EVERY):
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+        self.query = query
+        self.file_path = os.path.join(output_path, f"{query}.jsonl")
+        self.fsync_every = fsync_every
+        self.records_written = 0
+        self.__unsynced = 0
+        self.__fd = os.open(self.file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        os.write(self.__fd, line.encode("utf-8"))
+        self.records_written += 1
+        self.__unsynced += 1
+        if self.__unsynced >= self.fsync_every:
+            self.flush()
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        if self.__fd is not None and self.__unsynced:
+            os.fsync(self.__fd)
+            self.__unsynced = 0
+
+    def close(self):
+        if self.__fd is not None:
+            self.flush()
+            os.close(self.__fd)
+            self.__fd = None
+
+    def rollover(self, output_format):
+        """Convert everything written so far to a timestamped csv or parquet file"""
+        self.flush()
+        if os.path.getsize(self.file_path) == 0:
+            return None
+        current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        target = os.path.join(os.path.dirname(self.file_path), f"{self.query}-{current_time}.{output_format}")
+        import pandas as pd  # Only needed to convert the output at the end of a run
+
+        records = pd.read_json(self.file_path, lines=True, dtype=False)
+        if output_format == "csv":
+            records.to_csv(target, index=False)
+        elif output_format == "parquet":
+            records.to_parquet(target, index=False)
         else:
-            existing_data = []
-        
-        existing_data.extend(results)
-        
-        with open(file_path, 'w') as file:
-            json.dump(existing_data, file, indent=4)
-        
-        print(f"Saved local JSON file: {file_path}")
-    except Exception as e:
-        print(f"Error in save_and_upload_results: {e}")
+            raise ValueError(f"Unsupported output format: {output_format}")
+        return target
+
+
+class QueueSink:
+    """Worker-side sink: hands every record to the parent's ResultWriter
+    through a multiprocessing queue instead of writing it locally"""
+
+    def __init__(self, query, result_queue):
+        self.query = query
+        self.result_queue = result_queue
+        self.records_written = 0
+        self.file_path = None
+
+    def write(self, record):
+        self.result_queue.put(("record", self.query, record))
+        self.records_written += 1
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def capture(self, capture):
+        """Hand an archived page to the parent's extraction pool"""
+        self.result_queue.put(("capture", self.query, capture))
+
+    def flush(self):
+        pass  # The queue's feeder thread delivers records as soon as they are put
+
+    def close(self):
+        pass
+
+
+class ResultWriter:
+    """Single writer in the parent process: a thread drains the records that
+    workers put on `queue` into the StreamingSink of their query, so records
+    reach the output file as they are produced rather than when a job ends.
+    Metrics snapshots sent along the same queue go to `metrics_collector`, and
+    pages captured by capture-only workers to `extraction_pool`, whose records
+    are written by this thread as their batches finish."""
+
+    def __init__(self, maxsize=RESULT_QUEUE_SIZE, metrics_collector=None, extraction_pool=None):
+        self.queue = multiprocessing.Queue(maxsize=maxsize)
+        self.metrics_collector = metrics_collector
+        self.extraction_pool = extraction_pool
+        self.records_written = 0
+        self.place_index = None
+        self.__thread = None
+
+    def write(self, query, record):
+        try:
+            get_sink(query).write(record)
+            self.records_written += 1
+        except Exception as e:
+            logging.error(f"Error while writing a record for {query}: {e}")
+
+    def write_extracted(self, results):
+        for capture, record in results:
+            if record is not None:
+                self.write(capture["query"], record)
+                self.place_index.mark_scraped(place_id_from_href(capture["url"]), capture["query"], record["Name"])
+
+    def run(self):
+        if self.extraction_pool is not None:
+            # Captured places are marked here once extracted; sqlite connections belong to one thread
+            self.place_index = PlaceIndex(get_place_index().path)
+        while True:
+            if self.extraction_pool is None:
+                item = self.queue.get()
+            else:
+                self.write_extracted(self.extraction_pool.collect())
+                try:
+                    item = self.queue.get(timeout=EXTRACT_FLUSH_INTERVAL)
+                except queue.Empty:
+                    self.extraction_pool.flush()  # Workers are quiet, extract the partial batch
+                    continue
+            if item is None:
+                break
+            kind, key, payload = item
+            if kind == "metrics":
+                if self.metrics_collector is not None:
+                    self.metrics_collector.add(key, payload)
+                continue
+            if kind == "capture":
+                if self.extraction_pool is not None:
+                    self.extraction_pool.submit(payload)
+                else:
+                    logging.warning(f"No extraction pool for the capture of {payload['url']}, run reextract.py for it")
+                continue
+            self.write(key, payload)
+        if self.extraction_pool is not None:
+            self.write_extracted(self.extraction_pool.close())
+            self.place_index.close()
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.run, name="result-writer", daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """Write everything queued so far, then stop. Call once the workers have
+        exited so that all their records are already on the queue."""
+        if self.__thread is None:
+            return
+        self.queue.put(None)
+        self.__thread.join()
+        self.__thread = None
+        for sink in _sinks.values():
+            sink.flush()
+
+
+_sinks = {}
+_result_queue = None
+_output_path = OUTPUT_PATH
+
+
+def set_result_queue(result_queue):
+    """Route this process's records to the parent's ResultWriter"""
+    global _result_queue
+    _result_queue = result_queue
+
+
+def set_output_path(output_path):
+    """Write this process's output files to output_path instead of OUTPUT_PATH"""
+    global _output_path
+    _output_path = output_path
+
+
+def send_metrics(key, snapshot):
+    """Hand a worker's metrics snapshot to the parent's ResultWriter;
+    returns False outside of a worker"""
+    if _result_queue is None:
+        return False
+    _result_queue.put(("metrics", key, snapshot))
+    return True
+
+
+def get_sink(query):
+    """The sink of this process for a query, opened on first use"""
+    if query not in _sinks:
+        if _result_queue is not None:
+            _sinks[query] = QueueSink(query, _result_queue)
+        else:
+            _sinks[query] = StreamingSink(query, _output_path)
+    return _sinks[query]
+
+
+def close_sinks():
+    for sink in _sinks.values():
+        sink.close()
+    _sinks.clear()
+
+
+atexit.register(close_sinks)
 
 class DataSaver:
     def __init__(self) -> None:
         self.outputFormat = Communicator.get_output_format()
 
     def save(self, datalist, query):
-        Communicator.show_message(f"Starting save function with datalist: {datalist} and query: {query}")
+        """Append records to the query's JSON Lines file"""
         try:
             if len(datalist) > 0:
-                Communicator.show_message("Saving the scraped data")
-                totalRecords = len(datalist)
-                current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-                filename = f"{query}-{current_time}.json"
-                file_path = os.path.join(OUTPUT_PATH, filename)
-                Communicator.show_message(f"Saving data to path: {file_path}")
-
-                if os.path.exists(file_path):
-                    with open(file_path, 'r') as file:
-                        existing_data = json.load(file)
-                else:
-                    existing_data = []
-
-                existing_data.extend(datalist)
-
-                with open(file_path, 'w') as file:
-                    json.dump(existing_data, file, indent=4)
-                
-                Communicator.show_message(f"Successfully saved, total records saved: {totalRecords}.")
-                return file_path
+                sink = get_sink(query)
+                sink.write_many(datalist)
+                sink.flush()
+                Communicator.show_message(f"Successfully saved, total records saved: {len(datalist)}.")
+                return sink.file_path
             else:
-                Communicator.show_error_message("Could not scrape the data because you did not scrape any record.", {ERROR_CODES['NO_RECORD_TO_SAVE']})
+                Communicator.show_error_message("Could not scrape the data because you did not scrape any record.", ERROR_CODES['NO_RECORD_TO_SAVE'])
                 return None
         except Exception as e:
-            Communicator.show_error_message(f"Error while saving data: {e}")
+            Communicator.show_error_message(f"Error while saving data: {e}", ERROR_CODES['ERR_WHILE_SAVING'])
             return None
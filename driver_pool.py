@@ -0,0 +1,195 @@
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+import undetected_chromedriver as uc
+from communicator import Communicator
+from metrics import Metrics, DRIVER_INIT
+from wait_policy import RetryPolicy
+from proxy_pool import get_proxy_pool
+from lean_mode import configure_options, claim_cache_dir, enable_blocking
+from settings import DRIVER_EXECUTABLE_PATH, DRIVER_RECYCLE_AFTER_PAGES, LEAN_MODE
+
+
+def start_chrome(headless_mode):
+    """Start one chrome driver, cleaning up its profile and cache slot if it fails"""
+    tmpdirname = None
+    cache_lock = None
+    proxy = get_proxy_pool().acquire()
+    try:
+        options = uc.ChromeOptions()
+        if headless_mode == 1:
+            options.add_argument("--headless=new")
+        if proxy:
+            options.add_argument(f"--proxy-server={proxy}")
+
+        prefs = {"profile.managed_default_content_settings.images": 2}
+        options.add_experimental_option("prefs", prefs)
+
+        if LEAN_MODE:
+            configure_options(options)
+            cache_dir, cache_lock = claim_cache_dir()
+            if cache_dir:
+                options.add_argument(f"--disk-cache-dir={cache_dir}")
+
+        Communicator.show_message("Wait checking for driver...\nIf you don't have webdriver in your machine it will install it")
+
+        tmpdirname = tempfile.mkdtemp()
+        options.add_argument(f"--user-data-dir={tmpdirname}")
+        logging.info(f"Using temporary directory for Chrome: {tmpdirname}")
+
+        if DRIVER_EXECUTABLE_PATH:
+            driver = uc.Chrome(driver_executable_path=DRIVER_EXECUTABLE_PATH, options=options)
+        else:
+            driver = uc.Chrome(options=options)
+        driver.profile_dir = tmpdirname  # Removed once the driver quits
+        driver.cache_lock = cache_lock  # Released once the driver quits
+        driver.proxy = proxy  # Handed back to the proxy pool once the driver quits
+        if LEAN_MODE:
+            enable_blocking(driver)
+        return driver
+    except Exception:
+        get_proxy_pool().release(proxy)
+        if tmpdirname:
+            shutil.rmtree(tmpdirname, ignore_errors=True)
+        if cache_lock:
+            cache_lock.close()
+        raise
+
+
+def create_driver(headless_mode):
+    """Start a new chrome driver, retrying up to 3 times with backoff.
+
+    No implicit wait is set: a missing element fails right away, and the
+    code that has to wait for something does so with an explicit wait."""
+    started = time.perf_counter()
+    driver = RetryPolicy(max_attempts=3).call(
+        lambda: start_chrome(headless_mode), description="Chrome driver initialization"
+    )
+
+    Communicator.show_message("Opening browser...")
+    driver.maximize_window()
+    Metrics.record(DRIVER_INIT, time.perf_counter() - started)
+    return driver
+
+
+def quit_driver(driver):
+    try:
+        driver.quit()
+    except Exception as e:
+        logging.warning(f"Error while quitting driver: {e}")
+    profile_dir = getattr(driver, "profile_dir", None)
+    if profile_dir and os.path.exists(profile_dir):
+        shutil.rmtree(profile_dir, ignore_errors=True)
+    cache_lock = getattr(driver, "cache_lock", None)
+    if cache_lock:
+        cache_lock.close()
+    proxy = getattr(driver, "proxy", None)
+    if proxy:
+        get_proxy_pool().release(proxy)
+
+
+class DriverLease:
+    """A driver handed out by the pool. Jobs add the pages they loaded to
+    `pages` so the pool knows when to recycle the driver, and set `discard`
+    when it must not be reused (e.g. its identity got blocked)."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.discard = False
+
+
+class DriverPool:
+    """Long-lived pool of warm chrome drivers.
+
+    Drivers are started lazily (at most `size` of them), handed to jobs through
+    lease() and taken back afterwards. A driver that fails its health check or
+    has loaded `recycle_after` pages is quit and replaced on the next acquire.
+    """
+
+    def __init__(self, size, headless_mode, recycle_after=DRIVER_RECYCLE_AFTER_PAGES):
+        self.size = size
+        self.headless_mode = headless_mode
+        self.recycle_after = recycle_after
+        self.__idle = queue.LifoQueue()  # Most recently used driver is the warmest
+        self.__pages = {}
+        self.__started = 0
+        self.__lock = threading.Lock()
+        self.__closed = False
+
+    @staticmethod
+    def is_healthy(driver):
+        try:
+            driver.window_handles
+            return driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def acquire(self, timeout=None):
+        while True:
+            try:
+                driver = self.__idle.get_nowait()
+            except queue.Empty:
+                with self.__lock:
+                    can_start = self.__started < self.size
+                    if can_start:
+                        self.__started += 1
+
+                if can_start:
+                    try:
+                        driver = create_driver(self.headless_mode)
+                    except Exception:
+                        with self.__lock:
+                            self.__started -= 1
+                        raise
+                    self.__pages[id(driver)] = 0
+                    return driver
+
+                driver = self.__idle.get(timeout=timeout)
+
+            if self.is_healthy(driver):
+                return driver
+            logging.warning("Pooled driver failed its health check, replacing it")
+            self.__discard(driver)
+
+    def release(self, driver, pages=0, discard=False):
+        pages_loaded = self.__pages.get(id(driver), 0) + pages
+        self.__pages[id(driver)] = pages_loaded
+
+        if discard or self.__closed or pages_loaded >= self.recycle_after or not self.is_healthy(driver):
+            logging.info(f"Recycling driver after {pages_loaded} pages")
+            self.__discard(driver)
+        else:
+            self.__idle.put(driver)
+
+    @contextmanager
+    def lease(self, timeout=None):
+        lease = DriverLease(self.acquire(timeout=timeout))
+        try:
+            yield lease
+        finally:
+            self.release(lease.driver, lease.pages, lease.discard)
+
+    def __discard(self, driver):
+        self.__pages.pop(id(driver), None)
+        quit_driver(driver)
+        with self.__lock:
+            self.__started -= 1
+
+    def quit_idle(self):
+        """Quit every driver not leased right now, e.g. while the worker is paused"""
+        while True:
+            try:
+                driver = self.__idle.get_nowait()
+            except queue.Empty:
+                break
+            self.__discard(driver)
+
+    def close(self):
+        self.__closed = True
+        self.quit_idle()
@@ -2,5 +2,9 @@
 
 ERROR_CODES  = {
 'NO_RECORD_TO_SAVE' : 'ds0',
+'ERR_WHILE_SAVING' : 'ds1',
 'ERR_WHILE_PARSING_DETAILS':'pp0',
+'ERR_NO_INFO_SHEET':'pp1',
+'ERR_NO_NAME':'pp2',
+'ERR_NAVIGATION_FAILED':'bs0',
 }
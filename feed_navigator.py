@@ -0,0 +1,224 @@
+"""In-page navigation of google maps, which is a single page app.
+
+Instead of loading every place URL (a full bootstrap of the maps app), the
+FeedNavigator clicks the result cards of the feed that is already loaded and
+waits for the side panel to show the clicked place, and search_in_page runs
+the next search from the search box of the loaded app.
+"""
+import time
+from communicator import Communicator
+from common import Common
+from metrics import Metrics, DETAIL_PAGE_LOAD, READY_WAIT
+from blocking import check_page
+from place_ids import place_id_from_href
+from rate_limiter import get_rate_limiter
+from settings import PANEL_TIMEOUT
+from wait_policy import wait_until
+
+# Clicks the feed card whose anchor has the href arguments[0], after marking
+# every place sheet on screen as stale with its heading text, so that its
+# replacement can be told apart
+CLICK_RESULT_SCRIPT = """
+const href = arguments[0];
+for (const main of document.querySelectorAll("[role='main']")) {
+    if (main.querySelector("[role='feed']") === null) {
+        main.dataset.stale = main.querySelector('h1')?.textContent ?? '';
+    }
+}
+for (const anchor of document.querySelectorAll('[role="feed"] a.hfpxzc')) {
+    if (anchor.getAttribute('href') === href) {
+        anchor.scrollIntoView({block: 'center'});
+        anchor.click();
+        return true;
+    }
+}
+return false;
+"""
+
+# Place sheets rendered after the last click: a sheet without the stale
+# marker, or one whose heading changed since (maps may render the next place
+# into the same element). A plain place page has no marker at all.
+FRESH_SHEETS = """
+const freshSheets = () => [...document.querySelectorAll("[role='main']")].filter((main) => {
+    const heading = (main.querySelector('h1')?.textContent ?? '').trim();
+    return heading !== ''
+        && main.querySelector("[role='feed']") === null
+        && (main.dataset.stale === undefined || main.dataset.stale.trim() !== heading);
+});
+"""
+
+# URL of the app and whether the side panel shows a fresh place sheet
+PLACE_PANEL_SCRIPT = FRESH_SHEETS + """
+return {url: location.href, fresh: freshSheets().length > 0};
+"""
+
+# Async version of PLACE_PANEL_SCRIPT: resolves as soon as a fresh sheet is
+# rendered, or after arguments[0] milliseconds
+WAIT_FOR_PANEL_SCRIPT = FRESH_SHEETS + """
+const timeoutMs = arguments[0];
+const done = arguments[arguments.length - 1];
+const state = () => ({url: location.href, fresh: freshSheets().length > 0});
+
+const initial = state();
+if (initial.fresh) {
+    done(initial);
+    return;
+}
+let timer = null;
+const observer = new MutationObserver(() => {
+    const current = state();
+    if (current.fresh) {
+        observer.disconnect();
+        clearTimeout(timer);
+        done(current);
+    }
+});
+observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+timer = setTimeout(() => {
+    observer.disconnect();
+    done(state());
+}, timeoutMs);
+"""
+
+# The place sheet to parse: the last fresh one, so a stale sheet still in the
+# DOM is never parsed; a page without any sheet gives its [role='main']
+PLACE_SHEET_SCRIPT = FRESH_SHEETS + """
+const sheets = freshSheets();
+if (sheets.length) {
+    return sheets[sheets.length - 1];
+}
+const anySheet = [...document.querySelectorAll("[role='main']")].some((main) => main.querySelector('h1') !== null);
+return anySheet ? null : document.querySelector("[role='main']");
+"""
+
+# Search results of a search typed into the loaded app are ready once a feed
+# (or the sheet of a single match) replaced the one marked before typing
+NEW_SEARCH_READY_SCRIPT = """
+const feed = document.querySelector('[role="feed"]');
+if (feed !== null) {
+    return !feed.hasAttribute('data-stale');
+}
+const heading = document.querySelector("[role='main'] h1");
+return heading !== null && !heading.hasAttribute('data-stale');
+"""
+
+MARK_STALE_SCRIPT = """
+for (const element of document.querySelectorAll('[role="feed"], [role="main"] h1')) {
+    element.setAttribute('data-stale', element.textContent.slice(0, 200));
+}
+"""
+
+SEARCH_BOX_ID = "searchboxinput"
+URL_LAG_WAIT = 0.05  # Seconds between checks of a sheet shown before the app updated its URL
+
+
+def panel_shows(link):
+    """Wait condition: the side panel shows the place link points to"""
+    place_id = place_id_from_href(link)
+
+    def condition(driver):
+        panel = driver.execute_script(PLACE_PANEL_SCRIPT)
+        return bool(panel and panel["fresh"] and place_id_from_href(panel["url"]) == place_id)
+
+    return condition
+
+
+def search_in_page(driver, query):
+    """Type query into the search box of the loaded app and wait for its
+    results; returns False when there is no search box or nothing changed"""
+    from selenium.common.exceptions import WebDriverException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+
+    get_rate_limiter().acquire()
+    try:
+        driver.execute_script(MARK_STALE_SCRIPT)
+        search_box = driver.find_element(By.ID, SEARCH_BOX_ID)
+        search_box.clear()
+        search_box.send_keys(query + Keys.ENTER)
+    except WebDriverException as e:
+        Communicator.show_message(f"Could not search from the search box: {e.msg}")
+        return False
+    Metrics.increment("in_page_searches")
+    if wait_until(driver, lambda current: current.execute_script(NEW_SEARCH_READY_SCRIPT)) is None:
+        check_page(driver)
+        return False
+    return True
+
+
+class FeedNavigator:
+    """Opens place sheets by clicking their cards in the loaded feed.
+
+    One place is open at a time: its card is clicked, the side panel is
+    awaited in the page and handed to Parser.parse, which reads the sheet
+    through PLACE_SHEET_SCRIPT. With several tabs, TabFetcher clicks cards in
+    the feed tab while its other tabs load places by URL; alone, fetch()
+    opens the links one after the other and returns those whose card is gone
+    from the feed or whose sheet did not show within page_timeout.
+    """
+
+    def __init__(self, driver, parser, page_timeout=PANEL_TIMEOUT):
+        self.driver = driver
+        self.parser = parser
+        self.page_timeout = page_timeout
+        self.timed_out = 0
+        self.driver.set_script_timeout(page_timeout + 5)
+
+    def click(self, link):
+        """Click the card of link; False when it is not in the feed"""
+        get_rate_limiter().acquire()
+        return bool(self.driver.execute_script(CLICK_RESULT_SCRIPT, link))
+
+    def shows(self, link):
+        """Whether the side panel shows the place of link right now"""
+        return panel_shows(link)(self.driver)
+
+    def wait(self, link, timeout):
+        """Wait in the page, without polling, until the side panel shows the
+        place of link; False when it did not within timeout"""
+        place_id = place_id_from_href(link)
+        deadline = time.monotonic() + timeout
+        with Metrics.timer(READY_WAIT):
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                panel = self.driver.execute_async_script(WAIT_FOR_PANEL_SCRIPT, int(remaining * 1000))
+                if panel["fresh"] and place_id_from_href(panel["url"]) == place_id:
+                    return True
+                if panel["fresh"]:
+                    time.sleep(min(URL_LAG_WAIT, remaining))  # The sheet showed before the URL changed
+
+    def parse(self, link, started):
+        """Hand the sheet of link, on screen since a click at started, to the parser"""
+        Metrics.record(DETAIL_PAGE_LOAD, time.monotonic() - started)
+        Metrics.increment("pages")
+        Metrics.increment("panel_clicks")
+        self.parser.pages_loaded += 1
+        self.parser.panel_pages += 1
+        self.parser.currentLink = link
+        self.parser.parse()
+
+    def give_up(self, link):
+        """A clicked sheet did not show in time: fail the job on a captcha,
+        otherwise the link is left to be loaded by URL"""
+        check_page(self.driver)
+        self.timed_out += 1
+
+    def fetch(self, links):
+        """Parse every link that opens in the panel; returns the others"""
+        fallback = []
+        for link in links:
+            if Common.close_thread_is_set():
+                return []
+            started = time.monotonic()
+            if not self.click(link):
+                fallback.append(link)
+            elif not self.wait(link, self.page_timeout):
+                self.give_up(link)
+                fallback.append(link)
+            else:
+                self.parse(link, started)
+        if fallback:
+            Communicator.show_message(f"{len(fallback)} places did not open from the feed, loading them by URL")
+        return fallback
@@ -0,0 +1,73 @@
+import glob
+import hashlib
+import json
+import os
+from settings import RECORD_FIXTURES_DIR
+
+FEED = "feed"
+PLACE = "place"
+
+
+class FixtureStore:
+    """Directory of pages recorded while scraping, for offline replays.
+
+    Every page is saved as <kind>_<url hash>.html (the outerHTML of the feed
+    or of a place's [role='main'] sheet) next to a .json file holding its URL
+    and metadata. Files are named after the URL, so several workers can record
+    into the same directory and a page seen twice is simply overwritten. The
+    .html files use the naming benchmark_parser.py expects.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+
+    def path(self, kind, url, extension):
+        return os.path.join(self.directory, f"{kind}_{self.key(url)}.{extension}")
+
+    def save(self, kind, url, html, **meta):
+        for extension, content in (("html", html), ("json", json.dumps({"url": url, **meta}, ensure_ascii=False))):
+            target = self.path(kind, url, extension)
+            temporary = f"{target}.{os.getpid()}.tmp"
+            with open(temporary, "w", encoding="utf-8") as file:
+                file.write(content)
+            os.replace(temporary, target)  # Readers never see a half written page
+
+    def record_feed(self, url, query, html, reached_end):
+        self.save(FEED, url, html, query=query, reached_end=reached_end)
+
+    def record_place(self, url, html):
+        self.save(PLACE, url, html)
+
+    def read(self, kind, url):
+        """(html, meta) of a recorded page, or None"""
+        try:
+            with open(self.path(kind, url, "json"), "r", encoding="utf-8") as file:
+                meta = json.load(file)
+            with open(self.path(kind, url, "html"), "r", encoding="utf-8") as file:
+                return file.read(), meta
+        except FileNotFoundError:
+            return None
+
+    def list(self, kind):
+        """Metadata of every recorded page of a kind"""
+        pages = []
+        for path in sorted(glob.glob(os.path.join(self.directory, f"{kind}_*.json"))):
+            with open(path, "r", encoding="utf-8") as file:
+                pages.append(json.load(file))
+        return pages
+
+
+_fixture_store = None
+
+
+def get_fixture_store():
+    """The store pages are recorded to, or None when recording is off"""
+    global _fixture_store
+    if _fixture_store is None and RECORD_FIXTURES_DIR:
+        _fixture_store = FixtureStore(RECORD_FIXTURES_DIR)
+    return _fixture_store
@@ -0,0 +1,166 @@
+import math
+from collections import deque
+from settings import (
+    VIEWPORT_WIDTH_PX,
+    PEOPLE_PER_SQ_KM,
+    MIN_CITY_RADIUS_KM,
+    MIN_ZOOM,
+    MAX_ZOOM,
+    QUADTREE_MAX_DEPTH,
+    QUADTREE_MIN_SPAN_KM,
+)
+
+EARTH_RADIUS_KM = 6371.0088
+METERS_PER_PIXEL_AT_ZOOM_0 = 156543.03392
+
+
+def offset(lat, long, north_km, east_km):
+    """Move a point by the given distances (small-distance approximation)"""
+    new_lat = lat + math.degrees(north_km / EARTH_RADIUS_KM)
+    new_long = long + math.degrees(east_km / (EARTH_RADIUS_KM * math.cos(math.radians(lat))))
+    return new_lat, new_long
+
+
+def city_radius_km(population):
+    """Rough radius of a city assuming a uniform population density"""
+    area = max(population, 0) / PEOPLE_PER_SQ_KM
+    return max(MIN_CITY_RADIUS_KM, math.sqrt(area / math.pi))
+
+
+def zoom_for_span(span_km, lat):
+    """Zoom level at which span_km fits in the width of the results viewport"""
+    meters_per_pixel = span_km * 1000 / VIEWPORT_WIDTH_PX
+    zoom = math.log2(METERS_PER_PIXEL_AT_ZOOM_0 * math.cos(math.radians(lat)) / meters_per_pixel)
+    return round(min(MAX_ZOOM, max(MIN_ZOOM, zoom)), 2)
+
+
+def build_search_url(searchquery, lat, long, zoom):
+    querywithplus = "+".join(searchquery.split())
+    return f"https://www.google.com/maps/search/{querywithplus}/@{lat:.6f},{long:.6f},{zoom}z"
+
+
+class Tile:
+    """A square map viewport described by its center and side length in km"""
+
+    def __init__(self, lat, long, span_km, depth=0, start_angle=None, end_angle=None):
+        self.lat = lat
+        self.long = long
+        self.span_km = span_km
+        self.depth = depth
+        self.start_angle = start_angle
+        self.end_angle = end_angle
+
+    @property
+    def zoom(self):
+        return zoom_for_span(self.span_km, self.lat)
+
+    def url(self, searchquery):
+        return build_search_url(searchquery, self.lat, self.long, self.zoom)
+
+    def split(self):
+        """Divide the tile into its four quadrants"""
+        quarter = self.span_km / 4
+        children = []
+        for north_km, east_km in ((quarter, -quarter), (quarter, quarter), (-quarter, -quarter), (-quarter, quarter)):
+            lat, long = offset(self.lat, self.long, north_km, east_km)
+            children.append(Tile(lat, long, self.span_km / 2, depth=self.depth + 1))
+        return children
+
+    def to_dict(self):
+        return {
+            "lat": self.lat,
+            "long": self.long,
+            "span_km": self.span_km,
+            "depth": self.depth,
+            "start_angle": self.start_angle,
+            "end_angle": self.end_angle,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def key(self):
+        return f"{self.lat:.5f},{self.long:.5f},{self.span_km:.3f}"
+
+    def __repr__(self):
+        return f"Tile(lat={self.lat:.5f}, long={self.long:.5f}, span_km={self.span_km:.2f}, zoom={self.zoom})"
+
+
+def slice_tile(lat_center, long_center, start_angle, end_angle, radius_km):
+    """Smallest square viewport covering one pie slice of the city disc.
+
+    Angles are in radians, counter-clockwise from east. The slice outline is
+    sampled and its bounding box becomes the tile, so every point of the
+    slice is searched; the boxes of neighbouring slices overlap towards the
+    city center, which `--tiling grid` avoids.
+    """
+    steps = max(2, int(math.degrees(end_angle - start_angle) // 10) + 1)
+    points = [(0.0, 0.0)]
+    for i in range(steps + 1):
+        angle = start_angle + (end_angle - start_angle) * i / steps
+        points.append((radius_km * math.sin(angle), radius_km * math.cos(angle)))
+
+    norths = [p[0] for p in points]
+    easts = [p[1] for p in points]
+    span_km = max(max(norths) - min(norths), max(easts) - min(easts))
+    lat, long = offset(lat_center, long_center, (max(norths) + min(norths)) / 2, (max(easts) + min(easts)) / 2)
+    return Tile(lat, long, span_km, start_angle=start_angle, end_angle=end_angle)
+
+
+def grid_tiles(lat_center, long_center, radius_km, num_divisions):
+    """Cover the city disc with a square grid of at least num_divisions tiles,
+    dropping tiles that fall entirely outside the disc"""
+    side = math.ceil(math.sqrt(num_divisions))
+    span_km = 2 * radius_km / side
+    tiles = []
+    for row in range(side):
+        for col in range(side):
+            north_km = radius_km - span_km * (row + 0.5)
+            east_km = -radius_km + span_km * (col + 0.5)
+            nearest_north = max(abs(north_km) - span_km / 2, 0)
+            nearest_east = max(abs(east_km) - span_km / 2, 0)
+            if math.hypot(nearest_north, nearest_east) > radius_km:
+                continue
+            lat, long = offset(lat_center, long_center, north_km, east_km)
+            tiles.append(Tile(lat, long, span_km))
+    return tiles
+
+
+class QuadtreePlanner:
+    """Adaptive tiling: every tile is scraped once and only the tiles whose
+    feed came back saturated are split into four children and scraped again.
+
+    Sparse areas cost one browser visit while dense ones get as much depth as
+    they need (bounded by max_depth and min_span_km).
+    """
+
+    def __init__(self, root=None, max_depth=QUADTREE_MAX_DEPTH, min_span_km=QUADTREE_MIN_SPAN_KM):
+        self.max_depth = max_depth
+        self.min_span_km = min_span_km
+        self.pending = deque([root] if root else [])
+        self.visited = 0
+        self.subdivided = 0
+
+    def has_pending(self):
+        return bool(self.pending)
+
+    def take_pending(self):
+        """Hand out every tile that is ready to be scraped"""
+        tiles = list(self.pending)
+        self.pending.clear()
+        return tiles
+
+    def should_subdivide(self, tile, saturated):
+        return saturated and tile.depth < self.max_depth and tile.span_km / 2 >= self.min_span_km
+
+    def report(self, tile, saturated):
+        """Record the outcome of a scraped tile, queueing its children if needed"""
+        self.visited += 1
+        if not self.should_subdivide(tile, saturated):
+            return []
+
+        children = tile.split()
+        self.subdivided += 1
+        self.pending.extend(children)
+        return children
@@ -0,0 +1,98 @@
+import logging
+import threading
+import psutil
+from multiprocessing import Value
+from settings import GOVERNOR_INTERVAL, GOVERNOR_HEADROOM, GOVERNOR_STATUS_EVERY
+
+CHROME_PROCESS_NAMES = ("chrome", "chromedriver", "undetected_chromedriver")
+
+
+class ConcurrencyGovernor:
+    """Scales the number of active browser workers to the machine's resources.
+
+    Runs in the parent process: a background thread samples CPU, RAM and the
+    RSS of every chrome process started by the workers, and moves `target`
+    between min_workers and max_workers. Workers read the shared target and
+    only take jobs while their index is below it; `busy` counts the workers
+    currently running a job.
+    """
+
+    def __init__(self, min_workers, max_workers, max_cpu, max_ram, max_chrome_rss, interval=GOVERNOR_INTERVAL):
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.max_cpu = max_cpu
+        self.max_ram = max_ram
+        self.max_chrome_rss = max_chrome_rss
+        self.interval = interval
+        self.target = Value("i", max(min_workers, 1))  # Start small, grow while there is headroom
+        self.busy = Value("i", 0)
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    @staticmethod
+    def chrome_rss():
+        """Total resident memory of the chrome processes below this process"""
+        total = 0
+        for child in psutil.Process().children(recursive=True):
+            try:
+                if child.name().lower().startswith(CHROME_PROCESS_NAMES):
+                    total += child.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return total
+
+    def sample(self):
+        return {
+            "cpu": psutil.cpu_percent(interval=None),  # Usage since the previous sample, does not block
+            "ram": psutil.virtual_memory().used,
+            "chrome_rss": self.chrome_rss(),
+        }
+
+    def adjust(self, usage):
+        """Lower the target when a limit is exceeded, raise it when every
+        resource has headroom; returns the new target"""
+        target = self.target.value
+        overloaded = (
+            usage["cpu"] > self.max_cpu
+            or usage["ram"] > self.max_ram
+            or usage["chrome_rss"] > self.max_chrome_rss
+        )
+        has_headroom = (
+            usage["cpu"] < self.max_cpu - GOVERNOR_HEADROOM
+            and usage["ram"] < self.max_ram * (1 - GOVERNOR_HEADROOM / 100)
+            and usage["chrome_rss"] < self.max_chrome_rss * (1 - GOVERNOR_HEADROOM / 100)
+        )
+
+        if overloaded and target > self.min_workers:
+            self.target.value = target - 1
+            logging.warning(f"Reducing concurrent drivers to {target - 1} due to high resource usage. {self.describe(usage)}")
+        elif has_headroom and not overloaded and target < self.max_workers:
+            self.target.value = target + 1
+            logging.info(f"Increasing concurrent drivers to {target + 1}. {self.describe(usage)}")
+        return self.target.value
+
+    def describe(self, usage):
+        gb = 1024 ** 3
+        return (
+            f"Active {self.busy.value}/{self.target.value} workers, cpu {usage['cpu']:.0f}%, "
+            f"ram {usage['ram'] / gb:.1f} GB, chrome rss {usage['chrome_rss'] / gb:.2f} GB"
+        )
+
+    def run(self):
+        psutil.cpu_percent(interval=None)  # First call only sets the baseline
+        samples = 0
+        while not self.__stop.wait(self.interval):
+            usage = self.sample()
+            self.adjust(usage)
+            samples += 1
+            if samples % GOVERNOR_STATUS_EVERY == 0:
+                logging.info(f"Concurrency: {self.describe(usage)}")
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.run, name="governor", daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+        if self.__thread:
+            self.__thread.join()
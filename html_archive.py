@@ -0,0 +1,177 @@
+"""Content-addressed archive of captured place sheets, and the process pool
+that extracts records from it.
+
+In capture-only mode browser workers do not parse: Parser.parse puts the
+sheet's outerHTML into the archive, appends a capture to its log and sends
+the capture to the parent, whose ResultWriter hands it to an ExtractionPool.
+Remote workers send the compressed object along, and the coordinator stores
+it into the archive of its own host before the capture is extracted.
+Since every page ever captured stays in the archive, reextract.py can
+rebuild all records in parallel after google renames a class.
+
+    <archive>/objects/ab/cdef....html.gz   gzip of the html, named after its sha256
+    <archive>/captures.jsonl               {"query", "url", "digest", "captured_at"} per capture
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from settings import HTML_ARCHIVE_DIR, EXTRACT_PROCESSES, EXTRACT_BATCH_SIZE, PARSER_ENGINE
+
+CAPTURES_FILE = "captures.jsonl"
+
+
+class HtmlArchive:
+    """Pages stored once per distinct content; identical sheets captured by
+    several workers or runs share one object. Objects are written to a
+    temporary file and renamed, and the capture log is appended with one
+    write per line, so any number of processes can capture into it."""
+
+    def __init__(self, directory=HTML_ARCHIVE_DIR):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.directory, "objects", digest[:2], f"{digest[2:]}.html.gz")
+
+    def put(self, html):
+        """Store html unless already present; returns its digest"""
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        target = self.path(digest)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            temporary = f"{target}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as file:
+                file.write(gzip.compress(data, compresslevel=6))
+            os.replace(temporary, target)
+        return digest
+
+    def get(self, digest):
+        return gzip.decompress(self.read_object(digest)).decode("utf-8")
+
+    def read_object(self, digest):
+        """Compressed object as stored, to ship it to another host's archive"""
+        with open(self.path(digest), "rb") as file:
+            return file.read()
+
+    def put_object(self, digest, data):
+        """Store an object read from another archive, unless already present"""
+        target = self.path(digest)
+        if not os.path.exists(target):
+            if hashlib.sha256(gzip.decompress(data)).hexdigest() != digest:
+                raise ValueError(f"Object {digest} does not match its content")
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            temporary = f"{target}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as file:
+                file.write(data)
+            os.replace(temporary, target)
+
+    def log(self, query, url, digest):
+        """Append a capture to the log; returns it"""
+        capture = {"query": query, "url": url, "digest": digest, "captured_at": round(time.time(), 3)}
+        return self.append(capture)
+
+    def append(self, capture):
+        """Append a capture made elsewhere, e.g. by a remote worker, to the log"""
+        line = json.dumps(capture, ensure_ascii=False) + "\n"
+        fd = os.open(os.path.join(self.directory, CAPTURES_FILE), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+        return capture
+
+    def captures(self):
+        """Latest capture of every (query, url), in log order"""
+        path = os.path.join(self.directory, CAPTURES_FILE)
+        if not os.path.exists(path):
+            return []
+        latest = {}
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    capture = json.loads(line)
+                    latest[(capture["query"], capture["url"])] = capture
+        return list(latest.values())
+
+
+def extract_batch(directory, captures, engine_name=PARSER_ENGINE):
+    """(capture, record or None) for a batch of captures; runs in a pool process"""
+    from parse_engines import get_engine
+
+    archive = HtmlArchive(directory)
+    engine = get_engine(engine_name)
+    extracted = []
+    for capture in captures:
+        try:
+            record = engine.extract_place(archive.get(capture["digest"]))
+        except Exception as e:
+            logging.error(f"Could not extract {capture['url']}: {e}")
+            record = None
+        extracted.append((capture, record if record and record["Name"] else None))
+    return extracted
+
+
+class ExtractionPool:
+    """Extracts captures in batches of batch_size on a pool of processes.
+
+    submit() collects captures into batches, flush() sends a partial batch,
+    and collect() returns the (capture, record or None) pairs of the batches
+    that are done, so the caller writes records from its own thread.
+    """
+
+    def __init__(self, directory=HTML_ARCHIVE_DIR, processes=EXTRACT_PROCESSES, batch_size=EXTRACT_BATCH_SIZE,
+                 engine_name=PARSER_ENGINE):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.engine_name = engine_name
+        self.extracted = 0
+        self.failed = 0
+        self.__batch = []
+        self.__pending = []
+        self.__executor = ProcessPoolExecutor(max_workers=processes)
+
+    def submit(self, capture):
+        self.__batch.append(capture)
+        if len(self.__batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.__batch:
+            self.__pending.append(self.__executor.submit(extract_batch, self.directory, self.__batch, self.engine_name))
+            self.__batch = []
+
+    def collect(self, wait=False):
+        done = [future for future in self.__pending if wait or future.done()]
+        self.__pending = [future for future in self.__pending if future not in done]
+        results = []
+        for future in done:
+            for capture, record in future.result():
+                results.append((capture, record))
+                if record is None:
+                    self.failed += 1
+                else:
+                    self.extracted += 1
+        return results
+
+    def close(self):
+        """Extract everything submitted so far; returns the remaining results"""
+        self.flush()
+        results = self.collect(wait=True)
+        self.__executor.shutdown()
+        return results
+
+
+_html_archive = None
+
+
+def get_html_archive():
+    """The archive of this process, opened on first use"""
+    global _html_archive
+    if _html_archive is None:
+        _html_archive = HtmlArchive()
+    return _html_archive
@@ -0,0 +1,193 @@
+"""Place pages over plain HTTP instead of a chrome render.
+
+The HTML google maps serves for a /maps/place/ URL already carries the place
+in its embedded initialization state:
+
+    window.APP_INITIALIZATION_STATE=[..., [..., ..., ..., ..., ..., ..., ")]}'\\n[...]"], ...];
+
+The string at APP_INITIALIZATION_STATE[3][6] is the place payload behind
+google's anti-JSON-hijacking prefix, and PLACE_FIELDS says where each field
+lives in it. Pages whose payload is missing or has no name (consent pages,
+layout changes) yield None and are left to the chrome parser.
+"""
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from blocking import CAPTCHA, RATE_LIMITED, report_block
+from metrics import Metrics, HTTP_FETCH, PARSE
+from parse_engines import build_record
+from proxy_pool import get_proxy_pool
+from rate_limiter import get_rate_limiter
+from settings import HTTP_POOL_SIZE, HTTP_TIMEOUT, HTTP_USER_AGENT, HTTP_ACCEPT_LANGUAGE
+
+STATE_MARKER = "APP_INITIALIZATION_STATE="
+STATE_PAYLOAD_PATH = (3, 6)
+XSSI_PREFIX = ")]}'"
+
+# Path of every field in the place payload, starting at its place entry (index 6)
+PLACE_FIELDS = {
+    "name": (6, 11),
+    "address": (6, 39),
+    "phone": (6, 178, 0, 0),
+    "website": (6, 7, 0),
+    "rating": (6, 4, 7),
+    "reviews": (6, 4, 8),
+}
+
+
+def dig(data, path):
+    """Value at path in nested lists, None when any step is missing"""
+    for index in path:
+        if not isinstance(data, list) or index >= len(data):
+            return None
+        data = data[index]
+    return data
+
+
+def read_state(html):
+    """The decoded APP_INITIALIZATION_STATE of a page, or None"""
+    start = html.find(STATE_MARKER)
+    if start == -1:
+        return None
+    try:
+        state, _ = json.JSONDecoder().raw_decode(html, start + len(STATE_MARKER))
+    except ValueError:
+        return None
+    return state
+
+
+def read_place_payload(html):
+    state = read_state(html)
+    payload = dig(state, STATE_PAYLOAD_PATH)
+    if not isinstance(payload, str) or not payload.startswith(XSSI_PREFIX):
+        return None
+    try:
+        return json.loads(payload[len(XSSI_PREFIX):])
+    except ValueError:
+        return None
+
+
+def extract_place_state(html):
+    """Record of a place page from its embedded state, in the format of
+    parse_engines (Rating "4.8 stars", Total Reviews "(1,234)"), or None"""
+    payload = read_place_payload(html)
+    fields = {field: dig(payload, path) for field, path in PLACE_FIELDS.items()}
+    if not isinstance(fields["name"], str) or not fields["name"]:
+        return None
+    rating, reviews = fields["rating"], fields["reviews"]
+    return build_record(
+        fields["name"],
+        fields["phone"] if isinstance(fields["phone"], str) else None,
+        fields["address"] if isinstance(fields["address"], str) else None,
+        fields["website"] if isinstance(fields["website"], str) else None,
+        f"({reviews:,})" if isinstance(reviews, int) else None,
+        f"{rating} stars" if isinstance(rating, (int, float)) else None,
+    )
+
+
+class HttpFetcher:
+    """Fetches place pages through one keep-alive requests session.
+
+    The session pools pool_size connections, and fetch_places() runs that
+    many requests at once. Every request takes a token from the worker's
+    rate limiter and goes out through a proxy of the proxy pool, like chrome
+    page loads do; a 429 or captcha redirect raises BlockedError. base_url
+    sends every request to another host with the same path, e.g. a local
+    stand-in server (see benchmark_http.py).
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, timeout=HTTP_TIMEOUT, base_url=None):
+        import requests  # Only workers that fetch over HTTP pay for it
+        from requests.adapters import HTTPAdapter
+
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.request_errors = (requests.RequestException,)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"User-Agent": HTTP_USER_AGENT, "Accept-Language": HTTP_ACCEPT_LANGUAGE})
+        self.session.cookies.set("CONSENT", "YES+", domain=".google.com")  # Skips the cookie consent interstitial
+        self.proxy = get_proxy_pool().acquire()
+        if self.proxy:
+            self.session.proxies = {"http": self.proxy, "https": self.proxy}
+        self.__executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="http")
+
+    def target(self, url):
+        if not self.base_url:
+            return url
+        parts = urlsplit(url)
+        return f"{self.base_url}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+
+    def fetch(self, url):
+        """HTML of url, or None when the request failed or did not land on the page"""
+        get_rate_limiter().acquire()
+        try:
+            with Metrics.timer(HTTP_FETCH):
+                response = self.session.get(self.target(url), timeout=self.timeout)
+        except self.request_errors as e:
+            logging.debug(f"HTTP fetch of {url} failed: {e}")
+            return None
+        Metrics.increment("http_pages")
+
+        if response.status_code == 429:
+            report_block(RATE_LIMITED, url, self.proxy)
+        if "/sorry/" in response.url:
+            report_block(CAPTCHA, url, self.proxy)
+        if response.status_code != 200 or "consent.google." in response.url:
+            return None
+        get_rate_limiter().reward()
+        return response.text
+
+    def fetch_place(self, url):
+        html = self.fetch(url)
+        if html is None:
+            return None
+        with Metrics.timer(PARSE):
+            return extract_place_state(html)
+
+    def fetch_places(self, urls):
+        """(url, record or None) for every url, in order, pool_size at a time.
+        A block cancels the requests not sent yet before BlockedError is raised."""
+        futures = [self.__executor.submit(self.fetch_place, url) for url in urls]
+        try:
+            for url, future in zip(urls, futures):
+                yield url, future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        self.__executor.shutdown(wait=False)
+        self.session.close()
+        get_proxy_pool().release(self.proxy)
+
+
+_http_fetcher = None
+
+
+def set_http_fetcher(fetcher):
+    """Replace this process's fetcher, e.g. with one pointed at a stand-in server"""
+    global _http_fetcher
+    _http_fetcher = fetcher
+
+
+def reset_http_fetcher():
+    """Close the fetcher after a block: its session and proxy are burnt, the
+    next job gets a new session through another proxy"""
+    global _http_fetcher
+    if _http_fetcher is not None:
+        _http_fetcher.close()
+        _http_fetcher = None
+
+
+def get_http_fetcher():
+    """The fetcher of this process (one worker), created on first use so its
+    connections stay warm across jobs"""
+    global _http_fetcher
+    if _http_fetcher is None:
+        _http_fetcher = HttpFetcher()
+    return _http_fetcher
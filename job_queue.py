@@ -0,0 +1,178 @@
+import json
+import sqlite3
+import time
+from settings import JOB_QUEUE_PATH, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, JOB_MAX_POSTPONES
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    """One unit of work: an industry searched in a location, optionally
+    restricted to a single viewport (tile is a geotiling.Tile dict)"""
+
+    def __init__(self, id, industry, location, tile, priority, attempts):
+        self.id = id
+        self.industry = industry
+        self.location = location
+        self.tile = json.loads(tile) if tile else None
+        self.priority = priority
+        self.attempts = attempts
+
+    def __repr__(self):
+        where = f"{self.location} tile {self.tile['lat']:.4f},{self.tile['long']:.4f}" if self.tile else self.location
+        return f"Job({self.id}: {self.industry} in {where})"
+
+
+class JobQueue:
+    """Durable (industry, location, tile) work queue backed by SQLite.
+
+    Workers lease the highest-priority pending job for lease_seconds. A job
+    whose lease runs out (its worker died) becomes available again, failed
+    jobs are retried up to max_attempts times, blocked jobs are postponed up
+    to max_postpones times, and since everything lives on disk a restarted
+    run resumes exactly where the previous one stopped.
+    """
+
+    def __init__(self, path=JOB_QUEUE_PATH, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS,
+                 max_postpones=JOB_MAX_POSTPONES):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.max_postpones = max_postpones
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                industry TEXT NOT NULL,
+                location TEXT NOT NULL,
+                tile TEXT NOT NULL DEFAULT '',
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_until REAL,
+                worker TEXT,
+                records INTEGER,
+                last_error TEXT,
+                postpones INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (industry, location, tile)
+            )"""
+        )
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(jobs)")]
+        if "postpones" not in columns:  # Queue created before postpones were counted
+            self.connection.execute("ALTER TABLE jobs ADD COLUMN postpones INTEGER NOT NULL DEFAULT 0")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority DESC, id)")
+
+    def enqueue(self, industry, location, tile=None, priority=0):
+        """Add a job unless the same one was queued before; returns True if added"""
+        cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO jobs (industry, location, tile, priority) VALUES (?, ?, ?, ?)",
+            (industry, location, json.dumps(tile, sort_keys=True) if tile else "", priority),
+        )
+        return cursor.rowcount == 1
+
+    def has_jobs(self, industry, location):
+        row = self.connection.execute(
+            "SELECT 1 FROM jobs WHERE industry = ? AND location = ? LIMIT 1", (industry, location)
+        ).fetchone()
+        return row is not None
+
+    def lease(self, worker):
+        """Atomically take the next ready job, or None when nothing is ready"""
+        now = time.time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs whose worker died on the last allowed attempt are given up on
+            self.connection.execute(
+                "UPDATE jobs SET status = ?, last_error = ? WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                (FAILED, "lease expired", LEASED, now, self.max_attempts),
+            )
+            row = self.connection.execute(
+                """SELECT id, industry, location, tile, priority, attempts FROM jobs
+                WHERE status = ? OR (status = ? AND lease_until < ?)
+                ORDER BY priority DESC, id LIMIT 1""",
+                (PENDING, LEASED, now),
+            ).fetchone()
+            if row is None:
+                self.connection.execute("COMMIT")
+                return None
+            self.connection.execute(
+                "UPDATE jobs SET status = ?, lease_until = ?, worker = ?, attempts = attempts + 1 WHERE id = ?",
+                (LEASED, now + self.lease_seconds, worker, row[0]),
+            )
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        job = Job(*row)
+        job.attempts += 1
+        return job
+
+    # A worker only updates the jobs it still holds: once its lease ran out
+    # and another worker took the job over, its late answer is ignored
+
+    def extend_lease(self, job_id, worker):
+        self.connection.execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = ? AND worker = ?",
+            (time.time() + self.lease_seconds, job_id, LEASED, worker),
+        )
+
+    def complete(self, job_id, worker, records=0):
+        """Mark a job done; returns False when worker no longer holds it"""
+        return self.connection.execute(
+            "UPDATE jobs SET status = ?, records = ?, lease_until = NULL WHERE id = ? AND status = ? AND worker = ?",
+            (DONE, records, job_id, LEASED, worker),
+        ).rowcount == 1
+
+    def fail(self, job_id, worker, error):
+        """Put a job back for another try, or mark it failed after max_attempts"""
+        self.connection.execute(
+            """UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END,
+            last_error = ?, lease_until = NULL WHERE id = ? AND status = ? AND worker = ?""",
+            (self.max_attempts, FAILED, PENDING, str(error), job_id, LEASED, worker),
+        )
+
+    def postpone(self, job_id, worker, error):
+        """Put a job back without counting the attempt, e.g. after a block
+        that says nothing about the job itself. Postpones are counted apart,
+        so a job that is blocked every time fails after max_postpones."""
+        self.connection.execute(
+            """UPDATE jobs SET status = CASE WHEN postpones + 1 >= ? THEN ? ELSE ? END,
+            attempts = MAX(attempts - 1, 0), postpones = postpones + 1, last_error = ?,
+            lease_until = NULL WHERE id = ? AND status = ? AND worker = ?""",
+            (self.max_postpones, FAILED, PENDING, str(error), job_id, LEASED, worker),
+        )
+
+    def location_done(self, industry, location):
+        """Whether no job of an industry in a location is pending or leased"""
+        row = self.connection.execute(
+            "SELECT 1 FROM jobs WHERE industry = ? AND location = ? AND status IN (?, ?) LIMIT 1",
+            (industry, location, PENDING, LEASED),
+        ).fetchone()
+        return row is None
+
+    def release_leases(self):
+        """Return every leased job to the queue, for a restart after a crash"""
+        return self.connection.execute(
+            "UPDATE jobs SET status = ?, lease_until = NULL WHERE status = ?", (PENDING, LEASED)
+        ).rowcount
+
+    def counts(self):
+        rows = self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        return dict(rows.fetchall())
+
+    def records_by_industry(self):
+        rows = self.connection.execute(
+            "SELECT industry, COALESCE(SUM(records), 0) FROM jobs WHERE status = ? GROUP BY industry", (DONE,)
+        )
+        return dict(rows.fetchall())
+
+    def remaining(self):
+        counts = self.counts()
+        return counts.get(PENDING, 0) + counts.get(LEASED, 0)
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+from fnmatch import fnmatch
+from settings import LEAN_BLOCK_CATEGORIES, LEAN_EXTRA_BLOCKED_URLS, LEAN_CACHE_DIR
+
+# Category: (url patterns for Network.setBlockedURLs, estimated bytes per blocked request)
+BLOCK_RULES = {
+    "tiles": (["*/maps/vt*", "*/kh/v=*", "*/maps/_/js/*tile*"], 25_000),
+    "fonts": (["*.woff", "*.woff2", "*.ttf", "*fonts.gstatic.com*"], 35_000),
+    "media": (["*.mp4", "*.webm", "*.gif", "*.png", "*.jpg", "*.jpeg", "*.webp", "*googleusercontent.com/*"], 40_000),
+    "telemetry": (["*/gen_204*", "*/log204*", "*/maps/preview/log*", "*play.google.com/log*", "*doubleclick.net*", "*google-analytics.com*"], 1_000),
+}
+
+LEAN_CHROME_ARGUMENTS = [
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--mute-audio",
+    "--blink-settings=imagesEnabled=false",
+]
+
+
+def blocked_patterns():
+    patterns = []
+    for category in LEAN_BLOCK_CATEGORIES:
+        patterns.extend(BLOCK_RULES[category][0])
+    return patterns + list(LEAN_EXTRA_BLOCKED_URLS)
+
+
+def category_of(url):
+    for category in LEAN_BLOCK_CATEGORIES:
+        if any(fnmatch(url, pattern) for pattern in BLOCK_RULES[category][0]):
+            return category
+    return "other"
+
+
+def configure_options(options):
+    """Lean chrome flags, plus performance logging for the byte counters"""
+    for argument in LEAN_CHROME_ARGUMENTS:
+        options.add_argument(argument)
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+
+def lock_file(file):
+    """Take an exclusive lock on file without waiting; raises OSError when held"""
+    if os.name == "nt":
+        import msvcrt
+
+        msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+    else:
+        import fcntl
+
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def claim_cache_dir():
+    """Lock the first free slot under LEAN_CACHE_DIR for this driver's disk cache.
+
+    A cache directory is only used by one chrome at a time, but it survives the
+    driver, so recycled and restarted workers start with a warm cache.
+    Returns (directory, lock file) or (None, None) when caching is disabled.
+    """
+    if not LEAN_CACHE_DIR:
+        return None, None
+    slot = 0
+    while True:
+        directory = os.path.join(LEAN_CACHE_DIR, f"slot-{slot}")
+        os.makedirs(directory, exist_ok=True)
+        lock = open(os.path.join(directory, ".lock"), "w")
+        try:
+            lock_file(lock)
+            return directory, lock
+        except OSError:
+            lock.close()
+            slot += 1
+
+
+def enable_blocking(driver):
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_patterns()})
+
+
+class LeanStats:
+    """Counters built from chrome's performance log: requests blocked per
+    category with an estimate of the bytes they would have cost, and the
+    bytes actually transferred"""
+
+    def __init__(self):
+        self.blocked = {}
+        self.bytes_saved_estimate = 0
+        self.bytes_loaded = 0
+        self.__urls = {}
+
+    def collect(self, driver):
+        """Drain the driver's performance log into the counters"""
+        try:
+            entries = driver.get_log("performance")
+        except Exception as e:
+            logging.debug(f"Performance log unavailable: {e}")
+            return
+
+        for entry in entries:
+            message = json.loads(entry["message"])["message"]
+            method = message.get("method")
+            params = message.get("params", {})
+            if method == "Network.requestWillBeSent":
+                self.__urls[params["requestId"]] = params["request"]["url"]
+            elif method == "Network.loadingFinished":
+                self.bytes_loaded += params.get("encodedDataLength", 0)
+                self.__urls.pop(params["requestId"], None)
+            elif method == "Network.loadingFailed" and params.get("blockedReason"):
+                category = category_of(self.__urls.pop(params["requestId"], ""))
+                self.blocked[category] = self.blocked.get(category, 0) + 1
+                if category in BLOCK_RULES:
+                    self.bytes_saved_estimate += BLOCK_RULES[category][1]
+
+    def summary(self):
+        mb = 1024 * 1024
+        blocked = ", ".join(f"{category} {count}" for category, count in sorted(self.blocked.items())) or "none"
+        return (
+            f"Lean mode blocked requests: {blocked}; ~{self.bytes_saved_estimate / mb:.1f} MB saved, "
+            f"{self.bytes_loaded / mb:.1f} MB loaded"
+        )
@@ -0,0 +1,233 @@
+import json
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Stages timed across the pipeline
+DRIVER_INIT = "driver_init"
+NAVIGATION = "navigation"
+FEED_WAIT = "feed_wait"
+SCROLL_STEP = "scroll_step"
+DETAIL_PAGE_LOAD = "detail_page_load"
+PARSE = "parse"
+SAVE = "save"
+READY_WAIT = "ready_wait"
+RETRY_BACKOFF = "retry_backoff"
+THROTTLE_WAIT = "throttle_wait"
+HTTP_FETCH = "http_fetch"
+CAPTURE = "capture"
+
+# Stages that are pure waiting, summed up as time lost to waits
+WAIT_STAGES = (FEED_WAIT, READY_WAIT, RETRY_BACKOFF, THROTTLE_WAIT)
+
+# Histogram buckets run from 1 ms to about 1.7 hours, each 25% wider than the last
+HISTOGRAM_BASE = 0.001
+HISTOGRAM_GROWTH = 1.25
+HISTOGRAM_BUCKETS = 70
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Histogram:
+    """Durations of one stage counted in fixed buckets, so memory does not grow
+    with the pages of a run. Count, total and max are exact; percentiles are
+    the middle of their bucket, within about 12% of the true value."""
+
+    def __init__(self):
+        self.buckets = [0] * (HISTOGRAM_BUCKETS + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def bucket(seconds):
+        if seconds <= HISTOGRAM_BASE:
+            return 0
+        return min(HISTOGRAM_BUCKETS, math.ceil(math.log(seconds / HISTOGRAM_BASE, HISTOGRAM_GROWTH)))
+
+    def add(self, seconds):
+        self.buckets[self.bucket(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def extend(self, values):
+        for seconds in values:
+            self.add(seconds)
+
+    def merge(self, other):
+        self.buckets = [mine + theirs for mine, theirs in zip(self.buckets, other.buckets)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, fraction):
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:  # Geometric middle of the bucket
+                middle = HISTOGRAM_BASE * HISTOGRAM_GROWTH ** (index - 0.5) if index else HISTOGRAM_BASE
+                return min(middle, self.max)
+
+
+def stage_stats(values):
+    """(count, total, p50, p95, max) of a list of durations or a Histogram"""
+    if isinstance(values, Histogram):
+        return values.count, values.total, values.percentile(0.5), values.percentile(0.95), values.max
+    values = sorted(values)
+    return len(values), sum(values), percentile(values, 0.5), percentile(values, 0.95), values[-1]
+
+
+def summarize(durations, counters, elapsed):
+    """Machine-readable summary: p50/p95 per stage and throughput per minute.
+    durations maps stages to lists of seconds or to Histograms."""
+    stages = {}
+    for stage, values in sorted(durations.items()):
+        count, total, p50, p95, longest = stage_stats(values)
+        stages[stage] = {
+            "count": count,
+            "total_s": round(total, 3),
+            "p50_s": round(p50, 3),
+            "p95_s": round(p95, 3),
+            "max_s": round(longest, 3),
+        }
+    minutes = elapsed / 60 if elapsed > 0 else None
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "waited_s": round(sum(stages[stage]["total_s"] for stage in WAIT_STAGES if stage in stages), 3),
+        "stages": stages,
+        "counters": dict(counters),
+        "pages_per_min": round(counters.get("pages", 0) / minutes, 2) if minutes else None,
+        "records_per_min": round(counters.get("records", 0) / minutes, 2) if minutes else None,
+    }
+
+
+class Metrics:
+    """Stage timings and counters of this process (one worker).
+
+    Every timed stage keeps its raw durations until the next snapshot, which
+    is taken after every job, so a job's percentiles are exact; the
+    MetricsCollector folds the snapshots of all workers into histograms.
+    """
+
+    __durations = defaultdict(list)
+    __counters = defaultdict(int)
+    __started = time.monotonic()
+    __lock = threading.Lock()
+
+    @classmethod
+    @contextmanager
+    def timer(cls, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.record(stage, time.perf_counter() - started)
+
+    @classmethod
+    def record(cls, stage, seconds):
+        with cls.__lock:
+            cls.__durations[stage].append(seconds)
+
+    @classmethod
+    def increment(cls, counter, amount=1):
+        with cls.__lock:
+            cls.__counters[counter] += amount
+
+    @classmethod
+    def snapshot(cls, reset=False):
+        """Raw durations and counters recorded since the last reset"""
+        with cls.__lock:
+            snapshot = {
+                "durations": {stage: list(values) for stage, values in cls.__durations.items()},
+                "counters": dict(cls.__counters),
+                "elapsed": time.monotonic() - cls.__started,
+            }
+            if reset:
+                cls.__durations = defaultdict(list)
+                cls.__counters = defaultdict(int)
+                cls.__started = time.monotonic()
+        return snapshot
+
+    @classmethod
+    def summary(cls, reset=False):
+        snapshot = cls.snapshot(reset=reset)
+        return summarize(snapshot["durations"], snapshot["counters"], snapshot["elapsed"])
+
+
+class MetricsCollector:
+    """Merges the per-job snapshots that workers send to the parent into
+    per-location and whole-run summaries.
+
+    Durations are kept as one Histogram per location and stage. With
+    location_done, a callable telling whether the last job of a location
+    key is over, a location's summary is logged and appended to
+    locations_path (JSON Lines) as soon as that job's snapshot arrives.
+    """
+
+    def __init__(self, location_done=None, locations_path=None):
+        self.locations = {}
+        self.location_done = location_done
+        self.locations_path = locations_path
+        self.finished = set()  # Location keys whose summary was written
+        self.__started = time.monotonic()
+
+    def add(self, key, snapshot):
+        entry = self.locations.setdefault(key, {"durations": defaultdict(Histogram), "counters": defaultdict(int), "elapsed": 0})
+        for stage, values in snapshot["durations"].items():
+            entry["durations"][stage].extend(values)
+        for counter, amount in snapshot["counters"].items():
+            entry["counters"][counter] += amount
+        entry["elapsed"] += snapshot["elapsed"]  # Worker time spent on this location
+        if self.location_done is not None and key not in self.finished:
+            self.finish_location(key)
+
+    def finish_location(self, key):
+        try:
+            if not self.location_done(key):
+                return
+        except Exception as e:
+            logging.warning(f"Could not tell whether {key} is done: {e}")
+            return
+        self.finished.add(key)
+        entry = self.locations[key]
+        summary = summarize(entry["durations"], entry["counters"], entry["elapsed"])
+        logging.info(f"Finished {key}: {json.dumps(summary)}")
+        if self.locations_path:
+            with open(self.locations_path, "a") as file:
+                file.write(json.dumps({"location": key, **summary}) + "\n")
+
+    def report(self):
+        durations = defaultdict(Histogram)
+        counters = defaultdict(int)
+        for entry in self.locations.values():
+            for stage, histogram in entry["durations"].items():
+                durations[stage].merge(histogram)
+            for counter, amount in entry["counters"].items():
+                counters[counter] += amount
+
+        return {
+            "run": summarize(durations, counters, time.monotonic() - self.__started),
+            "locations": {
+                key: summarize(entry["durations"], entry["counters"], entry["elapsed"])
+                for key, entry in sorted(self.locations.items())
+            },
+        }
+
+    def write_report(self, path):
+        report = self.report()
+        with open(path, "w") as file:
+            json.dump(report, file, indent=4)
+        return report
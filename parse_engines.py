@@ -0,0 +1,220 @@
+import logging
+import re
+from settings import PARSER_ENGINE
+
+COMPARING_TOOL_TIPS = {
+    "location": "Copy address",
+    "phone": "Copy phone number",
+    "website": "Open website",
+}
+
+
+def build_record(name, phone, address, websiteUrl, totalReviews, rating):
+    return {
+        "Name": name,
+        "Phone": phone,
+        "Address": address,
+        "Website": websiteUrl,
+        "Total Reviews": totalReviews,
+        "Rating": rating,
+    }
+
+
+# Parts of the opening hours row: "Open", "Closes 5 pm", "Open 24 hours", "Temporarily closed"...
+HOURS_PART = re.compile(r"^((temporarily|permanently) closed|open|closed|opens|closes)\b", re.IGNORECASE)
+
+
+def address_from_rows(rows, phone):
+    """Feed card info rows look like "Category · Address" and
+    "Open · Closes 5 pm · Phone"; rows are (text, is_rating_row) pairs.
+    The hours row is never taken for the address, so a card without one
+    gives None."""
+    for text, is_rating_row in rows:
+        parts = [part.strip() for part in text.split("·")]
+        parts = [part for part in parts if part and part != phone]
+        if is_rating_row or any(HOURS_PART.match(part) for part in parts):
+            continue
+        if len(parts) >= 2:
+            return parts[-1]
+    return None
+
+
+class BeautifulSoupEngine:
+    """Reference engine: pure python html.parser through BeautifulSoup"""
+
+    name = "bs4"
+
+    def __init__(self):
+        from bs4 import BeautifulSoup
+
+        self.BeautifulSoup = BeautifulSoup
+
+    def extract_place(self, html):
+        """Fields of a place page from the outerHTML of its [role='main'] sheet.
+        Name is None when the page has no place name."""
+        soup = self.BeautifulSoup(html, "html.parser")
+        rating, totalReviews, name, address, websiteUrl, phone = (None, None, None, None, None, None)
+
+        ratingTag = soup.find("span", class_="ceNzKf")
+        if ratingTag:
+            rating = ratingTag.get("aria-label")
+
+        reviewsTag = soup.find("div", class_="F7nice")
+        if reviewsTag:
+            children = list(reviewsTag.children)
+            if len(children) > 1:
+                totalReviews = children[1].get_text(strip=True)
+
+        nameTag = soup.select_one(".tAiQdd h1.DUwDvf")
+        if nameTag:
+            name = nameTag.text.strip()
+
+        for infoBar in soup.find_all("button", class_="CsEnBe"):
+            data_tooltip = infoBar.get("data-tooltip")
+            textTag = infoBar.find("div", class_="rogA2c")
+            text = textTag.text.strip() if textTag else None
+
+            if data_tooltip == COMPARING_TOOL_TIPS["location"]:
+                address = text
+            elif data_tooltip == COMPARING_TOOL_TIPS["website"]:
+                websiteUrl = infoBar.parent.get("href") if infoBar.parent else None
+            elif data_tooltip == COMPARING_TOOL_TIPS["phone"]:
+                phone = text
+
+        return build_record(name, phone, address, websiteUrl, totalReviews, rating)
+
+    def extract_feed_card(self, html):
+        """Fields of one result card of the [role="feed"] list, None without a name"""
+        card = self.BeautifulSoup(html, "html.parser")
+        anchor = card.find("a", class_="hfpxzc")
+        name = anchor.get("aria-label") if anchor else None
+        if not name:
+            return None
+
+        rating, totalReviews, websiteUrl, phone = (None, None, None, None)
+
+        ratingTag = card.find("span", class_="MW4etd")
+        if ratingTag:
+            rating = f"{ratingTag.get_text(strip=True)} stars"
+
+        reviewsTag = card.find("span", class_="UY7F9")
+        if reviewsTag:
+            totalReviews = reviewsTag.get_text(strip=True)
+
+        phoneTag = card.find("span", class_="UsdlK")
+        if phoneTag:
+            phone = phoneTag.get_text(strip=True)
+
+        websiteTag = card.find("a", class_="lcr4fd")
+        if websiteTag:
+            websiteUrl = websiteTag.get("href")
+
+        rows = [
+            (row.get_text(" ", strip=True), row.find(class_="MW4etd") is not None)
+            for row in card.find_all("div", class_="W4Efsd")
+            if not row.find("div", class_="W4Efsd")  # Only leaf rows hold text
+        ]
+        return build_record(name, phone, address_from_rows(rows, phone), websiteUrl, totalReviews, rating)
+
+
+def has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+class LxmlEngine:
+    """C-backed engine: libxml2 through lxml, with every XPath compiled once"""
+
+    name = "lxml"
+
+    def __init__(self):
+        from lxml import etree, html as lxml_html
+
+        self.lxml_html = lxml_html
+        self.rating = etree.XPath(f"(//span[{has_class('ceNzKf')}])[1]/@aria-label")
+        self.reviews = etree.XPath(f"(//div[{has_class('F7nice')}])[1]/node()")
+        self.name = etree.XPath(f"(//*[{has_class('tAiQdd')}]//h1[{has_class('DUwDvf')}])[1]")
+        self.infoBars = etree.XPath(f"//button[{has_class('CsEnBe')}]")
+        self.infoBarText = etree.XPath(f"(.//div[{has_class('rogA2c')}])[1]")
+
+        self.cardName = etree.XPath(f"(//a[{has_class('hfpxzc')}])[1]/@aria-label")
+        self.cardRating = etree.XPath(f"(//span[{has_class('MW4etd')}])[1]")
+        self.cardReviews = etree.XPath(f"(//span[{has_class('UY7F9')}])[1]")
+        self.cardPhone = etree.XPath(f"(//span[{has_class('UsdlK')}])[1]")
+        self.cardWebsite = etree.XPath(f"(//a[{has_class('lcr4fd')}])[1]/@href")
+        self.cardRows = etree.XPath(f"//div[{has_class('W4Efsd')} and not(.//div[{has_class('W4Efsd')}])]")
+        self.rowHasRating = etree.XPath(f"boolean(.//*[{has_class('MW4etd')}])")
+
+    @staticmethod
+    def text(element):
+        return element.text_content().strip() if element is not None else None
+
+    def first(self, xpath, tree):
+        found = xpath(tree)
+        return found[0] if found else None
+
+    def extract_place(self, html):
+        tree = self.lxml_html.fromstring(html)
+        address, websiteUrl, phone, totalReviews = (None, None, None, None)
+
+        rating = self.first(self.rating, tree)
+        rating = str(rating) if rating is not None else None
+
+        children = self.reviews(tree)
+        if len(children) > 1:
+            child = children[1]
+            totalReviews = child.strip() if isinstance(child, str) else self.text(child)
+
+        name = self.text(self.first(self.name, tree))
+
+        for infoBar in self.infoBars(tree):
+            data_tooltip = infoBar.get("data-tooltip")
+            text = self.text(self.first(self.infoBarText, infoBar))
+
+            if data_tooltip == COMPARING_TOOL_TIPS["location"]:
+                address = text
+            elif data_tooltip == COMPARING_TOOL_TIPS["website"]:
+                parent = infoBar.getparent()
+                websiteUrl = parent.get("href") if parent is not None else None
+            elif data_tooltip == COMPARING_TOOL_TIPS["phone"]:
+                phone = text
+
+        return build_record(name or None, phone, address, websiteUrl, totalReviews, rating)
+
+    def extract_feed_card(self, html):
+        tree = self.lxml_html.fromstring(html)
+        name = self.first(self.cardName, tree)
+        if not name:
+            return None
+
+        rating = self.text(self.first(self.cardRating, tree))
+        rating = f"{rating} stars" if rating is not None else None
+        totalReviews = self.text(self.first(self.cardReviews, tree))
+        phone = self.text(self.first(self.cardPhone, tree))
+        websiteUrl = self.first(self.cardWebsite, tree)
+
+        rows = [
+            (" ".join(part.strip() for part in row.itertext() if part.strip()), self.rowHasRating(row))
+            for row in self.cardRows(tree)
+        ]
+        return build_record(
+            str(name), phone, address_from_rows(rows, phone),
+            str(websiteUrl) if websiteUrl is not None else None, totalReviews, rating
+        )
+
+
+ENGINES = {
+    BeautifulSoupEngine.name: BeautifulSoupEngine,
+    LxmlEngine.name: LxmlEngine,
+}
+_engines = {}
+
+
+def get_engine(name=PARSER_ENGINE):
+    """Shared engine instance, falling back to BeautifulSoup when lxml is missing"""
+    if name not in _engines:
+        try:
+            _engines[name] = ENGINES[name]()
+        except ImportError as e:
+            logging.warning(f"Parser engine '{name}' is unavailable ({e}), using BeautifulSoup")
+            _engines[name] = get_engine(BeautifulSoupEngine.name)
+    return _engines[name]
@@ -1,16 +1,19 @@
-from bs4 import BeautifulSoup
 from error_codes import ERROR_CODES
 from communicator import Communicator
-from database import DataSaver
+from database import get_sink, QueueSink
 from base import Base
 from common import Common
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import logging
-
-# Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from settings import FEED_ONLY_MODE, FEED_REQUIRED_FIELDS, MAX_TABS_PER_BROWSER, PLACE_INDEX_TTL_DAYS, DETAIL_PAGE_TIMEOUT, HTTP_FETCH_MODE, SPA_NAVIGATION, CAPTURE_ONLY
+from tab_fetcher import TabFetcher, PAGE_READY_SCRIPT
+from feed_navigator import FeedNavigator, PLACE_SHEET_SCRIPT
+from wait_policy import wait_until, script_condition
+from blocking import BlockedError
+from parse_engines import get_engine
+from place_index import get_place_index
+from place_ids import place_id_from_href
+from metrics import Metrics, DETAIL_PAGE_LOAD, PARSE, SAVE, CAPTURE
+from fixture_store import get_fixture_store
+from html_archive import get_html_archive
 
 
 class Parser(Base):
@@ -19,100 +22,158 @@ class Parser(Base):
         self.driver = driver
         self.searchquery = searchquery  # Add searchquery to the constructor
         self.finalData = []
-        self.comparing_tool_tips = {
-            "location": "Copy address",
-            "phone": "Copy phone number",
-            "website": "Open website",
-        }
-
-    def init_data_saver(self):
-        self.data_saver = DataSaver()
+        self.feed_only = FEED_ONLY_MODE
+        self.max_tabs = MAX_TABS_PER_BROWSER
+        self.detail_pages_skipped = 0
+        self.engine = get_engine()
+        self.sink = get_sink(searchquery)
+        self.place_index = get_place_index()
+        self.currentLink = None  # Link of the page parse() reads
+        self.fresh_skipped = 0
+        self.fixture_store = get_fixture_store()  # Set when pages are recorded for replays
+        self.http_fetch = HTTP_FETCH_MODE
+        self.spa_navigation = SPA_NAVIGATION  # Click feed cards instead of loading place URLs
+        self.panel_pages = 0  # Places opened by clicking their card
+        self.feed_tab_navigated = False  # A place was loaded by URL in the tab of the search
+        # Workers streaming to a parent can leave extraction to the parent's process pool
+        self.capture_only = CAPTURE_ONLY and isinstance(self.sink, QueueSink)
+        self.checkpoint = None  # checkpoints.JobCheckpoint of the search, set by the Backend
+        self.http_records = 0
+
+    def has_required_fields(self, record):
+        return record is not None and all(record.get(field) for field in FEED_REQUIRED_FIELDS)
+
+    def emit(self, record, link=None):
+        """Keep a parsed record, stream it to the output file right away and
+        remember its place as freshly scraped"""
+        self.finalData.append(record)
+        with Metrics.timer(SAVE):
+            self.sink.write(record)
+            self.place_index.mark_scraped(place_id_from_href(link or self.currentLink), self.searchquery, record["Name"])
+        Metrics.increment("records")
+
+    def finish(self, link):
+        """A link is done with, parsed or given up on; moves the checkpoint"""
+        Common.mark_progress()
+        if self.checkpoint is not None:
+            self.checkpoint.finish(link)
+
+    def capture(self, html):
+        """Archive the sheet and send it to the parent's extraction pool instead
+        of parsing it here. The capture counts as the job's record; the parent
+        marks the place as scraped once a record was extracted from it."""
+        with Metrics.timer(CAPTURE):
+            archive = get_html_archive()
+            capture = archive.log(self.searchquery, self.currentLink, archive.put(html))
+            self.sink.capture(capture)
+        self.finalData.append(capture)
+        Metrics.increment("captures")
 
     def parse(self):
-        """Our function to parse the html"""
+        """Our function to parse the html of the current page, which the
+        caller has already waited to be ready"""
         try:
-            # Wait for the main content to be present
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "[role='main']"))
-            )
-            infoSheet = self.driver.execute_script(
-                """return document.querySelector("[role='main']")"""
-            )
+            infoSheet = self.driver.execute_script(PLACE_SHEET_SCRIPT)
             if infoSheet is None:
                 Communicator.show_error_message("No information sheet found", ERROR_CODES['ERR_NO_INFO_SHEET'])
                 return
 
-            rating, totalReviews, address, websiteUrl, phone = (None, None, None, None, None)
-
             html = infoSheet.get_attribute("outerHTML")
-            soup = BeautifulSoup(html, "html.parser")
-
-            try:
-                rating = soup.find("span", class_="ceNzKf").get("aria-label")
-            except Exception as e:
-                Communicator.show_message(f"Could not find rating: {e}")
-
-            try:
-                totalReviews = list(soup.find("div", class_="F7nice").children)
-                totalReviews = totalReviews[1].get_text(strip=True)
-            except Exception as e:
-                Communicator.show_message(f"Could not find total reviews: {e}")
-
-            try:
-                name = soup.select_one(".tAiQdd h1.DUwDvf").text.strip()
-            except Exception as e:
-                Communicator.show_error_message(f"No name found: {e}", ERROR_CODES['ERR_NO_NAME'])
+            if self.fixture_store is not None and self.currentLink:
+                self.fixture_store.record_place(self.currentLink, html)
+            if self.capture_only:
+                self.capture(html)
+                return
+
+            with Metrics.timer(PARSE):
+                data = self.engine.extract_place(html)
+
+            if not data["Name"]:
+                Communicator.show_error_message("No name found", ERROR_CODES['ERR_NO_NAME'])
                 return
 
-            allInfoBars = soup.find_all("button", class_="CsEnBe")
-
-            for infoBar in allInfoBars:
-                data_tooltip = infoBar.get("data-tooltip")
-                text = infoBar.find('div', class_='rogA2c').text.strip()
-
-                if data_tooltip == self.comparing_tool_tips["location"]:
-                    address = text
-                elif data_tooltip == self.comparing_tool_tips["website"]:
-                    try:
-                        websiteUrl = infoBar.parent.get("href")
-                    except Exception as e:
-                        Communicator.show_message(f"Could not find website URL: {e}")
-                        websiteUrl = None
-                elif data_tooltip == self.comparing_tool_tips["phone"]:
-                    phone = text
-
-            data = {
-                "Name": name,
-                "Phone": phone,
-                "Address": address,
-                "Website": websiteUrl,
-                "Total Reviews": totalReviews,
-                "Rating": rating,
-            }
-
-            Communicator.show_message(f"Parsed data: {data}")
-            self.finalData.append(data)
+            Communicator.show_payload("Parsed data", data, summary=f"Parsed {data['Name']}")
+            self.emit(data)
 
         except Exception as e:
             Communicator.show_error_message(f"Error occurred while parsing a location. Error is: {str(e)}.", ERROR_CODES['ERR_WHILE_PARSING_DETAILS'])
-
-    def main(self, allResultsLinks):
+        finally:
+            self.finish(self.currentLink)
+
+    def fetch_over_http(self, links):
+        """Emit the records of the places whose pages extract over plain HTTP,
+        returning the links that still need chrome"""
+        from http_fetcher import get_http_fetcher
+
+        fallback = []
+        for link, record in get_http_fetcher().fetch_places(links):
+            if record is None:
+                fallback.append(link)
+                continue
+            Communicator.show_payload("Fetched data", record, summary=f"Fetched {record['Name']}")
+            self.emit(record, link)
+            self.http_records += 1
+            self.finish(link)
+        Metrics.increment("http_fallbacks", len(fallback))
+        return fallback
+
+    def main(self, allResultsLinks, feedRecords=None):
         Communicator.show_message("Scrolling is done. Now going to scrape each location")
+        feedRecords = feedRecords or {}
         try:
+            freshIds = self.place_index.fresh_ids([place_id_from_href(link) for link in allResultsLinks])
+            detailLinks = []
             for resultLink in allResultsLinks:
-                if Common.close_thread_is_set():
-                    self.driver.quit()
-                    return
-
-                self.openingurl(url=resultLink)
-                WebDriverWait(self.driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "[role='main']"))
-                )
-                self.parse()
-
+                if place_id_from_href(resultLink) in freshIds:
+                    self.fresh_skipped += 1
+                    self.finish(resultLink)
+                    continue
+
+                feedRecord = feedRecords.get(resultLink)
+                if self.feed_only and self.has_required_fields(feedRecord):
+                    self.emit(feedRecord, resultLink)
+                    self.detail_pages_skipped += 1
+                    self.finish(resultLink)
+                else:
+                    detailLinks.append(resultLink)
+
+            if self.http_fetch and detailLinks:
+                detailLinks = self.fetch_over_http(detailLinks)
+
+            navigator = FeedNavigator(self.driver, self) if self.spa_navigation and detailLinks else None
+            if self.max_tabs > 1 and len(detailLinks) > 1:
+                # Feed clicks, if any, run alongside the page loads of the other tabs
+                TabFetcher(self.driver, self, max_tabs=self.max_tabs, navigator=navigator).fetch(detailLinks)
+            else:
+                if navigator is not None:
+                    detailLinks = navigator.fetch(detailLinks)
+                for resultLink in detailLinks:
+                    if Common.close_thread_is_set():
+                        self.driver.quit()
+                        return
+
+                    self.currentLink = resultLink
+                    self.feed_tab_navigated = True
+                    with Metrics.timer(DETAIL_PAGE_LOAD):
+                        loaded = self.openingurl(url=resultLink) and wait_until(
+                            self.driver, script_condition(PAGE_READY_SCRIPT), timeout=DETAIL_PAGE_TIMEOUT
+                        )
+                    if not loaded:
+                        Communicator.show_message(f"Skipping {resultLink}, the page did not load")
+                        self.finish(resultLink)
+                        continue
+                    self.parse()
+
+        except BlockedError:
+            raise
         except Exception as e:
             Communicator.show_message(f"Error occurred while parsing the locations. Error: {str(e)}")
         finally:
-            self.init_data_saver()
-            Communicator.show_message(f"Final data collected: {self.finalData}")
-            self.data_saver.save(datalist=self.finalData, query=self.searchquery)  # Pass searchquery to save
+            if self.fresh_skipped:
+                Communicator.show_message(f"Skipped {self.fresh_skipped} places scraped within the last {PLACE_INDEX_TTL_DAYS} days")
+            if self.http_fetch:
+                Communicator.show_message(f"Fetched {self.http_records} records over HTTP")
+            if self.feed_only:
+                Communicator.show_message(f"Built {self.detail_pages_skipped} records from the feed, opened {len(allResultsLinks) - self.detail_pages_skipped - self.fresh_skipped} detail pages")
+            Communicator.show_payload("Final data collected", self.finalData, summary=f"{len(self.finalData)} records collected")
+            self.sink.flush()
@@ -0,0 +1,21 @@
+import re
+from urllib.parse import unquote
+
+# Place links look like /maps/place/<name>/data=!4m7!3m6!1s0x89c2...:0x5d1...!8m2...!19sChIJ...
+FEATURE_ID_PATTERN = re.compile(r"!1s(0x[0-9a-f]+:0x[0-9a-f]+)", re.IGNORECASE)
+PLACE_ID_PATTERN = re.compile(r"!19s(ChIJ[\w-]+)")
+
+
+def place_id_from_href(href):
+    """Stable identifier of the place a /maps/place/... link points to.
+
+    Prefers the hex feature id, then the ChIJ place id, and falls back to the
+    link without its query string.
+    """
+    if not href:
+        return None
+    href = unquote(href)
+    match = FEATURE_ID_PATTERN.search(href) or PLACE_ID_PATTERN.search(href)
+    if match:
+        return match.group(1).lower() if match.re is FEATURE_ID_PATTERN else match.group(1)
+    return href.split("?")[0]
@@ -0,0 +1,80 @@
+import sqlite3
+import time
+from settings import PLACE_INDEX_PATH, PLACE_INDEX_TTL_DAYS
+
+
+class PlaceIndex:
+    """Persistent index of scraped places keyed on their google place id.
+
+    Places scraped less than ttl_days ago are fresh and are skipped when they
+    show up again in another subregion, location or industry.
+    """
+
+    def __init__(self, path=PLACE_INDEX_PATH, ttl_days=PLACE_INDEX_TTL_DAYS):
+        self.path = path
+        self.ttl = ttl_days * 24 * 3600
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS places (
+                place_id TEXT PRIMARY KEY,
+                last_scraped REAL NOT NULL,
+                query TEXT,
+                name TEXT
+            )"""
+        )
+        self.connection.commit()
+
+    def fresh_ids(self, place_ids):
+        """The subset of place_ids scraped within the TTL"""
+        place_ids = [place_id for place_id in place_ids if place_id]
+        if not place_ids or self.ttl <= 0:
+            return set()
+
+        fresh = set()
+        oldest = time.time() - self.ttl
+        for start in range(0, len(place_ids), 500):  # Stay under sqlite's bound parameter limit
+            chunk = place_ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.connection.execute(
+                f"SELECT place_id FROM places WHERE last_scraped >= ? AND place_id IN ({placeholders})",
+                [oldest, *chunk],
+            )
+            fresh.update(row[0] for row in rows)
+        return fresh
+
+    def is_fresh(self, place_id):
+        return place_id in self.fresh_ids([place_id])
+
+    def mark_scraped(self, place_id, query=None, name=None):
+        if not place_id:
+            return
+        self.connection.execute(
+            "INSERT OR REPLACE INTO places (place_id, last_scraped, query, name) VALUES (?, ?, ?, ?)",
+            (place_id, time.time(), query, name),
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+_place_index = None
+
+
+def set_place_index(path):
+    """Use the index at path in this process instead of PLACE_INDEX_PATH, or
+    an index object, e.g. the coordinator's through coordinator.RemotePlaceIndex"""
+    global _place_index
+    if _place_index is not None:
+        _place_index.close()
+    _place_index = PlaceIndex(path) if isinstance(path, str) else path
+    return _place_index
+
+
+def get_place_index():
+    """The index connection of this process, opened on first use"""
+    global _place_index
+    if _place_index is None:
+        _place_index = PlaceIndex()
+    return _place_index
@@ -0,0 +1,78 @@
+import logging
+import os
+import threading
+import time
+from settings import PROXY_POOL, PROXY_FILE, PROXY_COOLDOWN
+
+
+class ProxyPool:
+    """Identities chrome workers are started with. Subclasses hand out proxy
+    servers (anything chrome's --proxy-server accepts) and are told when a
+    driver using one quits or got blocked."""
+
+    def acquire(self):
+        """Proxy for a new driver, or None to connect directly"""
+        return None
+
+    def release(self, proxy):
+        pass
+
+    def report_blocked(self, proxy):
+        pass
+
+
+class FileProxyPool(ProxyPool):
+    """Rotates through the proxies listed in a file, least used first, and
+    leaves a blocked proxy unused for `cooldown` seconds"""
+
+    def __init__(self, path=PROXY_FILE, cooldown=PROXY_COOLDOWN):
+        with open(path, "r") as file:
+            self.proxies = [line.strip() for line in file if line.strip() and not line.startswith("#")]
+        if not self.proxies:
+            raise ValueError(f"No proxies listed in {path}")
+        self.cooldown = cooldown
+        self.in_use = {proxy: 0 for proxy in self.proxies}
+        self.blocked_until = {}
+        # Workers start at different proxies so they do not all share the first one
+        self.__offset = os.getpid() % len(self.proxies)
+        self.__lock = threading.Lock()
+
+    def acquire(self):
+        with self.__lock:
+            now = time.time()
+            rotated = self.proxies[self.__offset:] + self.proxies[:self.__offset]
+            available = [proxy for proxy in rotated if self.blocked_until.get(proxy, 0) <= now]
+            if available:
+                proxy = min(available, key=lambda candidate: self.in_use[candidate])
+            else:
+                proxy = min(rotated, key=lambda candidate: self.blocked_until[candidate])
+                logging.warning(f"Every proxy is cooling down after a block, reusing {proxy}")
+            self.in_use[proxy] += 1
+            return proxy
+
+    def release(self, proxy):
+        with self.__lock:
+            if self.in_use.get(proxy):
+                self.in_use[proxy] -= 1
+
+    def report_blocked(self, proxy):
+        with self.__lock:
+            if proxy in self.in_use:
+                self.blocked_until[proxy] = time.time() + self.cooldown
+        logging.warning(f"Proxy {proxy} was blocked, resting it for {self.cooldown}s")
+
+
+PROXY_POOLS = {
+    "file": FileProxyPool,
+}
+
+_proxy_pool = None
+
+
+def get_proxy_pool():
+    """The proxy pool of this process; a plain ProxyPool (direct connections)
+    unless PROXY_POOL names one of PROXY_POOLS"""
+    global _proxy_pool
+    if _proxy_pool is None:
+        _proxy_pool = PROXY_POOLS[PROXY_POOL]() if PROXY_POOL else ProxyPool()
+    return _proxy_pool
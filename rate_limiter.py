@@ -0,0 +1,86 @@
+import threading
+import time
+from metrics import Metrics, THROTTLE_WAIT
+from settings import (
+    RATE_LIMIT_PAGES_PER_MIN,
+    RATE_LIMIT_MIN_PAGES_PER_MIN,
+    RATE_LIMIT_BURST,
+    BLOCK_COOLDOWN,
+    BLOCK_MAX_COOLDOWN,
+)
+
+
+class TokenBucket:
+    """Token bucket spacing out the page loads of one worker.
+
+    The rate adapts to blocks: penalize() halves it (down to min_rate) and
+    pauses the worker for a cooldown that doubles with every block in a row,
+    and every normal page raises it again by a small step up to max_rate.
+    """
+
+    def __init__(self, max_rate=RATE_LIMIT_PAGES_PER_MIN / 60, min_rate=RATE_LIMIT_MIN_PAGES_PER_MIN / 60,
+                 burst=RATE_LIMIT_BURST, cooldown=BLOCK_COOLDOWN, max_cooldown=BLOCK_MAX_COOLDOWN):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.rate = max_rate  # Tokens per second
+        self.burst = burst
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.tokens = burst
+        self.blocks_in_a_row = 0
+        self.paused_until = 0
+        self.__updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def __refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.__updated) * self.rate)
+        self.__updated = now
+
+    def acquire(self):
+        """Block until the worker may load another page"""
+        waited = 0
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                self.__refill(now)
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                delay = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+        if waited:
+            Metrics.record(THROTTLE_WAIT, waited)
+
+    def penalize(self):
+        """A block was detected: halve the rate and pause; returns the pause in seconds"""
+        with self.__lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            pause = min(self.max_cooldown, self.cooldown * 2 ** self.blocks_in_a_row)
+            self.blocks_in_a_row += 1
+            self.paused_until = time.monotonic() + pause
+            self.tokens = 0
+        return pause
+
+    def reward(self):
+        """A page loaded normally: raise the rate by a small step"""
+        with self.__lock:
+            self.blocks_in_a_row = 0
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+
+_rate_limiter = None
+
+
+def set_rate_limiter(limiter):
+    """Replace this process's rate limiter, e.g. with a faster one for replays"""
+    global _rate_limiter
+    _rate_limiter = limiter
+
+
+def get_rate_limiter():
+    """The rate limiter of this process (one worker), created on first use"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = TokenBucket()
+    return _rate_limiter
@@ -0,0 +1,59 @@
+"""Rebuild every record from the HTML archive, without scraping again.
+
+    python reextract.py --archive html_archive --output reextracted --processes 8
+
+After google renames the classes the parse engines rely on (CsEnBe, rogA2c,
+...), fix parse_engines.py and run this: the latest capture of every place
+and query is extracted again on a pool of processes, and the records are
+written to <output>/<query>.jsonl.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from database import set_output_path, get_sink, close_sinks
+from html_archive import HtmlArchive, extract_batch
+from settings import HTML_ARCHIVE_DIR, EXTRACT_BATCH_SIZE, PARSER_ENGINE
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--archive", type=str, default=HTML_ARCHIVE_DIR, help="Archive the pages were captured to")
+    parser.add_argument("--output", type=str, default="reextracted", help="Directory of the rebuilt <query>.jsonl files")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="Extraction processes")
+    parser.add_argument("--batch_size", type=int, default=EXTRACT_BATCH_SIZE, help="Captures per task")
+    parser.add_argument("--engine", type=str, choices=["lxml", "bs4"], default=PARSER_ENGINE, help="Parser engine")
+    args = parser.parse_args()
+
+    captures = HtmlArchive(args.archive).captures()
+    if not captures:
+        print(f"No captures in {args.archive}")
+        sys.exit(1)
+    if os.path.exists(args.output) and any(name.endswith(".jsonl") for name in os.listdir(args.output)):
+        print(f"{args.output} already holds records, choose an empty output directory")
+        sys.exit(1)
+
+    set_output_path(args.output)
+    batches = [captures[start:start + args.batch_size] for start in range(0, len(captures), args.batch_size)]
+    extracted, failed = 0, []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.processes) as executor:
+        for results in executor.map(extract_batch, [args.archive] * len(batches), batches, [args.engine] * len(batches)):
+            for capture, record in results:
+                if record is None:
+                    failed.append(capture["url"])
+                    continue
+                get_sink(capture["query"]).write(record)
+                extracted += 1
+    close_sinks()
+    elapsed = time.perf_counter() - started
+
+    print(f"Extracted {extracted} of {len(captures)} captured pages into {args.output} in {elapsed:.2f}s "
+          f"({len(captures) / elapsed:.0f} pages/s on {args.processes} processes)")
+    for url in failed:
+        print(f"NO NAME {url}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import random
+import time
+from lxml import html as lxml_html
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+from fixture_store import FEED, PLACE
+from parse_engines import has_class
+from scroller import HARVEST_NEW_LINKS_SCRIPT, WAIT_FOR_FEED_CHANGE_SCRIPT, SEARCH_READY_SCRIPT
+from tab_fetcher import PAGE_READY_SCRIPT, DISPATCH_SCRIPT, TAB_READY_SCRIPT
+from blocking import PAGE_STATE_SCRIPT
+from feed_navigator import CLICK_RESULT_SCRIPT, PLACE_PANEL_SCRIPT, PLACE_SHEET_SCRIPT, WAIT_FOR_PANEL_SCRIPT
+from settings import (
+    REPLAY_NAVIGATION_LATENCY,
+    REPLAY_SCROLL_LATENCY,
+    REPLAY_LATENCY_JITTER,
+    REPLAY_FEED_BATCH,
+    REPLAY_PANEL_LATENCY,
+)
+
+FEED_SELECTOR = '[role="feed"]'
+MAIN_SELECTOR = '[role="main"]'
+
+
+def split_feed(feed_html):
+    """(href, card outerHTML) of every result in a recorded feed"""
+    tree = lxml_html.fromstring(feed_html)
+    cards = []
+    for anchor in tree.xpath(f"//a[{has_class('hfpxzc')}]"):
+        card = anchor.xpath(f"ancestor::div[{has_class('Nv2PK')}][1]") or [anchor.getparent()]
+        cards.append((anchor.get("href"), lxml_html.tostring(card[0], encoding="unicode")))
+    return cards
+
+
+class ReplayElement:
+    def __init__(self, tab, kind):
+        self.tab = tab
+        self.kind = kind
+
+    def get_attribute(self, name):
+        if name != "outerHTML":
+            return None
+        return self.tab.html if self.kind == MAIN_SELECTOR else self.tab.feed_html()
+
+
+class ReplayTab:
+    """Page shown in one tab: a recorded feed revealed batch by batch as it is
+    scrolled, a recorded place sheet, or nothing (unknown URL)"""
+
+    def __init__(self, url=None, kind=None, html=None, meta=None, ready_at=0):
+        self.url = url
+        self.kind = kind
+        self.html = html
+        self.reached_end = bool(meta and meta.get("reached_end"))
+        self.ready_at = ready_at
+        self.cards = split_feed(html) if kind == FEED else []
+        self.revealed = min(REPLAY_FEED_BATCH, len(self.cards))
+        self.harvested = 0
+        self.panel = None  # Place sheet opened by clicking a card of this feed
+        self.next_panel = None  # Sheet of the last click, replacing panel once loaded
+        self.stale = False  # Tagged by DISPATCH_SCRIPT or CLICK_RESULT_SCRIPT while the next page loads
+
+    @property
+    def ready(self):
+        return self.kind is not None and time.monotonic() >= self.ready_at
+
+    def shown_panel(self):
+        """Sheet on screen: the previous one stays until the clicked one loaded"""
+        if self.next_panel is not None and self.next_panel.ready:
+            self.panel, self.next_panel = self.next_panel, None
+        return self.panel
+
+    def feed_html(self):
+        return '<div role="feed">' + "".join(card for _, card in self.cards[:self.revealed]) + "</div>"
+
+    def end(self):
+        return self.reached_end and self.revealed >= len(self.cards)
+
+
+class ReplayDriver:
+    """Stand-in for a selenium driver that serves pages from a FixtureStore.
+
+    It implements the part of the driver API that Backend, Scroller, Parser and
+    TabFetcher use, and answers their scripts the way the real pages would:
+    navigations and feed scrolls take a configurable latency, feeds grow by
+    `feed_batch` cards per scroll, tabs load in parallel, and clicking a card
+    shows its place sheet next to the feed after panel_latency. Only the browser
+    is replaced, so a replay runs the real scroll -> link -> parse -> save code.
+    """
+
+    def __init__(self, store, navigation_latency=REPLAY_NAVIGATION_LATENCY, scroll_latency=REPLAY_SCROLL_LATENCY,
+                 jitter=REPLAY_LATENCY_JITTER, seed=None, panel_latency=REPLAY_PANEL_LATENCY):
+        self.store = store
+        self.navigation_latency = navigation_latency
+        self.scroll_latency = scroll_latency
+        self.panel_latency = panel_latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.tabs = {"tab-0": ReplayTab()}
+        self.navigations = {}  # Handle -> (page, time) replacing its tab once the navigation latency passed
+        self.current_window_handle = "tab-0"
+        self.switch_to = ReplaySwitchTo(self)
+        self.pages_missing = 0
+
+    def delay(self, latency):
+        return latency * self.random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    @property
+    def tab(self):
+        """Page of the current tab; a dispatched navigation keeps showing the
+        old page until its latency has passed, like a real browser"""
+        handle = self.current_window_handle
+        if handle in self.navigations and time.monotonic() >= self.navigations[handle][1]:
+            self.tabs[handle] = self.navigations.pop(handle)[0]
+        return self.tabs[handle]
+
+    @property
+    def window_handles(self):
+        return list(self.tabs)
+
+    @property
+    def current_url(self):
+        return self.tab.url
+
+    def load(self, url, ready_at):
+        for kind in (FEED, PLACE):
+            page = self.store.read(kind, url)
+            if page is not None:
+                return ReplayTab(url, kind, page[0], page[1], ready_at)
+        self.pages_missing += 1
+        return ReplayTab(url, ready_at=ready_at)
+
+    def get(self, url):
+        time.sleep(self.delay(self.navigation_latency))
+        self.navigations.pop(self.current_window_handle, None)
+        self.tabs[self.current_window_handle] = self.load(url, 0)
+
+    def find_element(self, by, value):
+        selector = value.replace("'", '"')
+        tab = self.tab
+        if tab.ready and (selector, tab.kind) in ((FEED_SELECTOR, FEED), (MAIN_SELECTOR, PLACE)):
+            return ReplayElement(tab, selector)
+        raise NoSuchElementException(f"{value} is not on the replayed page")
+
+    def execute_script(self, script, *args):
+        tab = self.tab
+        if script == HARVEST_NEW_LINKS_SCRIPT:
+            include_cards = args[1]
+            harvested = [[href, card if include_cards else None] for href, card in tab.cards[tab.harvested:tab.revealed]]
+            tab.harvested = tab.revealed
+            return harvested
+        if script == PAGE_READY_SCRIPT:
+            return tab.ready and tab.kind == PLACE
+        if script == SEARCH_READY_SCRIPT:
+            return tab.ready
+        if script == CLICK_RESULT_SCRIPT:
+            if tab.kind != FEED or args[0] not in (href for href, _ in tab.cards[:tab.revealed]):
+                return False
+            if tab.shown_panel() is not None:
+                tab.panel.stale = True
+            tab.next_panel = self.load(args[0], time.monotonic() + self.delay(self.panel_latency))
+            return True
+        if script == PLACE_PANEL_SCRIPT:
+            return self.panel_state(tab)
+        if script == PLACE_SHEET_SCRIPT:
+            panel = tab.shown_panel()
+            if panel is not None:
+                return ReplayElement(panel, MAIN_SELECTOR) if not panel.stale else None
+            return ReplayElement(tab, MAIN_SELECTOR) if tab.ready and tab.kind == PLACE else None
+        if script == PAGE_STATE_SCRIPT:
+            return {"url": tab.url, "title": "", "text": "", "captcha": False, "consent": False, "maps": True}
+        if script == TAB_READY_SCRIPT:
+            return tab.url if tab.ready and tab.kind == PLACE and not tab.stale else None
+        if script == DISPATCH_SCRIPT:
+            tab.stale = True
+            loaded_at = time.monotonic() + self.delay(self.navigation_latency)
+            self.navigations[self.current_window_handle] = (self.load(args[0], loaded_at), loaded_at)
+            return None
+        if "outerHTML" in script:
+            return tab.feed_html() if tab.ready and tab.kind == FEED else None
+        for selector in (FEED_SELECTOR, MAIN_SELECTOR):
+            if selector in script.replace("'", '"').replace('\\"', '"'):
+                try:
+                    return self.find_element(None, selector)
+                except NoSuchElementException:
+                    return None
+        if ".PbZDve" in script and "querySelector" in script:
+            return True if tab.end() else None
+        return None  # Scrolling and clicking change nothing but the replayed feed state
+
+    @staticmethod
+    def panel_state(tab):
+        panel = tab.shown_panel()
+        url = (tab.next_panel or panel or tab).url  # The URL changes with the click, the sheet later
+        return {"url": url, "fresh": bool(panel and panel.kind == PLACE and not panel.stale)}
+
+    def execute_async_script(self, script, *args):
+        tab = self.tab
+        if script == WAIT_FOR_PANEL_SCRIPT:
+            if tab.next_panel is not None:  # Resolves when the clicked sheet renders, or at the timeout
+                time.sleep(max(0, min(tab.next_panel.ready_at - time.monotonic(), args[0] / 1000)))
+            return self.panel_state(tab)
+        if script != WAIT_FOR_FEED_CHANGE_SCRIPT:
+            raise WebDriverException("Script is not supported by the replay driver")
+        previous_count = args[1]
+        if tab.revealed <= previous_count and tab.revealed < len(tab.cards):
+            time.sleep(self.delay(self.scroll_latency))
+            tab.revealed = min(tab.revealed + REPLAY_FEED_BATCH, len(tab.cards))
+        return {"count": tab.revealed, "end": tab.end()}
+
+    def close(self):
+        self.navigations.pop(self.current_window_handle, None)
+        del self.tabs[self.current_window_handle]
+
+    def quit(self):
+        self.tabs.clear()
+        self.navigations.clear()
+
+    def get_log(self, log_type):
+        return []
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def maximize_window(self):
+        pass
+
+    def execute_cdp_cmd(self, command, params):
+        return {}
+
+
+class ReplaySwitchTo:
+    def __init__(self, driver):
+        self.driver = driver
+        self.opened = 0
+
+    def new_window(self, type_hint=None):
+        self.opened += 1
+        handle = f"tab-{self.opened}"
+        self.driver.tabs[handle] = ReplayTab()
+        self.driver.current_window_handle = handle
+
+    def window(self, handle):
+        if handle not in self.driver.tabs:
+            raise WebDriverException(f"No such window: {handle}")
+        self.driver.current_window_handle = handle
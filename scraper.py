@@ -1,35 +1,39 @@
 import logging
-from time import sleep
-import tempfile
-from selenium.webdriver.common.by import By
-import undetected_chromedriver as uc
 from base import Base
-from scroller import Scroller
+from driver_pool import create_driver, quit_driver
+from lean_mode import LeanStats
+from settings import LEAN_MODE, SPA_NAVIGATION
+from scroller import Scroller, SEARCH_READY_SCRIPT
+from wait_policy import wait_until, script_condition
+from feed_navigator import search_in_page
+from blocking import BlockedError
+from checkpoints import get_checkpoint_store
 from communicator import Communicator
-from database import DataSaver, save_and_upload_results
 from parser import Parser
-import signal
 import sys
-import time
-import os
 
-# Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+MAP_MOVED = "map moved"  # Area of a driver whose map left the viewport of its last search
+
 
 def signal_handler(sig, frame):
+    """CTRL+C handler for entry points that run a Backend in the current
+    process: signal.signal(signal.SIGINT, signal_handler). Importing this
+    module no longer installs it."""
     logging.info('CTRL+C detected. Shutting down driver...')
     if hasattr(signal_handler, 'driver'):
         signal_handler.driver.quit()
     sys.exit(0)
 
-# Register the signal handler for CTRL+C
-signal.signal(signal.SIGINT, signal_handler)
 
 class Backend(Base):
 
-    def __init__(self, searchquery, outputformat, headlessmode, location=None, lat_center=None, long_center=None, start_angle=None, end_angle=None):
+    def __init__(self, searchquery, outputformat, headlessmode, location=None, lat_center=None, long_center=None, start_angle=None, end_angle=None, tile=None, driver=None, search_url=None):
         self.searchquery = searchquery
+        self.search_url = search_url  # Opened as is instead of building one, e.g. to replay a recorded search
         self.location = location
+        self.tile = tile  # geotiling.Tile restricting the search to one viewport
+        self.saturated = False
+        self.lean_stats = LeanStats() if LEAN_MODE else None
         self.lat_center = lat_center
         self.long_center = long_center
         self.start_angle = start_angle
@@ -37,59 +41,42 @@ class Backend(Base):
         self.outputformat = outputformat
         self.headlessMode = headlessmode
         Communicator.set_output_format(outputformat)  # Set output format in headless mode
-        self.data_saver = DataSaver()  # Instantiate the DataSaver class
-        self.init_driver()
+        self.owns_driver = driver is None  # Pooled drivers are handed back instead of quit
+        if driver is None:
+            self.init_driver()
+        else:
+            self.driver = driver
         signal_handler.driver = self.driver  # Attach driver to the signal handler
         self.scroller = Scroller(driver=self.driver, searchquery=self.searchquery)
         self.parser = Parser(driver=self.driver, searchquery=self.searchquery)  # Instantiate the Parser class with searchquery
 
     def init_driver(self):
-        for attempt in range(3):
-            try:
-                options = uc.ChromeOptions()
-                if self.headlessMode == 1:
-                    options.add_argument("--headless=new")
-
-                prefs = {"profile.managed_default_content_settings.images": 2}
-                options.add_experimental_option("prefs", prefs)
-
-                Communicator.show_message("Wait checking for driver...\nIf you don't have webdriver in your machine it will install it")
-
-                tmpdirname = tempfile.mkdtemp()
-                options.add_argument(f"--user-data-dir={tmpdirname}")
-                logging.info(f"Using temporary directory for Chrome: {tmpdirname}")
-                
-                if DRIVER_EXECUTABLE_PATH:
-                    self.driver = uc.Chrome(driver_executable_path=DRIVER_EXECUTABLE_PATH, options=options)
-                else:
-                    self.driver = uc.Chrome(options=options)
-                    
-                break  # Exit the loop if successful
-            except Exception as e:
-                logging.error(f"Attempt {attempt + 1} of 3: Error during Chrome driver initialization: {e}")
-                time.sleep(5)  # Wait before retrying
-                if attempt == 2:
-                    raise
-            finally:
-                if tmpdirname and os.path.exists(tmpdirname):
-                    os.rmdir(tmpdirname)
-
-        Communicator.show_message("Opening browser...")
-        self.driver.maximize_window()
-        self.driver.implicitly_wait(self.timeout)
+        self.driver = create_driver(self.headlessMode)
+
+    @property
+    def total_pages_loaded(self):
+        return self.pages_loaded + self.parser.pages_loaded
 
     def mainscraping(self):
         data = []
         try:
             querywithplus = "+".join(self.searchquery.split())
-            if self.lat_center and self.long_center:
+            if self.search_url is not None:
+                link_of_page = self.search_url
+            elif self.tile is not None:
+                link_of_page = self.tile.url(self.searchquery)
+            elif self.lat_center and self.long_center:
                 link_of_page = f"https://www.google.com/maps/search/{querywithplus}/@{self.lat_center},{self.long_center},14z"
             else:
                 locationwithplus = "+".join(self.location.split())
                 link_of_page = f"https://www.google.com/maps/search/{querywithplus}+in+{locationwithplus}/"
-            self.openingurl(url=link_of_page)
-            Communicator.show_message(f"Navigated to URL: {link_of_page}")
-            sleep(1)  # Ensure the page loads completely
+            checkpoint_key = f"{self.searchquery}|{link_of_page}"
+            checkpoint = self.load_checkpoint(checkpoint_key)
+            if checkpoint is not None:
+                data = self.resume(checkpoint)
+                return data
+            if not self.open_search(link_of_page):
+                return data
 
             # Additional logging to debug element finding
             Communicator.show_message("Looking for the [role='feed'] element")
@@ -99,44 +86,103 @@ class Backend(Base):
             else:
                 Communicator.show_message("Feed element found")
 
-            self.scroller.scroll()
+            self.scroller.scroll(search_url=link_of_page)
+            self.saturated = self.scroller.is_saturated()
             all_results_links = self.get_all_results_links()
-            data = self.collect_data(all_results_links)
+            feed_records = self.scroller.get_feed_records()
+            store = get_checkpoint_store()
+            if store is not None and all_results_links:
+                self.parser.checkpoint = store.start(checkpoint_key, all_results_links, feed_records, self.saturated)
+            data = self.collect_data(all_results_links, feed_records)
+            self.clear_checkpoint()
+            # A place page loaded by URL in the search's tab moves its map, so only a location can be searched for next
+            self.driver.maps_area = MAP_MOVED if self.parser.feed_tab_navigated else self.area()
+        except BlockedError:
+            raise  # The job is postponed and retried, not recorded as having no results
         except Exception as e:
             Communicator.show_message(f"Error occurred while scraping. Error: {str(e)}")
+            raise  # The job fails and is retried, not recorded as having no results
         finally:
-            try:
-                Communicator.show_message("Closing the driver")
-                self.driver.close()
-                self.driver.quit()
-            except Exception as e:
-                Communicator.show_message(f"Error occurred while closing the driver. Error: {str(e)}")
+            if self.lean_stats is not None:
+                self.lean_stats.collect(self.driver)
+                Communicator.show_message(self.lean_stats.summary())
+            if self.owns_driver:
+                try:
+                    Communicator.show_message("Closing the driver")
+                    quit_driver(self.driver)
+                except Exception as e:
+                    Communicator.show_message(f"Error occurred while closing the driver. Error: {str(e)}")
             Communicator.end_processing()
+            # Records were streamed to the output file by the parser as they were parsed
+            Communicator.show_message(f"Scraped {len(data)} records")
+        return data
 
-            # Save data using DataSaver
-            Communicator.show_message(f"Saving data: {data}")
-            if len(data) >= 5:  # Ensure data has at least 5 entries before saving and uploading
-                self.data_saver.save(data, self.searchquery)  # Pass searchquery to DataSaver.save()
-                save_and_upload_results(data, self.searchquery, "scrapedcompetitors")
-            else:
-                Communicator.show_message(f"Not enough data collected to save. Only {len(data)} entries found.")
+    def load_checkpoint(self, key):
+        store = get_checkpoint_store()
+        return store.load(key) if store is not None else None
+
+    def resume(self, checkpoint):
+        """Parse the links a crashed or interrupted run of this search had not
+        finished, without searching and scrolling again"""
+        Communicator.show_message(
+            f"Resuming from a checkpoint: {len(checkpoint.links)} links harvested, {checkpoint.cursor} already parsed"
+        )
+        self.saturated = checkpoint.saturated
+        self.parser.checkpoint = checkpoint
+        self.parser.spa_navigation = False  # No feed is open to click cards in
+        data = self.collect_data(checkpoint.remaining_links, checkpoint.feed_records)
+        self.driver.maps_area = MAP_MOVED  # Place pages were loaded by URL
+        self.clear_checkpoint()
         return data
 
-    def collect_data(self, all_results_links):
-        Communicator.show_message(f"Collecting data from links: {all_results_links}")
-        self.parser.main(all_results_links)
+    def clear_checkpoint(self):
+        """Drop the checkpoint of a search once its cursor went past every link"""
+        checkpoint = self.parser.checkpoint
+        if checkpoint is not None and not checkpoint.remaining_links:
+            checkpoint.store.clear(checkpoint.key)
+
+    def area(self):
+        """Key of the map viewport this search runs in"""
+        if self.tile is not None:
+            return ("tile", self.tile.lat, self.tile.long, self.tile.zoom)
+        if self.lat_center and self.long_center:
+            return ("center", self.lat_center, self.long_center)
+        return self.location
+
+    def in_page_query(self):
+        """What to type into the search box of the maps app the driver shows
+        from its previous search, or None when this search needs its URL.
+        A location search only needs the app loaded; a viewport search also
+        needs the map to still show the same viewport."""
+        previous = getattr(self.driver, "maps_area", None)
+        if not SPA_NAVIGATION or self.search_url is not None or previous is None:
+            return None
+        area = self.area()
+        if isinstance(area, str):
+            return f"{self.searchquery} in {area}"
+        return self.searchquery if previous == area else None
+
+    def open_search(self, link_of_page):
+        """Show the search results, from the search box when the maps app is
+        already loaded and otherwise by loading link_of_page"""
+        query = self.in_page_query()
+        if query is not None and search_in_page(self.driver, query):
+            Communicator.show_message(f"Searched for '{query}' from the search box")
+            return True
+
+        if not self.openingurl(url=link_of_page):
+            return False
+        Communicator.show_message(f"Navigated to URL: {link_of_page}")
+        if not wait_until(self.driver, script_condition(SEARCH_READY_SCRIPT)):
+            Communicator.show_message("Search results did not finish loading in time")
+        return True
+
+    def collect_data(self, all_results_links, feed_records=None):
+        Communicator.show_payload("Collecting data from links", all_results_links, summary=f"Collecting data from {len(all_results_links)} links")
+        self.parser.main(all_results_links, feed_records)
         return self.parser.finalData
 
     def get_all_results_links(self):
-        results_links = []
-        try:
-            Communicator.show_message("Finding result links with CSS selector 'a.result-title'")
-            elements = self.driver.find_elements(By.CSS_SELECTOR, "a.result-title")
-            for elem in elements:
-                link = elem.get_attribute("href")
-                if link:
-                    results_links.append(link)
-        except Exception as e:
-            Communicator.show_message(f"Error occurred while getting result links. Error: {str(e)}")
-        Communicator.show_message(f"Results links collected: {results_links}")
+        results_links = self.scroller.get_results_links()
+        Communicator.show_payload("Results links collected", results_links, summary=f"{len(results_links)} results links collected")
         return results_links
@@ -1,19 +1,87 @@
-import time
 from communicator import Communicator
 from common import Common
-from bs4 import BeautifulSoup
 from selenium.common.exceptions import JavascriptException
 from parser import Parser
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import StaleElementReferenceException
+from settings import (
+    MAX_FEED_RESULTS,
+    SATURATION_RATIO,
+    FEED_ONLY_MODE,
+    SCROLL_WAIT_TIMEOUT,
+    SCROLL_MAX_IDLE_ROUNDS,
+)
+from place_ids import place_id_from_href
+from parse_engines import get_engine
+from metrics import Metrics, FEED_WAIT, SCROLL_STEP
+from fixture_store import get_fixture_store
+from wait_policy import wait_until
+
+# Search results are ready once the feed (or, for a single match, the place
+# sheet google maps jumps to) is rendered
+SEARCH_READY_SCRIPT = """
+return document.readyState === 'complete'
+    && (document.querySelector('[role="feed"]') !== null || document.querySelector("[role='main'] h1") !== null);
+"""
+
+# Returns [href, card html] for every result anchor not returned before and
+# marks it, so each scroll step only ships the newly appended cards
+HARVEST_NEW_LINKS_SCRIPT = """
+const feed = arguments[0];
+const includeCards = arguments[1];
+const harvested = [];
+for (const anchor of feed.querySelectorAll('a.hfpxzc:not([data-harvested])')) {
+    anchor.setAttribute('data-harvested', '1');
+    const card = includeCards ? (anchor.closest('.Nv2PK') || anchor.parentElement) : null;
+    harvested.push([anchor.getAttribute('href'), card ? card.outerHTML : null]);
+}
+return harvested;
+"""
+
+# Async script: resolves as soon as the feed holds more cards than before or the
+# end-of-list marker (.PbZDve) is present, or after the timeout
+WAIT_FOR_FEED_CHANGE_SCRIPT = """
+const feed = arguments[0];
+const previousCount = arguments[1];
+const timeoutMs = arguments[2];
+const done = arguments[arguments.length - 1];
+const state = () => ({
+    count: feed.querySelectorAll('a.hfpxzc').length,
+    end: document.querySelector('.PbZDve') !== null,
+});
+const ready = (current) => current.count > previousCount || current.end;
+
+const initial = state();
+if (ready(initial)) {
+    done(initial);
+    return;
+}
+let timer = null;
+const observer = new MutationObserver(() => {
+    const current = state();
+    if (ready(current)) {
+        observer.disconnect();
+        clearTimeout(timer);
+        done(current);
+    }
+});
+observer.observe(feed, {childList: true, subtree: true});
+timer = setTimeout(() => {
+    observer.disconnect();
+    done(state());
+}, timeoutMs);
+"""
 
 class Scroller:
     def __init__(self, driver, searchquery) -> None:
         self.driver = driver
         self.searchquery = searchquery
         self.__allResultsLinks = []
+        self.__placeIds = set()
+        self.__feedRecords = {}  # Result link -> record built from its feed card
+        self.engine = get_engine()
+        self.reached_end = False
 
     def __init_parser(self):
         self.parser = Parser(self.driver, self.searchquery)
@@ -25,9 +93,9 @@ class Scroller:
             Communicator.show_error_message("No results to parse. Links list is empty.", "ERR_NO_RESULTS")
             return
 
-        self.parser.main(self.__allResultsLinks)
+        self.parser.main(self.__allResultsLinks, self.__feedRecords)
 
-    def scroll(self):
+    def scroll(self, search_url=None):
         """In case search results are not available"""
         scrollable_element = self.get_scrollable_element()
 
@@ -38,46 +106,83 @@ class Scroller:
         Communicator.show_message(message="Starting scrolling")
         self.perform_scrolling(scrollable_element)
         Communicator.show_message(f"Total locations scrolled: {len(self.__allResultsLinks)}")
-        self.start_parsing()
+        self.record_feed(search_url)
 
-    def get_scrollable_element(self):
+    def record_feed(self, search_url):
+        """Save the scrolled feed for offline replays when recording is on"""
+        store = get_fixture_store()
+        if store is None or search_url is None:
+            return
         try:
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, '[role="feed"]'))
+            html = self.driver.execute_script(
+                "const feed = document.querySelector('[role=\"feed\"]'); return feed ? feed.outerHTML : null;"
             )
-            return self.driver.execute_script("return document.querySelector('[role=\"feed\"]')")
-        except TimeoutException as e:
-            Communicator.show_error_message(f"Error finding scrollable element: {e}", 'ERR_SCROLLABLE_ELEMENT_NOT_FOUND')
+            if html:
+                store.record_feed(search_url, self.searchquery, html, self.reached_end)
+        except Exception as e:
+            Communicator.show_message(f"Error while recording the feed: {e}")
+
+    def get_scrollable_element(self):
+        found = wait_until(self.driver, EC.presence_of_element_located((By.CSS_SELECTOR, '[role="feed"]')), stage=FEED_WAIT)
+        if found is None:
+            Communicator.show_error_message("Error finding scrollable element: the feed did not appear", 'ERR_SCROLLABLE_ELEMENT_NOT_FOUND')
             return None
+        return self.driver.execute_script("return document.querySelector('[role=\"feed\"]')")
 
     def perform_scrolling(self, scrollable_element):
-        last_height = 0
-        dynamic_sleep_time = 1
+        """Scroll the feed and wait in the page until new cards are appended or
+        the end-of-list marker shows up, instead of sleeping a fixed time.
+        The feed element handle is kept and only looked up again when stale."""
+        self.driver.set_script_timeout(SCROLL_WAIT_TIMEOUT + 5)
+        card_count = 0
+        idle_rounds = 0
 
         while True:
             if Common.close_thread_is_set():
                 self.driver.quit()
                 return
 
-            scrollable_element = self.get_scrollable_element()
-            if scrollable_element is None:
+            try:
+                with Metrics.timer(SCROLL_STEP):
+                    self.driver.execute_script("arguments[0].scrollTo(0, arguments[0].scrollHeight);", scrollable_element)
+                    state = self.driver.execute_async_script(
+                        WAIT_FOR_FEED_CHANGE_SCRIPT, scrollable_element, card_count, SCROLL_WAIT_TIMEOUT * 1000
+                    )
+            except StaleElementReferenceException:
+                scrollable_element = self.get_scrollable_element()
+                if scrollable_element is None:
+                    break
+                continue
+
+            if state["count"] > card_count:
+                Common.mark_progress()
+                card_count = state["count"]
+                idle_rounds = 0
+                self.collect_results_links(scrollable_element)
+                Communicator.show_message(f"Total locations scrolled: {len(self.__allResultsLinks)}")
+            else:
+                idle_rounds += 1
+
+            if state["end"]:
+                self.reached_end = True
                 break
 
-            self.driver.execute_script("arguments[0].scrollTo(0, arguments[0].scrollHeight);", scrollable_element)
-            time.sleep(dynamic_sleep_time)
+            if idle_rounds >= SCROLL_MAX_IDLE_ROUNDS:
+                Communicator.show_message("No new results after waiting, stopping scrolling")
+                break
+            if idle_rounds:
+                self.try_click_last_element()
 
-            new_height = self.driver.execute_script("return arguments[0].scrollHeight", scrollable_element)
+    def get_results_links(self):
+        return list(self.__allResultsLinks)
 
-            if new_height == last_height:
-                if self.is_end_of_list():
-                    break
-                else:
-                    self.try_click_last_element()
-            else:
-                last_height = new_height
-                self.collect_results_links(scrollable_element)
-                Communicator.show_message(f"Total locations scrolled: {len(self.__allResultsLinks)}")
-                dynamic_sleep_time = max(1, dynamic_sleep_time - 0.1)  # Decrease sleep time for faster scrolling
+    def get_feed_records(self):
+        return dict(self.__feedRecords)
+
+    def is_saturated(self):
+        """True when the feed returned (nearly) as many results as google maps
+        will list for one search, meaning the area likely holds more"""
+        return len(self.__allResultsLinks) >= MAX_FEED_RESULTS * SATURATION_RATIO
 
     def is_end_of_list(self):
         try:
@@ -94,11 +199,18 @@ class Scroller:
             pass
 
     def collect_results_links(self, scrollable_element):
+        """Add the links of newly appended result cards, deduplicated by place id"""
         try:
-            all_results_list_soup = BeautifulSoup(scrollable_element.get_attribute('outerHTML'), 'html.parser')
-            all_results_anchor_tags = all_results_list_soup.find_all('a', class_='hfpxzc')
-            self.__allResultsLinks = [anchor_tag.get('href') for anchor_tag in all_results_anchor_tags if anchor_tag.get('href')]
+            harvested = self.driver.execute_script(HARVEST_NEW_LINKS_SCRIPT, scrollable_element, FEED_ONLY_MODE)
+            for href, card_html in harvested:
+                place_id = place_id_from_href(href)
+                if not href or place_id in self.__placeIds:
+                    continue
+                self.__placeIds.add(place_id)
+                self.__allResultsLinks.append(href)
+                if card_html:
+                    self.__feedRecords[href] = self.engine.extract_feed_card(card_html)
             if not self.__allResultsLinks:
                 Communicator.show_message("No links found during scrolling.")
         except Exception as e:
-            Communicator.show_error_message(f"Error collecting result links: {e}", 'ERR_COLLECTING_RESULTS_LINKS')
\ No newline at end of file
+            Communicator.show_error_message(f"Error collecting result links: {e}", 'ERR_COLLECTING_RESULTS_LINKS')
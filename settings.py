@@ -1,3 +1,125 @@
 OUTPUT_PATH = "."
 
 DRIVER_EXECUTABLE_PATH = None
+
+# Geo tiling
+VIEWPORT_WIDTH_PX = 1000  # Approximate width of the map area next to the results panel
+PEOPLE_PER_SQ_KM = 2000  # Used to estimate a city's radius from its population
+MIN_CITY_RADIUS_KM = 3
+MIN_ZOOM = 10
+MAX_ZOOM = 18
+
+# Adaptive tiling
+MAX_FEED_RESULTS = 120  # Google maps stops listing results after about this many
+SATURATION_RATIO = 0.9  # A tile returning this share of MAX_FEED_RESULTS gets subdivided
+QUADTREE_MAX_DEPTH = 4
+QUADTREE_MIN_SPAN_KM = 0.5
+
+# Driver pool
+DRIVER_RECYCLE_AFTER_PAGES = 300  # Quit and replace a pooled driver after this many page loads
+
+# Feed-only mode: build records from the result cards and only open the detail
+# page of a place when its card lacks one of FEED_REQUIRED_FIELDS
+FEED_ONLY_MODE = False
+FEED_REQUIRED_FIELDS = ("Name", "Address", "Phone")
+
+# Scrolling
+SCROLL_WAIT_TIMEOUT = 5  # Seconds to wait for new cards after each scroll
+SCROLL_MAX_IDLE_ROUNDS = 3  # Stop after this many scrolls that load nothing new
+
+# Detail pages
+MAX_TABS_PER_BROWSER = 4  # Place pages loading concurrently in one browser, 1 disables tabs
+DETAIL_PAGE_TIMEOUT = 15  # Seconds before a place page that never becomes ready is skipped
+TAB_POLL_INTERVAL = 0.1
+
+# HTML parsing engine: "lxml" (C-backed, precompiled selectors) or "bs4"
+PARSER_ENGINE = "lxml"
+
+# Output
+SINK_FSYNC_EVERY = 50  # Records written between fsyncs of the JSON Lines output
+RESULT_QUEUE_SIZE = 10000  # Records in flight from the workers to the parent's writer
+WORKER_SHUTDOWN_TIMEOUT = 30  # Seconds workers get to hand over their records on CTRL+C
+
+# Cross-run deduplication
+PLACE_INDEX_PATH = "place_index.sqlite3"
+PLACE_INDEX_TTL_DAYS = 30  # Places scraped more recently than this are skipped, 0 always rescrapes
+
+# Job queue
+JOB_QUEUE_PATH = "jobs.sqlite3"
+JOB_LEASE_SECONDS = 3600  # A job not finished within its lease is handed to another worker; the lease is extended while the job makes progress
+JOB_MAX_ATTEMPTS = 3
+JOB_MAX_POSTPONES = 10  # A job blocked this many times is failed instead of postponed again
+JOB_POLL_INTERVAL = 5  # Seconds an idle worker waits before asking for work again
+
+# Concurrency governor
+GOVERNOR_INTERVAL = 5  # Seconds between resource samples
+GOVERNOR_HEADROOM = 10  # Percent below every limit required before adding a worker
+GOVERNOR_STATUS_EVERY = 12  # Log current/target concurrency every this many samples
+
+# Lean mode: block heavy resources through CDP and keep a warm disk cache
+LEAN_MODE = False
+LEAN_BLOCK_CATEGORIES = ("tiles", "fonts", "media", "telemetry")  # See lean_mode.BLOCK_RULES
+LEAN_EXTRA_BLOCKED_URLS = ()  # Additional Network.setBlockedURLs patterns
+LEAN_CACHE_DIR = None  # e.g. "chrome_cache" to reuse disk caches across drivers and runs
+
+# Logging
+VERBOSE_PAYLOADS = False  # Print full records and link lists instead of short summaries
+METRICS_REPORT_PATH = "run_report.json"
+METRICS_LOCATIONS_PATH = "location_metrics.jsonl"  # A location's summary is appended once its last job is over
+
+# Offline replays, see replay_driver.py and benchmark_pipeline.py
+RECORD_FIXTURES_DIR = None  # e.g. "recorded" to save every feed and place page seen while scraping
+REPLAY_NAVIGATION_LATENCY = 0.8  # Seconds a replayed page takes to load
+REPLAY_SCROLL_LATENCY = 0.5  # Seconds a replayed feed takes to append the next cards
+REPLAY_LATENCY_JITTER = 0.3  # Latencies vary by up to +-30%
+REPLAY_FEED_BATCH = 7  # Cards appended to a replayed feed per scroll, like google maps
+REPLAY_PANEL_LATENCY = 0.25  # Seconds a replayed place sheet takes to show after its card is clicked
+
+# Waits and retries, see wait_policy.py
+EXPLICIT_WAIT_TIMEOUT = 10  # Seconds an explicit wait for an element or readiness signal may take
+WAIT_POLL_INTERVAL = 0.1  # Seconds between checks of an explicit wait
+RETRY_MAX_ATTEMPTS = 4  # Attempts of a failing navigation before it is given up
+RETRY_BASE_DELAY = 1  # Backoff before the first retry, doubled on every further retry
+RETRY_MAX_DELAY = 30
+
+# Blocks and throttling, see blocking.py, rate_limiter.py and proxy_pool.py
+RATE_LIMIT_PAGES_PER_MIN = 120  # Page loads per minute and worker while nothing is blocked
+RATE_LIMIT_MIN_PAGES_PER_MIN = 10  # Floor the rate is halved down to on blocks
+RATE_LIMIT_BURST = 5  # Page loads a worker may start at once
+BLOCK_COOLDOWN = 60  # Seconds a worker pauses after a block, doubled for every further block in a row
+BLOCK_MAX_COOLDOWN = 900
+PROXY_POOL = None  # "file" to start chrome workers behind the proxies listed in PROXY_FILE
+PROXY_FILE = "proxies.txt"  # One proxy per line, e.g. http://10.0.0.1:3128
+PROXY_COOLDOWN = 1800  # Seconds a proxy is left unused after it got blocked
+
+# Logging and worker start-up
+LOG_LEVEL = "INFO"
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+WORKER_START_METHOD = None  # "fork", "spawn" or "forkserver"; None uses the platform default
+
+# Multi-node runs, see coordinator.py
+COORDINATOR_PORT = 6000  # Port of `starter.py headless --serve` when the address has none
+HEARTBEAT_INTERVAL = 15  # Seconds between heartbeats of a remote worker
+HEARTBEAT_TIMEOUT = 60  # A remote worker silent for this long is lost and its job is reassigned
+
+# Browser-less place pages, see http_fetcher.py
+HTTP_FETCH_MODE = False  # Fetch place pages over plain HTTP; only pages that fail to extract are opened in chrome
+HTTP_POOL_SIZE = 4  # Keep-alive connections per worker, and place pages fetched concurrently
+HTTP_TIMEOUT = 10  # Seconds per request
+HTTP_USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+HTTP_ACCEPT_LANGUAGE = "en-US,en;q=0.9"  # Addresses and labels in the same language as the chrome workers
+
+# In-page navigation, see feed_navigator.py
+SPA_NAVIGATION = False  # Open places by clicking their feed card and search from the search box instead of loading URLs
+PANEL_TIMEOUT = 10  # Seconds before a clicked place whose sheet never shows is loaded by URL instead
+
+# Capture-only browsers, see html_archive.py and reextract.py
+CAPTURE_ONLY = False  # Browser workers archive place sheets; a process pool in the parent extracts them
+HTML_ARCHIVE_DIR = "html_archive"
+EXTRACT_PROCESSES = 2  # Extraction processes of the parent, next to the browser workers
+EXTRACT_BATCH_SIZE = 50  # Captures extracted per task
+EXTRACT_FLUSH_INTERVAL = 5  # Seconds before a partial batch is extracted anyway
+
+# Checkpoints inside a job, see checkpoints.py
+CHECKPOINT_PATH = "checkpoints.sqlite3"  # None disables them
+CHECKPOINT_MAX_AGE_HOURS = 24  # Older checkpoints are ignored and the search is scrolled again
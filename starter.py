@@ -1,53 +1,36 @@
 import argparse
+import math
+import multiprocessing
 import os
-import numpy as np
-from multiprocessing import Pool, current_process, Semaphore
-from scraper import Backend
-from database import DataSaver
+from job_queue import JobQueue
+from communicator import Communicator
+from metrics import MetricsCollector
+from settings import WORKER_SHUTDOWN_TIMEOUT, METRICS_REPORT_PATH, METRICS_LOCATIONS_PATH, LOG_LEVEL, LOG_FORMAT, WORKER_START_METHOD, CAPTURE_ONLY
+from database import ResultWriter, get_sink, close_sinks
+from catalog import LocationCatalog, read_industries
+from geotiling import Tile, city_radius_km, slice_tile, grid_tiles
+from worker import worker_loop
+from coordinator import Coordinator, parse_address, get_authkey, wait_for_jobs
 import signal
 import sys
 import json
 import logging
-import psutil
-import time
 import subprocess
-
-# Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+import socket
 
 
 # Global variables
 processes = []
-all_results = []
-search_query = ""
-data_saver = DataSaver()
+result_writer = None  # Writes the records streamed back by the workers, parent only
+metrics_collector = None  # Merges the workers' per-job metrics, parent only
 progress_file = "progress.json"
 MAX_CONCURRENT_DRIVERS = 6  # Set the maximum number of concurrent chromedriver instances
-semaphore = Semaphore(MAX_CONCURRENT_DRIVERS)  # Create a semaphore to limit concurrent drivers
 MIN_CONCURRENT_DRIVERS = 1  # Minimum number of concurrent chromedriver instances
 
-# Resource limits
+# Resource limits, overridable from the command line
 MAX_CPU_USAGE = 90  # Maximum CPU usage percentage
 MAX_RAM_USAGE = 30 * 1024 * 1024 * 1024  # Maximum RAM usage in bytes (30 GB)
-
-def get_city_data(city_name):
-    locations_file_path = 'locations.txt'
-    with open(locations_file_path, 'r') as file:
-        for line in file:
-            if line.startswith(city_name):
-                name, population, lat, long = line.strip().split(',')
-                return {'population': int(population), 'lat': float(lat), 'long': float(long)}
-    return {'population': 0, 'lat': None, 'long': None}
-
-def read_locations_from_file(filename):
-    with open(filename, 'r') as file:
-        locations = [line.strip().split(',') for line in file.readlines()]
-    return [loc[0] for loc in locations]
-
-def read_industries_from_file(filename):
-    with open(filename, 'r') as file:
-        industries = [line.strip() for line in file.readlines()]
-    return industries
+MAX_CHROME_RSS = 20 * 1024 * 1024 * 1024  # Maximum resident memory of all chrome processes (20 GB)
 
 def read_progress():
     if os.path.exists(progress_file):
@@ -55,85 +38,102 @@ def read_progress():
             return json.load(file)
     return {}
 
-def write_progress(progress):
-    with open(progress_file, 'w') as file:
-        json.dump(progress, file, indent=4)
-
 def determine_num_divisions(population):
     if population <= 100000:
         return 1
     else:
         return max(2, population // 200000)
 
-def generate_pie_subregions(lat_center, long_center, num_divisions):
-    angles = np.linspace(0, 2 * np.pi, num_divisions + 1)
+def generate_pie_subregions(lat_center, long_center, num_divisions, radius_km):
+    """Split the city disc into pie slices, each with its own viewport"""
+    angles = [2 * math.pi * i / num_divisions for i in range(num_divisions + 1)]
     subregions = []
     
     for i in range(num_divisions):
         start_angle = angles[i]
         end_angle = angles[i + 1]
-        subregions.append((lat_center, long_center, start_angle, end_angle))
+        subregions.append(slice_tile(lat_center, long_center, start_angle, end_angle, radius_km))
     
     return subregions
 
-def monitor_resources():
-    """Monitor CPU and RAM usage and adjust concurrent processes."""
-    cpu_usage = psutil.cpu_percent(interval=1)
-    ram_usage = psutil.virtual_memory().used
-
-    # Adjust the number of concurrent drivers
-    if cpu_usage > MAX_CPU_USAGE or ram_usage > MAX_RAM_USAGE:
-        # Reduce the number of concurrent drivers
-        new_limit = max(MIN_CONCURRENT_DRIVERS, semaphore._value - 1)
-        semaphore._value = new_limit
-        logging.warning(f"Reducing concurrent drivers to {new_limit} due to high resource usage.")
-    else:
-        # Increase the number of concurrent drivers if below max limit
-        new_limit = min(MAX_CONCURRENT_DRIVERS, semaphore._value + 1)
-        semaphore._value = new_limit
-        logging.info(f"Increasing concurrent drivers to {new_limit}.")
-
-def scrape_subregion(args):
-    global all_results
-    semaphore.acquire()  # Acquire a semaphore slot
+def generate_subregions(lat_center, long_center, num_divisions, population, tiling):
+    radius_km = city_radius_km(population)
+    if tiling == "grid":
+        return grid_tiles(lat_center, long_center, radius_km, num_divisions)
+    return generate_pie_subregions(lat_center, long_center, num_divisions, radius_km)
+
+def plan_jobs(job_queue, industries, locations, tiling, progress, catalog):
+    """Queue the (industry, location, tile) jobs of every pair not planned before.
+    Population and coordinates of each location are looked up in catalog."""
+    for industry_index, industry in enumerate(industries):
+        priority = -industry_index  # Earlier industries first, idle workers take whatever is ready
+        for location in locations:
+            if location in progress.get(industry, []) or job_queue.has_jobs(industry, location):
+                continue
+
+            city_data = catalog.get(location)
+            if city_data is None or city_data.population == 0:
+                logging.warning(f"Warning: Population data for {location} not found.")
+                continue
+            population = city_data.population
+            lat_center = city_data.lat
+            long_center = city_data.long
+
+            num_divisions = determine_num_divisions(population)
+            if tiling == "adaptive" and lat_center and long_center:
+                span_km = city_data.span_km() or 2 * city_radius_km(population)
+                tiles = [Tile(lat_center, long_center, span_km)]
+            elif num_divisions > 1:
+                if not lat_center or not long_center:
+                    logging.error(f"Error: Coordinates for {location} not found.")
+                    continue
+                tiles = generate_subregions(lat_center, long_center, num_divisions, population, tiling)
+            else:
+                tiles = [None]
+
+            for tile in tiles:
+                job_queue.enqueue(industry, location, tile.to_dict() if tile else None, priority)
+            logging.info(f"Queued {len(tiles)} jobs for {industry} in {location}")
+
+def location_done(key):
+    """Whether the last job of a metrics key ("industry | location") is over.
+    Called on the result writer's thread, which needs its own connection."""
+    industry, _, location = key.partition(" | ")
+    queue = JobQueue()
     try:
-        search_query, headless_mode, lat_center, long_center, start_angle, end_angle = args
-        backend = Backend(
-            searchquery=search_query,
-            outputformat='json',
-            headlessmode=headless_mode,
-            lat_center=lat_center,
-            long_center=long_center,
-            start_angle=start_angle,
-            end_angle=end_angle
-        )
-        processes.append(current_process())
-        result = backend.mainscraping()
-        all_results.extend(result)
-        backend.cleanup()  # Ensure the driver is closed after scraping
+        return queue.location_done(industry, location)
+    finally:
+        queue.close()
 
-        # Monitor resources after scraping
-        monitor_resources()
 
-        return result
-    finally:
-        semaphore.release()  # Release the semaphore slot
+def write_run_report():
+    """Write the aggregated metrics of the run to METRICS_REPORT_PATH"""
+    if metrics_collector is None:
+        return
+    report = metrics_collector.write_report(METRICS_REPORT_PATH)
+    logging.info(f"Run metrics: {json.dumps(report['run'])}")
+    logging.info(f"Per-location metrics written to {METRICS_REPORT_PATH}")
+
 
 def signal_handler(sig, frame):
-    logging.info('CTRL+C detected. Saving results...')
+    """CTRL+C in the parent; workers install their own handler, see worker.py"""
+    logging.info('CTRL+C detected. Waiting for workers to hand over their records...')
     try:
-        data_saver.save(all_results, search_query)
+        for process in processes:
+            process.join(timeout=WORKER_SHUTDOWN_TIMEOUT)
+        if result_writer is not None:
+            result_writer.stop()
+        close_sinks()
+        write_run_report()
     except Exception as e:
         logging.error(f"Error during saving results: {e}")
     finally:
         logging.info('Shutting down processes...')
         for process in processes:
-            process.terminate()
+            if process.is_alive():
+                process.terminate()
         sys.exit(0)
 
-# Register the signal handler for CTRL+C
-signal.signal(signal.SIGINT, signal_handler)
-
 def log_versions():
     try:
         chrome_version = subprocess.check_output(['google-chrome', '--version']).decode('utf-8').strip()
@@ -148,106 +148,161 @@ def log_versions():
         logging.error(f"Error retrieving ChromeDriver version: {e}")
 
 def main():
-    global search_query
+    global result_writer, metrics_collector
+    logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
+    signal.signal(signal.SIGINT, signal_handler)  # Register the signal handler for CTRL+C
     log_versions()  # Log versions at the start
     parser = argparse.ArgumentParser()
 
     parser.add_argument("value", type=str, help="""Arguments being passed to script.
                         It can be: 
-                        headless: To start the scraper in headless mode (CLI)""")
+                        headless: To start the scraper in headless mode (CLI)
+                        worker: To run browser workers for a coordinator started with headless --serve""")
     parser.add_argument("--locations_file", type=str, help="File with list of locations", required=False)
+    parser.add_argument("--gazetteer", type=str, help="CSV or Parquet file with population, coordinates and optional bounding boxes of the locations (defaults to --locations_file)", required=False)
     parser.add_argument("--industries_file", type=str, help="File with list of industries", required=False)
     parser.add_argument("--num_locations", type=int, default=1, help="Number of locations to select from the file", required=False)
     parser.add_argument("--headless_mode", type=int, choices=[0, 1], default=0, help="Headless mode (1 for true, 0 for false)")
+    parser.add_argument("--output_format", type=str, choices=["jsonl", "csv", "parquet"], default="jsonl", help="Records are streamed to <industry>.jsonl and converted to this format at the end of the run")
+    parser.add_argument("--workers", type=int, default=MAX_CONCURRENT_DRIVERS, help="Maximum number of browser worker processes")
+    parser.add_argument("--max_cpu", type=float, default=MAX_CPU_USAGE, help="CPU usage percentage above which workers are paused")
+    parser.add_argument("--max_ram_gb", type=float, default=MAX_RAM_USAGE / 1024 ** 3, help="RAM usage above which workers are paused")
+    parser.add_argument("--max_chrome_rss_gb", type=float, default=MAX_CHROME_RSS / 1024 ** 3, help="Total chrome memory above which workers are paused")
+    parser.add_argument("--tiling", type=str, choices=["pie", "grid", "adaptive"], default="pie", help="How cities are split between workers")
+    parser.add_argument("--start_method", type=str, choices=["fork", "spawn", "forkserver"], default=WORKER_START_METHOD, help="How worker processes are started (platform default if not set)")
+    parser.add_argument("--verbose_payloads", action="store_true", help="Log full records and link lists instead of short summaries")
+    parser.add_argument("--serve", type=str, help="host:port to hand out jobs to remote workers on, e.g. 0.0.0.0:6000")
+    parser.add_argument("--coordinator", type=str, help="host:port of the coordinator a worker run takes its jobs from")
+    parser.add_argument("--authkey", type=str, help="Shared key of the coordinator and its workers (or set SCRAPER_AUTHKEY)")
 
     args = parser.parse_args()
 
+    authkey = None
+    if args.serve or args.coordinator:
+        try:
+            authkey = get_authkey(args.authkey)
+        except ValueError as e:
+            logging.error(f"Error: {e}")
+            return
+
     if args.value == "headless":
         if not args.locations_file or not args.industries_file:
             logging.error("Error: --locations_file and --industries_file are required for headless mode")
             return
 
-        locations_file_path = args.locations_file
-        industries_file_path = args.industries_file
-        
-        locations = read_locations_from_file(locations_file_path)
-        industries = read_industries_from_file(industries_file_path)
-        progress = read_progress()
-
-        total_locations = len(locations)
-
+        # Locations and industries are parsed once; a larger gazetteer can
+        # supply the population and coordinates of the listed locations
+        locations = LocationCatalog.from_file(args.locations_file).names()
+        catalog = LocationCatalog.from_file(args.gazetteer or args.locations_file)
+        industries = read_industries(args.industries_file)
+        logging.info(f"Loaded {len(locations)} locations, {len(industries)} industries and a catalog of {len(catalog)} places")
+        progress = read_progress()  # Locations finished by runs that predate the job queue
+
+        job_queue = JobQueue()
+        released = job_queue.release_leases()
+        if released:
+            logging.info(f"Resuming {released} jobs that were in progress when the last run stopped")
+        plan_jobs(job_queue, industries, locations, args.tiling, progress, catalog)
+        logging.info(f"Job queue: {job_queue.counts()}")
+
+        # A fixed set of workers pulls jobs continuously, each keeping its
+        # driver warm across locations and industries
+        from governor import ConcurrencyGovernor  # psutil is only needed by the parent
+
+        if args.start_method:
+            multiprocessing.set_start_method(args.start_method)  # Before any queue or shared value exists
+        Communicator.set_verbose_payloads(args.verbose_payloads)
+        metrics_collector = MetricsCollector(location_done=location_done, locations_path=METRICS_LOCATIONS_PATH)
+        extraction_pool = None
+        if CAPTURE_ONLY:
+            from html_archive import ExtractionPool
+
+            extraction_pool = ExtractionPool()  # Workers only capture, records are extracted here
+        result_writer = ResultWriter(metrics_collector=metrics_collector, extraction_pool=extraction_pool)
+        result_writer.start()
+        coordinator = None
+        if args.serve:
+            # Remote workers lease from the same queue and stream into the same writer
+            coordinator = Coordinator(parse_address(args.serve, "0.0.0.0"), authkey, args.tiling, result_writer.queue)
+            coordinator.start()
+        governor = ConcurrencyGovernor(
+            min_workers=min(MIN_CONCURRENT_DRIVERS, args.workers),
+            max_workers=args.workers,
+            max_cpu=args.max_cpu,
+            max_ram=args.max_ram_gb * 1024 ** 3,
+            max_chrome_rss=args.max_chrome_rss_gb * 1024 ** 3,
+        )
+        hostname = socket.gethostname()
+        workers = [
+            multiprocessing.Process(
+                target=worker_loop,
+                args=(f"{hostname}-worker-{i}", i, args.headless_mode, args.tiling, governor.target, governor.busy, result_writer.queue, args.verbose_payloads)
+            )
+            for i in range(args.workers)
+        ]
+        for worker in workers:
+            worker.start()
+            processes.append(worker)
+        governor.start()
+        for worker in workers:
+            worker.join()
+        if coordinator is not None:
+            wait_for_jobs(job_queue, coordinator, workers)
+            coordinator.stop()
+            logging.info(f"Coordinator done, {coordinator.lost} remote workers were lost on the way")
+        governor.stop()
+        result_writer.stop()
+        logging.info(f"Result writer saved {result_writer.records_written} records")
+        if extraction_pool is not None:
+            logging.info(f"Extracted {extraction_pool.extracted} captured pages, {extraction_pool.failed} had no place name")
+        write_run_report()
+
+        logging.info(f"Job queue: {job_queue.counts()}")
+        records = job_queue.records_by_industry()
         for industry in industries:
-            logging.info(f"Processing industry: {industry}")
-            search_query = industry
-
-            if industry not in progress:
-                progress[industry] = []
-
-            # Check if the industry is completed
-            if len(progress[industry]) >= total_locations:
-                logging.info(f"Skipping completed industry: {industry}")
-                continue
-
-            for location in locations:
-                if location in progress[industry]:
-                    logging.info(f"Skipping already completed location: {location} for industry: {industry}")
-                    continue
-
-                logging.info(f"Processing location: {location} for industry: {industry}")
-                city_data = get_city_data(location)
-                population = city_data['population']
-                lat_center = city_data['lat']
-                long_center = city_data['long']
-                logging.info(f"Population of {location}: {population}, lat: {lat_center}, long: {long_center}")
-                
-                if population == 0:
-                    logging.warning(f"Warning: Population data for {location} not found.")
-                    continue
+            logging.info(f"{records.get(industry, 0)} records collected for industry '{industry}'")
+            if args.output_format != "jsonl" and industry in records:
+                logging.info(f"Wrote {get_sink(industry).rollover(args.output_format)}")
+        job_queue.close()
+
+    elif args.value == "worker":
+        if not args.coordinator:
+            logging.error("Error: --coordinator is required for worker mode")
+            return
 
-                num_divisions = determine_num_divisions(population)
-                logging.info(f"Number of divisions for {location}: {num_divisions}")
-
-                if num_divisions > 1:
-                    if not lat_center or not long_center:
-                        logging.error(f"Error: Coordinates for {location} not found.")
-                        return
-                    
-                    subregions = generate_pie_subregions(lat_center, long_center, num_divisions)
-                    tasks = [(search_query, args.headless_mode, lat_center, long_center, start_angle, end_angle) for lat_center, long_center, start_angle, end_angle in subregions]
-                    
-                    try:
-                        with Pool(processes=MAX_CONCURRENT_DRIVERS) as pool:
-                            results = pool.map(scrape_subregion, tasks)
-                            all_results.extend(results)
-                    except Exception as e:
-                        logging.error(f"Error during multiprocessing: {e}")
-                        results = []
-                        for task in tasks:
-                            results.append(scrape_subregion(task))
-                        all_results.extend(results)
-                else:
-                    backend = Backend(
-                        searchquery=search_query,
-                        outputformat='json',
-                        headlessmode=args.headless_mode,
-                        location=location
-                    )
-                    results = backend.mainscraping()
-                    logging.info(f"Results for {location}: {results}")
-                    all_results.extend(results)
-
-                # Save results for the current location
-                data_saver.save(results, industry)
-
-                # Update progress
-                progress[industry].append(location)
-                write_progress(progress)
-
-            logging.info(f"All results collected for industry '{industry}': {all_results}")
-            all_results = []  # Reset for next industry
+        # Jobs come from the coordinator and records go back to it; only
+        # the browsers and the governor watching this host's resources run here
+        from governor import ConcurrencyGovernor
+
+        if args.start_method:
+            multiprocessing.set_start_method(args.start_method)
+        address = parse_address(args.coordinator)
+        governor = ConcurrencyGovernor(
+            min_workers=min(MIN_CONCURRENT_DRIVERS, args.workers),
+            max_workers=args.workers,
+            max_cpu=args.max_cpu,
+            max_ram=args.max_ram_gb * 1024 ** 3,
+            max_chrome_rss=args.max_chrome_rss_gb * 1024 ** 3,
+        )
+        hostname = socket.gethostname()
+        workers = [
+            multiprocessing.Process(
+                target=worker_loop,
+                args=(f"{hostname}-{os.getpid()}-worker-{i}", i, args.headless_mode, args.tiling, governor.target, governor.busy, None, args.verbose_payloads, address, authkey)
+            )
+            for i in range(args.workers)
+        ]
+        for worker in workers:
+            worker.start()
+            processes.append(worker)
+        governor.start()
+        for worker in workers:
+            worker.join()
+        governor.stop()
+        logging.info(f"Coordinator at {args.coordinator} has no jobs left")
 
     else:
-        logging.error("Invalid argument. Use 'headless' for headless execution.")
+        logging.error("Invalid argument. Use 'headless' for headless execution or 'worker' to join a coordinator.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,162 @@
+import time
+from communicator import Communicator
+from common import Common
+from metrics import Metrics, DETAIL_PAGE_LOAD
+from blocking import check_page
+from place_ids import place_id_from_href
+from rate_limiter import get_rate_limiter
+from lean_mode import enable_blocking
+from settings import MAX_TABS_PER_BROWSER, DETAIL_PAGE_TIMEOUT, TAB_POLL_INTERVAL, LEAN_MODE
+
+PAGE_READY_SCRIPT = """
+return document.readyState === 'complete'
+    && document.querySelector("[role='main'] h1") !== null;
+"""
+
+# Tags the document of the tab as stale, then starts the next navigation
+# without waiting for it, so the old page is never taken for the new one
+DISPATCH_SCRIPT = """
+document.documentElement.dataset.stale = '1';
+window.location.href = arguments[0];
+"""
+
+# URL of a tab whose new document is loaded and shows a place sheet, or null
+# while the tab still shows the stale document or is loading
+TAB_READY_SCRIPT = """
+if (document.documentElement.dataset.stale || document.readyState !== 'complete'
+        || document.querySelector("[role='main'] h1") === null) {
+    return null;
+}
+return location.href;
+"""
+
+
+class TabFetcher:
+    """Loads several place pages at once in separate tabs of one browser.
+
+    Each tab holds at most one page in flight; a new link is only dispatched
+    to a tab once its previous page was parsed (or timed out), so at most
+    `max_tabs` pages load concurrently. Navigations are started with
+    window.location so they do not block the driver; a tab is ready once its
+    old document is gone and it shows the dispatched place, and it is then
+    handed to Parser.parse, which extracts the record from the current window.
+
+    With a FeedNavigator, the original tab keeps its feed and opens places by
+    clicking their cards while the other tabs load places by URL; links whose
+    card cannot be opened are loaded by URL in the other tabs.
+    """
+
+    def __init__(self, driver, parser, max_tabs=MAX_TABS_PER_BROWSER, page_timeout=DETAIL_PAGE_TIMEOUT,
+                 navigator=None):
+        self.driver = driver
+        self.parser = parser
+        self.max_tabs = max_tabs
+        self.page_timeout = page_timeout
+        self.navigator = navigator
+        self.timed_out = 0
+
+    def open_tabs(self, count):
+        original = self.driver.current_window_handle
+        handles = [original]
+        for _ in range(count - 1):
+            self.driver.switch_to.new_window("tab")
+            if LEAN_MODE:
+                enable_blocking(self.driver)  # Blocked URLs are set per CDP target, i.e. per tab
+            handles.append(self.driver.current_window_handle)
+        return original, handles
+
+    def dispatch(self, handle, link):
+        get_rate_limiter().acquire()
+        self.driver.switch_to.window(handle)
+        self.driver.execute_script(DISPATCH_SCRIPT, link)
+        return link, time.monotonic()
+
+    def is_ready(self, link):
+        """Whether the current tab shows the place link points to"""
+        url = self.driver.execute_script(TAB_READY_SCRIPT)
+        return url is not None and place_id_from_href(url) == place_id_from_href(link)
+
+    def clicks_in(self, handle, original):
+        return self.navigator is not None and handle == original
+
+    def fill(self, handles, original, pending, by_url, inFlight):
+        """Give every idle tab its next link. The feed tab clicks the cards of
+        pending links; the other tabs load first the links it could not open,
+        then pending ones."""
+        for handle in handles:
+            if handle in inFlight:
+                continue
+            if self.clicks_in(handle, original):
+                self.driver.switch_to.window(handle)
+                while pending:
+                    link = pending.pop()
+                    started = time.monotonic()
+                    if self.navigator.click(link):
+                        inFlight[handle] = (link, started)
+                        break
+                    by_url.append(link)
+            elif by_url or pending:
+                if handle == original:
+                    self.parser.feed_tab_navigated = True
+                inFlight[handle] = self.dispatch(handle, by_url.pop() if by_url else pending.pop())
+
+    def fetch(self, links):
+        pending = list(reversed(links))
+        by_url = []
+        original, handles = self.open_tabs(min(self.max_tabs, len(links)))
+        inFlight = {}
+
+        try:
+            self.fill(handles, original, pending, by_url, inFlight)
+            while inFlight:
+                if Common.close_thread_is_set():
+                    return
+
+                progressed = False
+                for handle, (link, started) in list(inFlight.items()):
+                    self.driver.switch_to.window(handle)
+                    if self.clicks_in(handle, original):
+                        if self.navigator.shows(link):
+                            self.navigator.parse(link, started)
+                        elif time.monotonic() - started > self.navigator.page_timeout:
+                            self.navigator.give_up(link)
+                            by_url.append(link)
+                        else:
+                            continue
+                    elif self.is_ready(link):
+                        Metrics.record(DETAIL_PAGE_LOAD, time.monotonic() - started)
+                        Metrics.increment("pages")
+                        self.parser.pages_loaded += 1
+                        self.parser.currentLink = link
+                        self.parser.parse()
+                    elif time.monotonic() - started > self.page_timeout:
+                        check_page(self.driver)  # A captcha page never gets ready, fail the job on it
+                        self.timed_out += 1
+                        Communicator.show_message(f"Timed out loading {link}")
+                        self.parser.finish(link)
+                    else:
+                        continue
+
+                    progressed = True
+                    del inFlight[handle]
+
+                self.fill(handles, original, pending, by_url, inFlight)
+                if not progressed:
+                    if self.navigator is not None and original in inFlight:
+                        # Waits in the page for the clicked sheet, no longer than a poll
+                        self.driver.switch_to.window(original)
+                        self.navigator.wait(inFlight[original][0], TAB_POLL_INTERVAL)
+                    else:
+                        time.sleep(TAB_POLL_INTERVAL)
+        finally:
+            self.close_tabs(original, handles)
+
+    def close_tabs(self, original, handles):
+        try:
+            for handle in handles:
+                if handle != original:
+                    self.driver.switch_to.window(handle)
+                    self.driver.close()
+            self.driver.switch_to.window(original)
+        except Exception as e:
+            Communicator.show_message(f"Error while closing tabs: {e}")
@@ -0,0 +1,145 @@
+import multiprocessing
+import os
+import queue
+import socket
+import time
+import worker
+from common import Common
+from checkpoints import CheckpointStore, get_checkpoint_store
+from coordinator import Coordinator
+from job_queue import JobQueue
+from place_index import PlaceIndex, get_place_index
+
+AUTHKEY = b"test"
+
+
+def stub_run_job(job, headless_mode):
+    """Stands in for a scrape: one record, no subdivision"""
+    time.sleep(0.1)
+    return [{"Name": job.location}], False
+
+
+def hanging_run_job(job, headless_mode):
+    time.sleep(3600)  # Holds its job until the test kills the worker
+
+
+def sharing_run_job(job, headless_mode):
+    """Marks a place and leaves a checkpoint through the stores of this process"""
+    index = get_place_index()
+    assert index.fresh_ids(["seen", "new"]) == {"seen"}
+    index.mark_scraped("new", job.industry, job.location)
+    get_checkpoint_store().start(job.location, ["a", "b"], saturated=True).finish("a")
+    return [{"Name": job.location}], False
+
+
+def run_remote_worker(worker_id, address, run_job):
+    worker.run_job = run_job
+    target = multiprocessing.Value("i", 1)
+    busy = multiprocessing.Value("i", 0)
+    worker.worker_loop(worker_id, 0, 1, "grid", target, busy, None, coordinator=address, authkey=AUTHKEY)
+
+
+def run_remote_worker_elsewhere(worker_id, address, run_job, directory):
+    os.chdir(directory)  # Another host: nothing of the coordinator's on this disk
+    run_remote_worker(worker_id, address, run_job)
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_killed_worker_job_is_requeued(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # The coordinator opens the job queue at its default, relative path
+    job_queue = JobQueue()
+    for location in ("Austin", "Boston", "Chicago", "Denver"):
+        job_queue.enqueue("plumber", location)
+
+    address = ("127.0.0.1", free_port())
+    coordinator = Coordinator(address, AUTHKEY, "grid", queue.Queue(), heartbeat_timeout=5)
+    coordinator.start()
+    stuck = multiprocessing.Process(target=run_remote_worker, args=("stuck", address, hanging_run_job))
+    healthy = multiprocessing.Process(target=run_remote_worker, args=("healthy", address, stub_run_job))
+    try:
+        stuck.start()
+        wait_for(lambda: job_queue.counts().get("leased") == 1)
+        (stuck_job_id,) = [row[0] for row in job_queue.connection.execute("SELECT id FROM jobs WHERE worker = 'stuck'")]
+        healthy.start()
+        wait_for(lambda: job_queue.counts().get("done") == 3)
+
+        stuck.kill()
+        healthy.join(timeout=30)
+        assert healthy.exitcode == 0
+    finally:
+        for process in (stuck, healthy):
+            if process.is_alive():
+                process.kill()
+        coordinator.stop()
+
+    assert job_queue.counts() == {"done": 4}
+    assert coordinator.lost == 1
+    worker_id, attempts = job_queue.connection.execute(
+        "SELECT worker, attempts FROM jobs WHERE id = ?", (stuck_job_id,)
+    ).fetchone()
+    assert (worker_id, attempts) == ("healthy", 2)
+    job_queue.close()
+
+
+def test_remote_worker_shares_place_index_and_checkpoints(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    job_queue = JobQueue()
+    job_queue.enqueue("plumber", "Austin")
+    place_index = PlaceIndex()
+    place_index.mark_scraped("seen")
+
+    remote = tmp_path / "remote"
+    remote.mkdir()
+    address = ("127.0.0.1", free_port())
+    coordinator = Coordinator(address, AUTHKEY, "grid", queue.Queue(), heartbeat_timeout=5)
+    coordinator.start()
+    process = multiprocessing.Process(
+        target=run_remote_worker_elsewhere, args=("remote", address, sharing_run_job, str(remote))
+    )
+    try:
+        process.start()
+        process.join(timeout=30)
+        assert process.exitcode == 0
+    finally:
+        if process.is_alive():
+            process.kill()
+        coordinator.stop()
+
+    assert job_queue.counts() == {"done": 1}
+    assert place_index.fresh_ids(["seen", "new"]) == {"seen", "new"}
+    checkpoint = CheckpointStore().load("Austin")
+    assert (checkpoint.links, checkpoint.saturated, checkpoint.cursor) == (["a", "b"], True, 1)
+    assert os.listdir(remote) == []
+    place_index.close()
+    job_queue.close()
+
+
+def test_lease_is_only_extended_on_progress(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    job_queue = JobQueue()
+    job_queue.enqueue("plumber", "Austin")
+    jobs = worker.LocalJobs("local", "grid", heartbeat_interval=0.05)
+    lease_until = lambda: job_queue.connection.execute("SELECT lease_until FROM jobs").fetchone()[0]
+    try:
+        jobs.lease("local")
+        leased_until = lease_until()
+        time.sleep(0.3)
+        assert lease_until() == leased_until  # Hung: no link done, no results scrolled
+
+        Common.mark_progress()
+        wait_for(lambda: lease_until() > leased_until, timeout=5)
+    finally:
+        jobs.close()
+        job_queue.close()
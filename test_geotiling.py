@@ -0,0 +1,38 @@
+import math
+import random
+from geotiling import EARTH_RADIUS_KM, city_radius_km
+from starter import determine_num_divisions, generate_subregions
+
+LAT, LONG = 40.7128, -74.0060
+
+
+def tile_offset_km(tile):
+    north_km = math.radians(tile.lat - LAT) * EARTH_RADIUS_KM
+    east_km = math.radians(tile.long - LONG) * EARTH_RADIUS_KM * math.cos(math.radians(LAT))
+    return north_km, east_km
+
+
+def uncovered_points(tiling, population, samples=2000):
+    """Random points of the city disc that fall in no tile's viewport"""
+    radius_km = city_radius_km(population)
+    tiles = generate_subregions(LAT, LONG, determine_num_divisions(population), population, tiling)
+    squares = [(*tile_offset_km(tile), tile.span_km / 2 * 1.001) for tile in tiles]
+    generator = random.Random(population)
+    missed = []
+    for _ in range(samples):
+        distance = radius_km * math.sqrt(generator.random())
+        angle = generator.uniform(0, 2 * math.pi)
+        north_km, east_km = distance * math.sin(angle), distance * math.cos(angle)
+        if not any(abs(north_km - north) <= half and abs(east_km - east) <= half for north, east, half in squares):
+            missed.append((round(north_km, 2), round(east_km, 2)))
+    return missed
+
+
+def test_pie_tiles_cover_the_city():
+    for population in (50_000, 300_000, 2_700_000, 8_300_000):
+        assert uncovered_points("pie", population) == []
+
+
+def test_grid_tiles_cover_the_city():
+    for population in (50_000, 300_000, 2_700_000, 8_300_000):
+        assert uncovered_points("grid", population) == []
@@ -0,0 +1,66 @@
+import logging
+import random
+import time
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+from metrics import Metrics, READY_WAIT, RETRY_BACKOFF
+from settings import (
+    EXPLICIT_WAIT_TIMEOUT,
+    WAIT_POLL_INTERVAL,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+)
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter and a budget of attempts.
+
+    The n-th retry waits between half and all of base_delay * 2**n (capped at
+    max_delay), so workers that failed together do not retry in lockstep.
+    Every backoff is recorded in the metrics as time lost to retries.
+    """
+
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt):
+        """Seconds to wait after the attempt-th (0-based) failed attempt"""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def sleep(self, attempt):
+        delay = self.backoff(attempt)
+        Metrics.record(RETRY_BACKOFF, delay)
+        Metrics.increment("retries")
+        time.sleep(delay)
+
+    def call(self, action, retry_on=(Exception,), description="Action"):
+        """Run action until it succeeds, re-raising the last error once the
+        attempts are spent"""
+        for attempt in range(self.max_attempts):
+            try:
+                return action()
+            except retry_on as e:
+                logging.warning(f"{description} failed, attempt {attempt + 1} of {self.max_attempts}: {e}")
+                if attempt + 1 >= self.max_attempts:
+                    raise
+                self.sleep(attempt)
+
+
+def script_condition(script):
+    """Wait condition that holds once script returns something truthy"""
+    return lambda driver: driver.execute_script(script)
+
+
+def wait_until(driver, condition, timeout=EXPLICIT_WAIT_TIMEOUT, stage=READY_WAIT):
+    """Explicit wait for condition(driver); returns its value, or None when it
+    did not hold within timeout. The time spent is recorded under stage."""
+    try:
+        with Metrics.timer(stage):
+            return WebDriverWait(driver, timeout, poll_frequency=WAIT_POLL_INTERVAL).until(condition)
+    except TimeoutException:
+        Metrics.increment("wait_timeouts")
+        return None
@@ -0,0 +1,218 @@
+"""Worker process side of starter.py: pulls jobs from the job queue and
+scrapes them on a pooled driver.
+
+Only light modules are imported here. Selenium, undetected_chromedriver and
+the parsers are imported by the first job that needs a driver, so a worker
+is up and leasing jobs within milliseconds whether it is forked or spawned.
+"""
+import json
+import logging
+import signal
+import sys
+import threading
+import time
+from multiprocessing.util import Finalize
+from blocking import BlockedError
+from common import Common
+from communicator import Communicator
+from checkpoints import set_checkpoint_store
+from coordinator import RemoteJobs, RemotePlaceIndex, RemoteCheckpointStore, complete_job
+from database import set_result_queue, send_metrics
+from geotiling import Tile, QuadtreePlanner
+from job_queue import JobQueue
+from metrics import Metrics, summarize
+from place_index import set_place_index
+from settings import JOB_POLL_INTERVAL, HEARTBEAT_INTERVAL, HTTP_FETCH_MODE, LOG_LEVEL, LOG_FORMAT
+
+driver_pool = None  # Per-process pool of warm drivers, see init_worker
+
+
+def exit_worker(sig, frame):
+    # Workers exit right away; exiting flushes the records they already
+    # put on the result queue to the parent and quits the pooled driver
+    sys.exit(0)
+
+
+def bootstrap():
+    """Process-wide setup of a worker: logging and the CTRL+C handler"""
+    logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
+    signal.signal(signal.SIGINT, exit_worker)
+
+
+def init_worker(headless_mode):
+    """Worker initializer: give every worker process one long-lived driver that
+    is reused for all the jobs it runs and quit when the process exits"""
+    from driver_pool import DriverPool
+
+    global driver_pool
+    driver_pool = DriverPool(size=1, headless_mode=headless_mode)
+    Finalize(driver_pool, driver_pool.close, exitpriority=16)
+
+
+def get_driver_pool(headless_mode):
+    if driver_pool is None:
+        init_worker(headless_mode)
+    return driver_pool
+
+
+def run_backend(search_query, headless_mode, tile=None, location=None):
+    """Scrape one viewport (or a whole location) on a pooled driver"""
+    from scraper import Backend  # Selenium and the parsers are loaded by the first job
+
+    with get_driver_pool(headless_mode).lease() as lease:
+        backend = Backend(
+            searchquery=search_query,
+            outputformat='json',
+            headlessmode=headless_mode,
+            location=location,
+            lat_center=tile.lat if tile else None,
+            long_center=tile.long if tile else None,
+            start_angle=tile.start_angle if tile else None,
+            end_angle=tile.end_angle if tile else None,
+            tile=tile,
+            driver=lease.driver
+        )
+        try:
+            result = backend.mainscraping()
+        except BlockedError:
+            lease.discard = True  # Start the next job on a fresh driver and identity
+            if HTTP_FETCH_MODE:
+                from http_fetcher import reset_http_fetcher
+
+                reset_http_fetcher()
+            raise
+        finally:
+            lease.pages += backend.total_pages_loaded
+    return backend, result
+
+
+def run_job(job, headless_mode):
+    """Scrape one job, returning its records and whether its feed was saturated"""
+    tile = Tile.from_dict(job.tile) if job.tile else None
+    backend, result = run_backend(job.industry, headless_mode, tile=tile, location=None if tile else job.location)
+    return result, backend.saturated
+
+
+def report_job_metrics(worker_id, job):
+    """Log the stage timings of the job that just ended and send them to the
+    parent, which aggregates them per location for the run report"""
+    snapshot = Metrics.snapshot(reset=True)
+    summary = summarize(snapshot["durations"], snapshot["counters"], snapshot["elapsed"])
+    logging.info(f"{worker_id} metrics for {job}: {json.dumps(summary)}")
+    send_metrics(f"{job.industry} | {job.location}", snapshot)
+
+
+class LocalJobs:
+    """Job source of a worker on the coordinator's own machine: the SQLite
+    job queue itself. RemoteJobs offers the same methods over the network.
+    Like the heartbeats of RemoteJobs, a background thread extends the lease
+    of the job in progress, so a long job is not handed to a second worker;
+    only while the job makes progress, so a worker hung in a driver call
+    loses its job once the lease runs out."""
+
+    def __init__(self, worker_id, tiling, heartbeat_interval=HEARTBEAT_INTERVAL):
+        self.worker_id = worker_id
+        self.tiling = tiling
+        self.heartbeat_interval = heartbeat_interval
+        self.job_queue = JobQueue()
+        self.planner = QuadtreePlanner()
+        self.job_id = None  # Job whose lease is being extended
+        self.__stop = threading.Event()
+        threading.Thread(target=self.extend_leases, name="lease-heartbeat", daemon=True).start()
+
+    def extend_leases(self):
+        job_queue = JobQueue()  # sqlite connections belong to one thread
+        progress = Common.last_progress()
+        while not self.__stop.wait(self.heartbeat_interval):
+            job_id = self.job_id
+            if job_id is not None and Common.last_progress() != progress:
+                job_queue.extend_lease(job_id, self.worker_id)
+            progress = Common.last_progress()
+        job_queue.close()
+
+    def lease(self, worker_id):
+        job = self.job_queue.lease(worker_id)
+        self.job_id = job.id if job else None
+        return job
+
+    def remaining(self):
+        return self.job_queue.remaining()
+
+    def complete(self, job, records, saturated):
+        self.job_id = None
+        complete_job(self.job_queue, self.planner, self.tiling, job, self.worker_id, records, saturated)
+
+    def fail(self, job_id, error):
+        self.job_id = None
+        self.job_queue.fail(job_id, self.worker_id, error)
+
+    def postpone(self, job_id, error):
+        self.job_id = None
+        self.job_queue.postpone(job_id, self.worker_id, error)
+
+    def close(self):
+        self.__stop.set()
+        self.job_queue.close()
+
+
+def worker_loop(worker_id, worker_index, headless_mode, tiling, target, busy, result_queue, verbose_payloads=False,
+                coordinator=None, authkey=None):
+    """Body of a worker process: pull jobs until the queue is drained.
+    Saturated adaptive tiles are split and their quadrants queued with a
+    higher priority, so a city in progress is finished first.
+
+    target and busy are the governor's shared counters; the worker pauses (and
+    quits its idle driver) while its index is not below the target. Records
+    are streamed to the parent's writer through result_queue as they are parsed,
+    followed by the job's metrics snapshot. With a coordinator address, jobs
+    are leased from that coordinator and records and metrics are sent to it
+    instead, and result_queue is unused."""
+    bootstrap()
+    if coordinator:
+        job_queue = RemoteJobs(coordinator, authkey, worker_id)
+        set_result_queue(job_queue)
+        # Places scraped and searches in progress are known to the coordinator, not this host
+        set_place_index(RemotePlaceIndex(job_queue))
+        set_checkpoint_store(RemoteCheckpointStore(job_queue))
+    else:
+        job_queue = LocalJobs(worker_id, tiling)
+        set_result_queue(result_queue)
+    Communicator.set_verbose_payloads(verbose_payloads)
+    init_worker(headless_mode)
+
+    while True:
+        if worker_index >= target.value:
+            if job_queue.remaining() == 0:
+                break
+            driver_pool.quit_idle()  # Free the browser's memory while paused
+            time.sleep(JOB_POLL_INTERVAL)
+            continue
+
+        job = job_queue.lease(worker_id)
+        if job is None:
+            if job_queue.remaining() == 0:
+                break
+            time.sleep(JOB_POLL_INTERVAL)  # Other workers may still queue subdivided tiles
+            continue
+
+        logging.info(f"{worker_id} processing {job} (attempt {job.attempts})")
+        Metrics.snapshot(reset=True)  # Time spent paused or idle is not part of the job
+        with busy.get_lock():
+            busy.value += 1
+        try:
+            result, saturated = run_job(job, headless_mode)
+        except BlockedError as e:
+            logging.warning(f"{job} postponed: {e}")
+            job_queue.postpone(job.id, e)
+        except Exception as e:
+            logging.error(f"{job} failed: {e}")
+            job_queue.fail(job.id, e)
+        else:
+            job_queue.complete(job, len(result), saturated)
+        finally:
+            with busy.get_lock():
+                busy.value -= 1
+        # Sent once the job is settled, so the parent can tell it was its location's last
+        report_job_metrics(worker_id, job)
+
+    job_queue.close()